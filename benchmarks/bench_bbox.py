@@ -0,0 +1,96 @@
+"""Micro-benchmark: per-mask mask_to_bbox loop vs vectorized masks_to_bboxes.
+
+Both paths must give the same boxes: the script exits with status 1 if any
+box differs.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_bbox --frames 20 --objects 10 --height 1080 --width 1920
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+import config
+from pipeline.bbox import bboxes_from_outputs
+from video.cropper import mask_to_bbox
+
+
+def make_outputs(frames: int, objects: int, height: int, width: int, seed: int = 0):
+    """Synthetic {frame: {obj: mask}} with moving rectangles, some objects missing."""
+    rng = np.random.default_rng(seed)
+    outputs = {}
+    for f in range(frames):
+        masks = {}
+        for obj_id in range(objects):
+            if rng.random() < 0.1:
+                continue  # objet absent sur cette frame
+            h, w = rng.integers(height // 10, height // 3), rng.integers(width // 10, width // 3)
+            y, x = rng.integers(0, height - h), rng.integers(0, width - w)
+            mask = np.zeros((height, width), dtype=bool)
+            mask[y:y + h, x:x + w] = True
+            masks[obj_id] = mask
+        outputs[f] = masks
+    return outputs
+
+
+def per_mask(outputs, obj_ids):
+    """Current path of run_extraction: one mask_to_bbox call per (object, frame)."""
+    boxes_by_obj = {}
+    for obj_id in obj_ids:
+        boxes = {}
+        for idx, masks in outputs.items():
+            boxes[idx] = mask_to_bbox(masks[obj_id]) if obj_id in masks else None
+        boxes_by_obj[obj_id] = boxes
+    return boxes_by_obj
+
+
+def count_mismatches(reference, vectorized, obj_ids, frame_idxs) -> int:
+    """Boxes present in only one result, or with different coordinates."""
+    return sum(
+        1 for obj_id in obj_ids for idx in frame_idxs
+        if (reference[obj_id][idx] is None) != (vectorized[obj_id][idx] is None)
+        or (reference[obj_id][idx] is not None
+            and tuple(map(int, reference[obj_id][idx])) != tuple(vectorized[obj_id][idx]))
+    )
+
+
+def timeit(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=config.NUM_FRAMES_PER_CLIP)
+    parser.add_argument("--objects", type=int, default=10)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    outputs = make_outputs(args.frames, args.objects, args.height, args.width)
+    obj_ids = list(range(args.objects))
+
+    t_loop = timeit(lambda: per_mask(outputs, obj_ids), args.repeat)
+    t_vec = timeit(lambda: bboxes_from_outputs(outputs, obj_ids), args.repeat)
+
+    print(f"{args.frames} frames x {args.objects} objects, {args.width}x{args.height}")
+    print(f"  per-mask mask_to_bbox : {t_loop * 1000:8.1f} ms")
+    print(f"  masks_to_bboxes       : {t_vec * 1000:8.1f} ms  (x{t_loop / t_vec:.1f})")
+
+    # Les deux chemins doivent produire les mêmes boîtes
+    reference, vectorized = per_mask(outputs, obj_ids), bboxes_from_outputs(outputs, obj_ids)
+    mismatches = count_mismatches(reference, vectorized, obj_ids, list(outputs))
+    print(f"  mismatching boxes     : {mismatches}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
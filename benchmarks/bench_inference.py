@@ -0,0 +1,138 @@
+"""CPU inference benchmark of the SAM session under several inference settings.
+
+Every configuration (dtype, int8 quantization, threads, torch.compile) runs in
+a fresh spawned process, since quantization and compilation modify the loaded
+model in place. Each process loads the session (SAM_SESSION_FACTORY, or
+--session), wraps it with pipeline.inference.optimize_session and runs
+start / add_prompt / propagate on synthetic in-memory clips. The first clip is a
+warm-up and is not counted.
+
+Reports load time and propagated frames/sec per configuration, and saves the
+results to benchmarks/results/inference_<time>_<commit>.json.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_inference --clips 3
+    python -m benchmarks.bench_inference --dtypes fp32 bf16 --int8 0 1 --threads 4 8 --compile
+    python -m benchmarks.bench_inference --session benchmarks.stub_sam:StubSAMSession
+"""
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing as mp
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+import config
+from benchmarks.bench_pipeline import RESULTS_DIR, git_commit
+
+
+def synthetic_clip(num_frames: int, width: int, height: int, seed: int) -> np.ndarray:
+    """[num_frames, height, width, 3] uint8 frames with bright rectangles moving on noise."""
+    rng = np.random.default_rng(seed)
+    frames = np.repeat(rng.integers(40, 120, size=(1, height, width, 3), dtype=np.uint8), num_frames, axis=0)
+    for _ in range(3):
+        x, y = rng.uniform(0, width - 80), rng.uniform(0, height - 60)
+        vx, vy = rng.uniform(-4, 4), rng.uniform(-2, 2)
+        for t in range(num_frames):
+            x0, y0 = int((x + vx * t) % (width - 80)), int((y + vy * t) % (height - 60))
+            frames[t, y0:y0 + 60, x0:x0 + 80] = 230
+    return frames
+
+
+def _run_config(setting: Dict, args: Dict) -> Dict:
+    """Body of one benchmark process (spawned, fresh model)."""
+    from PIL import Image
+
+    from pipeline.extractor import close_session
+    from pipeline.inference import InferenceSettings, optimize_session
+    from pipeline.worker import load_session_factory
+
+    logging.basicConfig(level=logging.WARNING)
+    start = time.perf_counter()
+    sam = optimize_session(load_session_factory(args["session"])(),
+                           InferenceSettings(device="cpu", dtype=setting["dtype"], int8=setting["int8"],
+                                             threads=setting["threads"], compile=setting["compile"]))
+    load_seconds = time.perf_counter() - start
+
+    seconds, frames, objects = [], 0, 0
+    for i in range(args["clips"] + 1):
+        clip = synthetic_clip(args["frames"], args["width"], args["height"], seed=i)
+        resource = [Image.fromarray(frame) for frame in clip]
+        t0 = time.perf_counter()
+        sid = sam.start(resource)
+        try:
+            first = sam.add_prompt(sid, config.PROMPT_CLASS)
+            outputs = sam.propagate(sid)
+        finally:
+            close_session(sam, sid)
+        if i == 0:
+            continue  # échauffement (allocations, compilation)
+        seconds.append(time.perf_counter() - t0)
+        frames += len(outputs)
+        objects += len(first.get("out_obj_ids", []))
+
+    total = sum(seconds)
+    return dict(setting, threads=sam.threads, load_seconds=load_seconds, clips=len(seconds),
+                frames=frames, objects=objects, seconds=total,
+                frames_per_sec=frames / total if total else 0.0,
+                clip_p50=float(np.median(seconds)) if seconds else 0.0)
+
+
+def settings_grid(args) -> List[Dict]:
+    return [dict(dtype=dtype, int8=bool(int8), threads=threads, compile=compiled)
+            for dtype, int8, threads, compiled in itertools.product(
+                args.dtypes, args.int8, args.threads or [None], [False, True] if args.compile else [False])]
+
+
+def _format_row(row: Dict) -> str:
+    name = f"{row['dtype']}{' int8' if row['int8'] else ''}{' compile' if row['compile'] else ''}"
+    threads = row["threads"] if row["threads"] is not None else "auto"
+    if "error" in row:
+        return f"  {name:<22} threads={threads:<5} failed: {row['error']}"
+    return (f"  {name:<22} threads={threads:<5} {row['frames_per_sec']:8.2f} frames/s  "
+            f"clip p50 {row['clip_p50']:.2f} s  load {row['load_seconds']:.1f} s  ({row['objects']} objects)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--session", default=config.SAM_SESSION_FACTORY)
+    parser.add_argument("--clips", type=int, default=3, help="timed clips per configuration")
+    parser.add_argument("--frames", type=int, default=config.NUM_FRAMES_PER_CLIP)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--dtypes", nargs="+", default=["fp32", "bf16"], choices=["fp32", "bf16", "fp16"])
+    parser.add_argument("--int8", nargs="+", type=int, default=[0, 1], choices=[0, 1])
+    parser.add_argument("--threads", nargs="+", type=int, default=None,
+                        help="intra-op threads to try (default: cores / NUM_SAM_WORKERS)")
+    parser.add_argument("--compile", action="store_true", help="also try torch.compile")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    args = parser.parse_args()
+
+    run_args = dict(session=args.session, clips=args.clips, frames=args.frames,
+                    width=args.width, height=args.height)
+    ctx = mp.get_context("spawn")
+    rows = []
+    for setting in settings_grid(args):
+        # Un processus neuf par configuration : quantification et compilation sont en place
+        with ctx.Pool(1) as pool:
+            try:
+                row = pool.apply(_run_config, (setting, run_args))
+            except Exception as e:
+                row = dict(setting, error=repr(e))
+        rows.append(row)
+        print(_format_row(row), flush=True)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"inference_{time.strftime('%Y%m%d_%H%M%S')}_{git_commit()}.json")
+    with open(path, "w") as f:
+        json.dump({"commit": git_commit(), "params": vars(args), "cpu_count": os.cpu_count(),
+                   "results": rows}, f, indent=2, default=float)
+    print(f"saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
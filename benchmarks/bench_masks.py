@@ -0,0 +1,106 @@
+"""Memory benchmark: dense masks (prepare_masks_for_visualization) vs RLE MaskStore.
+
+Builds a synthetic propagate() output (SAM3 per-frame format, elliptic
+objects) and measures, with tracemalloc, the memory held by the masks and the
+peak while computing the boxes:
+
+- dense: the {frame: {obj: mask}} layout of prepare_masks_for_visualization
+  (one full-resolution bool array per object and frame) + bboxes_from_outputs;
+- rle: MaskStore.from_propagate (frames encoded and dropped one by one) +
+  boxes from pycocotools.toBbox.
+
+The propagate() output itself is built before measuring: it is the model's
+output and is the same for both paths.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_masks --frames 20 --objects 10 --height 1080 --width 1920
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+import config
+from pipeline.bbox import bboxes_from_outputs
+from pipeline.mask_store import MaskStore
+
+
+def make_propagate_output(frames: int, objects: int, height: int, width: int, seed: int = 0):
+    """Synthetic propagate() output: moving ellipses, a few objects missing per frame."""
+    rng = np.random.default_rng(seed)
+    ys, xs = np.ogrid[:height, :width]
+    centers = rng.uniform([0.1 * width, 0.1 * height], [0.9 * width, 0.9 * height], size=(objects, 2))
+    axes = rng.uniform([0.03 * width, 0.05 * height], [0.08 * width, 0.15 * height], size=(objects, 2))
+    velocity = rng.uniform(-6, 6, size=(objects, 2))
+    outputs = {}
+    for t in range(frames):
+        masks = np.zeros((objects, height, width), dtype=bool)
+        for o in range(objects):
+            if rng.random() < 0.1:
+                continue  # objet absent sur cette frame
+            cx, cy = centers[o] + t * velocity[o]
+            masks[o] = ((xs - cx) / axes[o, 0]) ** 2 + ((ys - cy) / axes[o, 1]) ** 2 <= 1
+        outputs[t] = {"out_obj_ids": np.arange(objects), "out_probs": np.ones(objects, dtype=np.float32),
+                      "out_binary_masks": masks}
+    return outputs
+
+
+def dense_masks(outputs):
+    """Layout of prepare_masks_for_visualization: {frame: {obj_id: dense mask}}, empty masks dropped."""
+    return {t: {int(obj_id): out["out_binary_masks"][i].copy()
+                for i, obj_id in enumerate(out["out_obj_ids"]) if out["out_binary_masks"][i].any()}
+            for t, out in outputs.items()}
+
+
+def run_dense(outputs, obj_ids):
+    masks = dense_masks(outputs)
+    return masks, bboxes_from_outputs(masks, obj_ids)
+
+
+def run_rle(outputs, obj_ids):
+    store = MaskStore.from_propagate(outputs)
+    return store, store.bboxes(obj_ids)
+
+
+def measure(fn):
+    """(result, held bytes, peak bytes, seconds) of fn under tracemalloc."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    seconds = time.perf_counter() - start
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, held, peak, seconds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=config.NUM_FRAMES_PER_CLIP)
+    parser.add_argument("--objects", type=int, default=10)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--width", type=int, default=1920)
+    args = parser.parse_args()
+    obj_ids = list(range(args.objects))
+
+    outputs = make_propagate_output(args.frames, args.objects, args.height, args.width)
+    (masks, dense_boxes), dense_held, dense_peak, dense_s = measure(lambda: run_dense(outputs, obj_ids))
+    del masks
+
+    outputs = make_propagate_output(args.frames, args.objects, args.height, args.width)
+    (store, rle_boxes), rle_held, rle_peak, rle_s = measure(lambda: run_rle(outputs, obj_ids))
+
+    print(f"{args.frames} frames x {args.objects} objects, {args.width}x{args.height}")
+    print(f"  {'':<8}{'held MB':>10}{'peak MB':>10}{'ms':>10}")
+    print(f"  {'dense':<8}{dense_held / 1e6:>10.1f}{dense_peak / 1e6:>10.1f}{dense_s * 1e3:>10.1f}")
+    print(f"  {'rle':<8}{rle_held / 1e6:>10.2f}{rle_peak / 1e6:>10.1f}{rle_s * 1e3:>10.1f}"
+          f"   (RLE counts: {store.nbytes() / 1e3:.1f} kB)")
+
+    # Les deux chemins doivent produire les mêmes boîtes
+    mismatches = sum(1 for obj_id in obj_ids for idx in dense_boxes[obj_id]
+                     if dense_boxes[obj_id][idx] != rle_boxes[obj_id].get(idx))
+    print(f"  mismatching boxes : {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Offline end-to-end benchmark of main.py's pipeline.
+
+Synthetic mp4s are served by an in-process SFTP server (benchmarks/sftp_standin.py)
+that the shared transport pool targets, and the SAM workers load a
+deterministic stub session producing moving blobs (benchmarks/stub_sam.py).
+Everything else runs for real: catalog, sampler, journal, download or ranged
+reads, clip sampling, mask post-processing, crop encoding and uploads. No
+farm server or GPU is needed; the sam3 and torch packages still are.
+
+Reports clips/sec, per-span latency percentiles (from the metrics JSONL) and
+bytes moved, and saves the results to benchmarks/results/<time>_<commit>.json,
+comparing them with the previous run.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_pipeline --videos 6 --seconds 40
+    python -m benchmarks.bench_pipeline --ranged-reads 0 --sam-workers 2 --frame-delay 0.02
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+import config
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+STUB_SESSION = "benchmarks.stub_sam:StubSAMSession"
+ALIASES = ["BENCH_A", "BENCH_B"]
+
+
+def make_video(path: str, seconds: float, fps: int, width: int, height: int, seed: int) -> None:
+    """Writes an mp4 with a noisy background and a few moving rectangles."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(40, 120, size=(height, width, 3), dtype=np.uint8)
+    boxes = [(rng.uniform(0, width - 80), rng.uniform(0, height - 60), rng.uniform(-4, 4), rng.uniform(-2, 2))
+             for _ in range(3)]
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    try:
+        for t in range(int(seconds * fps)):
+            frame = background.copy()
+            for x, y, vx, vy in boxes:
+                x0, y0 = int((x + vx * t) % (width - 80)), int((y + vy * t) % (height - 60))
+                frame[y0:y0 + 60, x0:x0 + 80] = (230, 230, 230)
+            writer.write(frame)
+    finally:
+        writer.release()
+
+
+def make_remote_tree(root: str, videos: int, seconds: float, fps: int, width: int, height: int) -> None:
+    """Farm folders as on the real server: /farms/<alias>/Dxx/<timestamp>_Dxx.mp4."""
+    for i in range(videos):
+        alias = ALIASES[i % len(ALIASES)]
+        folder = os.path.join(root, "farms", alias, "D01")
+        os.makedirs(folder, exist_ok=True)
+        hour = config.START + i % max(config.END - config.START, 1)
+        make_video(os.path.join(folder, f"202502{1 + i // 24:02d}{hour:02d}{i % 60:02d}_D01.mp4"),
+                   seconds, fps, width, height, seed=i)
+    os.makedirs(os.path.join(root, "upload"), exist_ok=True)
+
+
+def redirect_config(work: str, args) -> None:
+    """Points config at the workspace; must run before any pipeline import."""
+    config.REMOTE_DIR = "/farms"
+    config.UPLOAD_DIR = "/upload"
+    config.FARM_NAMES = {alias: f"/farms/{alias}" for alias in ALIASES}
+    config.CATALOG_DB = os.path.join(work, "catalog.sqlite")
+    config.JOURNAL_DB = os.path.join(work, "journal.sqlite")
+    config.UPLOAD_INDEX_FILE = os.path.join(work, "upload_index.txt")
+    config.METRICS_FILE = os.path.join(work, "metrics.jsonl")
+    config.METRICS_PROM_FILE = os.path.join(work, "metrics.prom")
+    config.LOCAL_TMP_DIR = os.path.join(work, "data")
+    config.VIDEO_CACHE_DIR = os.path.join(work, "data", "cache")
+    config.CLIP_FOLDER = os.path.join(work, "clips")
+    config.CROP_FOLDER = os.path.join(work, "crops")
+    for folder in (config.LOCAL_TMP_DIR, config.CLIP_FOLDER, config.CROP_FOLDER):
+        os.makedirs(folder, exist_ok=True)
+
+    config.RANGED_READS = bool(args.ranged_reads)
+    config.IN_MEMORY_CLIPS = bool(args.in_memory)
+    config.NUM_CLIP = args.clips
+    config.NUM_SAM_WORKERS = args.sam_workers
+    config.STAGE_WORKERS = dict(config.STAGE_WORKERS, sam=args.sam_workers)
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"count": len(values), "p50": p50, "p90": p90, "p99": p99,
+            "max": max(values), "total": sum(values)}
+
+
+def summarize_spans(metrics_file: str) -> Dict[str, Dict]:
+    seconds, totals = defaultdict(list), defaultdict(lambda: defaultdict(float))
+    with open(metrics_file) as f:
+        for line in f:
+            event = json.loads(line)
+            seconds[event["span"]].append(event["seconds"])
+            for key in ("bytes", "frames", "objects"):
+                if isinstance(event.get(key), (int, float)):
+                    totals[event["span"]][key] += event[key]
+    return {span: dict(percentiles(values), **totals[span]) for span, values in sorted(seconds.items())}
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmark(args, work: str) -> Dict:
+    remote_root = os.path.join(work, "remote")
+    make_remote_tree(remote_root, args.videos, args.seconds, args.fps, args.width, args.height)
+    redirect_config(work, args)
+    os.environ["STUB_SAM_FRAME_DELAY"] = str(args.frame_delay)
+
+    # Imports après redirect_config : les valeurs par défaut lisent config à l'import
+    from benchmarks.sftp_standin import LocalSFTPServer
+    from pipeline import transport
+    from pipeline.catalog import VideoCatalog
+    from pipeline.journal import WorkJournal
+    from pipeline.metrics import metrics
+    from pipeline.upload_index import get_upload_index
+    from pipeline.worker import SAMWorkerPool
+    import main as pipeline_main
+
+    with LocalSFTPServer(remote_root) as server:
+        transport.configure(**server.pool_params())
+        metrics.configure(config.METRICS_FILE)
+        get_upload_index()
+        videos = VideoCatalog().refresh(config.FARM_NAMES).query(start=config.START, end=config.END)
+        journal = WorkJournal()
+
+        with SAMWorkerPool(args.sam_workers, out_folder=config.CROP_FOLDER,
+                           session_factory=STUB_SESSION) as pool:
+            start = time.perf_counter()
+            pipeline_main.run(pool, journal, videos, num_videos=len(videos))
+            wall = time.perf_counter() - start
+
+        journal.close()
+        transport.get_pool().close()
+        server_bytes = {"read": server.counters.bytes_read, "written": server.counters.bytes_written,
+                        "requests": server.counters.requests}
+
+    with sqlite3.connect(config.JOURNAL_DB) as conn:
+        clips = dict(conn.execute("SELECT state, COUNT(*) FROM clips GROUP BY state").fetchall())
+        videos_done = conn.execute("SELECT COUNT(*) FROM videos WHERE state = 'done'").fetchone()[0]
+        crops = conn.execute("SELECT COUNT(*) FROM events WHERE kind = 'crop' AND state = 'uploaded'"
+                             ).fetchone()[0]
+
+    source_bytes = sum(os.path.getsize(p) for p in glob.glob(os.path.join(remote_root, "farms", "**", "*.mp4"),
+                                                              recursive=True))
+    uploaded = clips.get("uploaded", 0)
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": dict(vars(args), num_frames_per_clip=config.NUM_FRAMES_PER_CLIP,
+                       frame_step=config.FRAME_STEP, crop_writer_threads=config.CROP_WRITER_THREADS,
+                       stage_workers=config.STAGE_WORKERS),
+        "wall_seconds": wall,
+        "videos_done": videos_done,
+        "clips": clips,
+        "crops_uploaded": crops,
+        "clips_per_sec": uploaded / wall if wall else 0.0,
+        "bytes": {"source_videos": source_bytes, "sftp_read": server_bytes["read"],
+                  "sftp_written": server_bytes["written"], "sftp_requests": server_bytes["requests"]},
+        "spans": summarize_spans(config.METRICS_FILE),
+    }
+
+
+def print_report(result: Dict, previous: Dict = None) -> None:
+    print(f"commit {result['commit']}  ({result['params']['videos']} videos, "
+          f"ranged_reads={result['params']['ranged_reads']}, in_memory={result['params']['in_memory']})")
+    line = f"  {result['clips_per_sec']:.2f} clips/s  ({sum(result['clips'].values())} clips, " \
+           f"{result['crops_uploaded']} crops, {result['wall_seconds']:.1f} s)"
+    if previous:
+        line += f"  vs {previous['commit']}: {previous['clips_per_sec']:.2f} clips/s"
+    print(line)
+    b = result["bytes"]
+    print(f"  bytes: sources {b['source_videos'] / 1e6:.1f} MB, read {b['sftp_read'] / 1e6:.1f} MB, "
+          f"written {b['sftp_written'] / 1e6:.1f} MB, {b['sftp_requests']} SFTP requests")
+    print(f"  {'span':<22}{'count':>7}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'total s':>10}")
+    for span, stats in result["spans"].items():
+        row = (f"  {span:<22}{stats['count']:>7}{stats['p50'] * 1e3:>10.1f}{stats['p90'] * 1e3:>10.1f}"
+               f"{stats['p99'] * 1e3:>10.1f}{stats['total']:>10.2f}")
+        if previous and span in previous["spans"]:
+            row += f"   (p50 was {previous['spans'][span]['p50'] * 1e3:.1f})"
+        print(row)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--videos", type=int, default=6)
+    parser.add_argument("--seconds", type=float, default=40)
+    parser.add_argument("--fps", type=int, default=25)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=360)
+    parser.add_argument("--clips", type=int, default=config.NUM_CLIP)
+    parser.add_argument("--sam-workers", type=int, default=config.NUM_SAM_WORKERS)
+    parser.add_argument("--ranged-reads", type=int, default=int(config.RANGED_READS))
+    parser.add_argument("--in-memory", type=int, default=int(config.IN_MEMORY_CLIPS))
+    parser.add_argument("--frame-delay", type=float, default=0.0,
+                        help="stub SAM seconds per propagated frame")
+    parser.add_argument("--results-dir", default=RESULTS_DIR)
+    parser.add_argument("--keep", action="store_true", help="keep the temporary workspace")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s | %(levelname)s | %(message)s")
+
+    work = tempfile.mkdtemp(prefix="sam3_bench_")
+    try:
+        result = run_benchmark(args, work)
+    finally:
+        if args.keep:
+            print(f"workspace kept in {work}")
+        else:
+            shutil.rmtree(work, ignore_errors=True)
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    # Résultats de bench_inference (inference_*.json) exclus de la comparaison
+    previous_files = sorted(path for path in glob.glob(os.path.join(args.results_dir, "*.json"))
+                            if not os.path.basename(path).startswith("inference_"))
+    previous = None
+    if previous_files:
+        with open(previous_files[-1]) as f:
+            previous = json.load(f)
+
+    path = os.path.join(args.results_dir, f"{time.strftime('%Y%m%d_%H%M%S')}_{result['commit']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2, default=float)
+    print_report(result, previous)
+    print(f"  saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
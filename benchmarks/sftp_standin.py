@@ -0,0 +1,233 @@
+"""In-process SFTP server serving a local folder, for offline benchmarks.
+
+A paramiko server bound to 127.0.0.1 that exposes ``root`` as "/" with
+password authentication. ``pipeline.transport.configure()`` can point the
+shared pool at it, so every remote operation of pipeline/cloud.py runs
+against the local disk through a real SSH/SFTP stack. Bytes read and written
+by clients are counted.
+
+    with LocalSFTPServer("/tmp/bench/remote") as server:
+        transport.configure(**server.pool_params())
+"""
+import logging
+import os
+import socket
+import threading
+from typing import Dict, List
+
+import paramiko
+from paramiko import SFTPAttributes, SFTPHandle, SFTPServer, SFTPServerInterface
+from paramiko.sftp import SFTP_OK
+
+
+class _Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.requests = 0
+
+    def add(self, read: int = 0, written: int = 0) -> None:
+        with self.lock:
+            self.bytes_read += read
+            self.bytes_written += written
+            self.requests += 1
+
+
+class _Handle(SFTPHandle):
+    counters: _Counters = None
+
+    def read(self, offset, length):
+        data = super().read(offset, length)
+        if isinstance(data, bytes):
+            self.counters.add(read=len(data))
+        return data
+
+    def write(self, offset, data):
+        self.counters.add(written=len(data))
+        return super().write(offset, data)
+
+    def stat(self):
+        try:
+            return SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        try:
+            SFTPServer.set_file_attr(self.filename, attr)
+            return SFTP_OK
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+
+class _Interface(SFTPServerInterface):
+    """Maps SFTP paths onto a local root folder."""
+
+    def __init__(self, server, root: str, counters: _Counters, *args, **kwargs):
+        super().__init__(server, *args, **kwargs)
+        self.root = root
+        self.counters = counters
+
+    def _local(self, path: str) -> str:
+        return os.path.join(self.root, self.canonicalize(path).lstrip("/"))
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            attrs = []
+            for name in os.listdir(local):
+                attr = SFTPAttributes.from_stat(os.stat(os.path.join(local, name)))
+                attr.filename = name
+                attrs.append(attr)
+            self.counters.add()
+            return attrs
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            fd = os.open(local, flags | getattr(os, "O_BINARY", 0), getattr(attr, "st_mode", None) or 0o666)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = _Handle(flags)
+        handle.counters = self.counters
+        handle.filename = local
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        try:
+            os.remove(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rename(self, oldpath, newpath):
+        try:
+            os.rename(self._local(oldpath), self._local(newpath))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    posix_rename = rename
+
+    def mkdir(self, path, attr):
+        try:
+            os.mkdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def rmdir(self, path):
+        try:
+            os.rmdir(self._local(path))
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+    def chattr(self, path, attr):
+        try:
+            SFTPServer.set_file_attr(self._local(path), attr)
+        except OSError as e:
+            return SFTPServer.convert_errno(e.errno)
+        return SFTP_OK
+
+
+class _Auth(paramiko.ServerInterface):
+    def __init__(self, user: str, password: str):
+        self.user = user
+        self.password = password
+
+    def check_auth_password(self, username, password):
+        if username == self.user and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+
+class LocalSFTPServer:
+    """SFTP server on 127.0.0.1 exposing a local folder.
+
+    Args:
+        root (str): Local folder served as "/".
+        user (str): Accepted username.
+        password (str): Accepted password.
+        port (int): Port to bind (0 picks a free one).
+    """
+
+    def __init__(self, root: str, user: str = "bench", password: str = "bench", port: int = 0):
+        self.root = os.path.abspath(root)
+        self.user = user
+        self.password = password
+        self.counters = _Counters()
+        self._host_key = paramiko.RSAKey.generate(2048)
+        self._transports: List[paramiko.Transport] = []
+        self._stop = threading.Event()
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind(("127.0.0.1", port))
+        self._socket.listen(16)
+        self._socket.settimeout(0.5)
+        self.port = self._socket.getsockname()[1]
+        self._thread = threading.Thread(target=self._accept, name="sftp-standin", daemon=True)
+
+    def _accept(self) -> None:
+        while not self._stop.is_set():
+            try:
+                conn, _ = self._socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            transport = paramiko.Transport(conn)
+            transport.add_server_key(self._host_key)
+            transport.set_subsystem_handler("sftp", SFTPServer, _Interface, self.root, self.counters)
+            transport.start_server(server=_Auth(self.user, self.password))
+            self._transports.append(transport)
+
+    def start(self) -> "LocalSFTPServer":
+        self._thread.start()
+        logging.info("SFTP stand-in serving %s on 127.0.0.1:%d", self.root, self.port)
+        return self
+
+    def pool_params(self) -> Dict:
+        """Keyword arguments for pipeline.transport.configure()."""
+        return dict(host="127.0.0.1", port=self.port, user=self.user, password=self.password,
+                    key_filename=None, strict_host_key=False)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._socket.close()
+        self._thread.join(timeout=2)
+        for transport in self._transports:
+            transport.close()
+
+    def __enter__(self) -> "LocalSFTPServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,101 @@
+"""Deterministic stand-in for SAMSession, for benchmarks without a GPU.
+
+Same interface as sam.sam_session.SAMSession (start / add_prompt / propagate
+/ propagate_stream / remove_object / close_session). Instead of running the model, every clip gets 1 to
+MAX_BLOBS elliptic blobs that move across the frame; propagate() returns
+their masks in the per-frame format of SAM3's video predictor
+({frame: {"out_obj_ids", "out_probs", "out_binary_masks"}}), so the real
+post-processing (RLE mask store, bboxes, crop writer) runs.
+
+STUB_SAM_FRAME_DELAY (seconds, environment variable) adds a fixed cost per
+propagated frame to emulate inference time.
+"""
+import hashlib
+import os
+import time
+from typing import Dict, List, Union
+
+import cv2
+import numpy as np
+
+MAX_BLOBS = 4
+
+
+def _frame_shape(resource: Union[str, List]) -> tuple:
+    """(num_frames, height, width) of a clip path or a list of PIL images."""
+    if isinstance(resource, (list, tuple)):
+        width, height = resource[0].size
+        return len(resource), height, width
+    cap = cv2.VideoCapture(str(resource))
+    try:
+        return (int(cap.get(cv2.CAP_PROP_FRAME_COUNT)),
+                int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)))
+    finally:
+        cap.release()
+
+
+def _seed(resource: Union[str, List]) -> int:
+    if isinstance(resource, (list, tuple)):
+        key = np.asarray(resource[0]).tobytes()[:4096]
+    else:
+        key = os.path.basename(str(resource)).encode()
+    return int.from_bytes(hashlib.sha1(key).digest()[:4], "little")
+
+
+class StubSAMSession:
+    """Moving-blob "segmentation" with SAMSession's interface."""
+
+    def __init__(self):
+        self.frame_delay = float(os.environ.get("STUB_SAM_FRAME_DELAY", 0))
+        self._sessions: Dict[int, Dict] = {}
+        self._next_id = 0
+
+    def start(self, resource: Union[str, List]) -> int:
+        num_frames, height, width = _frame_shape(resource)
+        rng = np.random.default_rng(_seed(resource))
+        count = int(rng.integers(1, MAX_BLOBS + 1))
+        blobs = [{
+            "center": rng.uniform([0.2 * width, 0.2 * height], [0.8 * width, 0.8 * height]),
+            "velocity": rng.uniform(-3, 3, size=2),
+            "axes": rng.uniform([0.05 * width, 0.05 * height], [0.15 * width, 0.15 * height]),
+        } for _ in range(count)]
+
+        sid = self._next_id
+        self._next_id += 1
+        self._sessions[sid] = dict(shape=(num_frames, height, width), blobs=blobs, removed=set())
+        return sid
+
+    def add_prompt(self, sid: int, prompt: str) -> Dict:
+        return {"out_obj_ids": list(range(len(self._sessions[sid]["blobs"])))}
+
+    def remove_object(self, sid: int, obj_id: int) -> None:
+        self._sessions[sid]["removed"].add(int(obj_id))
+
+    def propagate(self, sid: int) -> Dict[int, Dict]:
+        return dict(self.propagate_stream(sid))
+
+    def propagate_stream(self, sid: int):
+        """Yields (frame_idx, frame output) one frame at a time, like SAM3's streaming request."""
+        session = self._sessions[sid]
+        num_frames, height, width = session["shape"]
+        ys, xs = np.ogrid[:height, :width]
+        obj_ids = np.array([i for i in range(len(session["blobs"])) if i not in session["removed"]], dtype=int)
+
+        for t in range(num_frames):
+            masks = np.zeros((len(obj_ids), height, width), dtype=bool)
+            for i, obj_id in enumerate(obj_ids):
+                blob = session["blobs"][obj_id]
+                cx, cy = blob["center"] + t * blob["velocity"]
+                ax, ay = blob["axes"]
+                masks[i] = ((xs - cx) / ax) ** 2 + ((ys - cy) / ay) ** 2 <= 1
+            if self.frame_delay:
+                time.sleep(self.frame_delay)
+            yield t, {
+                "out_obj_ids": obj_ids,
+                "out_probs": np.ones(len(obj_ids), dtype=np.float32),
+                "out_binary_masks": masks,
+            }
+
+    def close_session(self, sid: int) -> None:
+        self._sessions.pop(sid, None)
@@ -1,3 +1,5 @@
+import os
+import socket
 from pathlib import Path
 
 # get project root (current directory of this config file)
@@ -7,6 +9,12 @@ PROJECT_ROOT = Path(__file__).resolve().parent
 SFTP_USER = "sftpiodaa"
 SFTP_HOST = "88.189.55.27"
 SFTP_PORT = 22222
+SFTP_PASSWORD = os.environ.get("SFTP_PASSWORD")  # None -> clés SSH / agent
+SFTP_KEY_FILE = None
+SFTP_POOL_SIZE = 2          # sessions SSH ouvertes en parallèle
+SFTP_KEEPALIVE = 30         # seconds
+SFTP_RETRIES = 3            # tentatives si la connexion tombe
+SFTP_STRICT_HOST_KEY = True # refuser les hôtes absents de known_hosts
 
 REMOTE_DIR = "/PACECOWVID"
 UPLOAD_DIR = "/PACECOWVID/ViTCow_upload"
@@ -18,17 +26,55 @@ FARM_NAMES = {
             "SAULAIE": REMOTE_DIR + "/SAULAIE/20250327 - Saulaie - Regis Bedouet"
             }
 TEST_FOLDER="CORDEMAIS"
+UPLOAD_INDEX_FILE = PROJECT_ROOT / "upload_index.txt"  # cache local des fichiers uploadés
+UPLOAD_INDEX_REFRESH = False  # True -> re-lister UPLOAD_DIR au démarrage
+CATALOG_DB = PROJECT_ROOT / "catalog.sqlite"  # catalogue local des vidéos sources
+CATALOG_LIST_WORKERS = 8  # listings SFTP simultanés (bornés par SFTP_POOL_SIZE)
+JOURNAL_DB = PROJECT_ROOT / "journal.sqlite"  # journal des vidéos / clips / crops traités (reprise)
+JOURNAL_MAX_ATTEMPTS = 2  # une vidéo en échec est re-tirée jusqu'à ce nombre de tentatives
+SAMPLER_SEED = 0  # graine du tirage des vidéos et des fenêtres de clips
+
+# FILE DE TRAVAIL PARTAGÉE (plusieurs machines, voir pipeline/work_queue.py)
+WORK_QUEUE = None             # None : tirage local ; chemin SQLite ou "http://coordinateur:8765"
+WORK_QUEUE_LEASE = 1800       # seconds : une vidéo non renouvelée retourne dans la file
+WORK_QUEUE_HEARTBEAT = 60     # seconds entre deux renouvellements des baux
+WORK_QUEUE_BIND = "127.0.0.1" # adresse d'écoute du coordinateur (aucune authentification)
+NODE_NAME = os.environ.get("NODE_NAME", f"{socket.gethostname()}-{os.getpid()}")
 PRETRAIN_DIR= "pretraining_dataset"
+PRETRAIN_STREAMS = 8  # téléchargements simultanés du dataset de prétraining (une session SSH chacun)
+SHARD_SIZE = 512      # échantillons par shard (memmap : ~3 Mo par échantillon)
+SHARD_WORKERS = 8     # processus de décodage pour l'export en shards
 
 # FOLDER MANAGEMENT 
 CLIP_FOLDER = PROJECT_ROOT / "clips"
 CROP_FOLDER = PROJECT_ROOT / "crops"
 LOCAL_TMP_DIR = PROJECT_ROOT / "data"   # for sftp downloads
+# Cache des vidéos sources téléchargées (utilisé quand RANGED_READS = False)
+VIDEO_CACHE_DIR = LOCAL_TMP_DIR / "cache"
+VIDEO_CACHE_BYTES = 20 * 1024**3  # budget disque, éviction LRU au-delà
+PREFETCH_DEPTH = 4                # vidéos téléchargées à l'avance
 
 # EXTRACTION / CROP PARAMS
 NUM_FRAMES_PER_CLIP = 20
 FRAME_STEP = 4
 NUM_CLIP = 10
+# True : frames échantillonnées en mémoire (decord) et partagées avec les workers SAM,
+# aucun clip intermédiaire écrit dans CLIP_FOLDER
+IN_MEMORY_CLIPS = True
+# True (avec IN_MEMORY_CLIPS) : pas de téléchargement complet, seuls les blocs
+# nécessaires aux fenêtres échantillonnées sont lus sur le SFTP
+RANGED_READS = True
+REMOTE_BLOCK_SIZE = 1024 * 1024   # bytes
+REMOTE_CACHE_BLOCKS = 64          # blocs gardés en mémoire par fichier
+REMOTE_READAHEAD_BLOCKS = 4       # blocs lus en plus après un défaut de cache
+# Pré-sélection des fenêtres : PRESCREEN_CANDIDATES fenêtres sondées (3 frames réduites
+# chacune), les NUM_CLIP plus animées et mieux exposées sont envoyées à SAM (0 : désactivé).
+# En lecture par plages, les sondes sont les images clés qui précèdent ces 3 frames (un GOP
+# lu par sonde au plus) et les fenêtres retenues sont relues : moins de candidates
+PRESCREEN_CANDIDATES = 2 * NUM_CLIP
+PRESCREEN_RANGED_CANDIDATES = NUM_CLIP + NUM_CLIP // 2
+PRESCREEN_MIN_BRIGHTNESS = 40     # luminosité moyenne (0-255) en dessous : fenêtre rejetée (nuit)
+PRESCREEN_MAX_BRIGHTNESS = 230    # au-dessus : fenêtre rejetée (surexposée)
 
 CROP_SIZE = 224
 PROMPT_CLASS = "cow"
@@ -39,6 +85,49 @@ SAFETY_MARGIN = 0.1  # 10% margin
 START = 9
 END = 17
 
+# SAM WORKERS (processus résidents, modèle chargé une seule fois)
+NUM_SAM_WORKERS = 1
+SAM_JOB_TIMEOUT = 600  # seconds per clip, model loading excluded
+CROP_WRITER_THREADS = 2  # écriture des crops en parallèle de l'inférence du clip suivant
+CROP_ENCODER_THREADS = 4  # threads d'encodage par clip (chacun écrit un groupe d'objets)
+# True : boîtes calculées et crops encodés frame par frame pendant propagate (mémoire
+# bornée par le nombre d'objets) ; False : masques RLE de tout le clip, puis écriture
+STREAM_CROPS = True
+SAM_SESSION_FACTORY = "sam.sam_session:SAMSession"  # "module:Classe" chargée par chaque worker
+
+# OBJETS (pipeline/object_chunks.py) : plafond de détections appliqué au modèle au
+# chargement (remplace update_max_objects.sh), suivi par paquets tenant dans le budget mémoire
+MAX_NUM_OBJECTS = 256             # détections max par clip ; n'entre pas dans la taille des paquets
+SAM_MAX_CHUNK_OBJECTS = None      # plafond optionnel d'un paquet (None : seul le budget mémoire décide)
+SAM_MEMORY_BUDGET_MB = None       # mémoire pour le suivi d'un paquet (None : SAM_MEMORY_FRACTION du GPU libre)
+SAM_MEMORY_FRACTION = 0.8
+SAM_MEMORY_PER_OBJECT_MB = 300    # estimation initiale par objet, corrigée par les pics mesurés sur GPU
+
+# INFERENCE (pipeline/inference.py, appliqué à la session de chaque worker)
+INFERENCE_DEVICE = "auto"   # "auto" (cuda, puis mps, sinon cpu), "cuda", "mps", "cpu"
+INFERENCE_DTYPE = "auto"    # "auto" (bf16 sur GPU, fp32 sur CPU), "bf16", "fp16", "fp32"
+INFERENCE_INT8 = False      # quantification dynamique int8 des couches linéaires (CPU uniquement)
+INFERENCE_THREADS = None    # threads torch par worker (None : cœurs / NUM_SAM_WORKERS sur CPU)
+INFERENCE_COMPILE = False   # torch.compile du modèle (premiers clips plus lents)
+
+# PIPELINE STAGES (nombre de threads par étape, taille des files entre étapes)
+STAGE_WORKERS = {
+    "download": 2,
+    "clip": 1,
+    "sam": NUM_SAM_WORKERS,  # un thread par worker SAM pour les garder occupés
+    "upload": 2,
+    "cleanup": 1,
+}
+STAGE_QUEUE_SIZE = 4
+
+# METRICS (spans JSONL + métriques Prometheus, voir pipeline/metrics.py)
+METRICS_FILE = PROJECT_ROOT / "metrics.jsonl"
+METRICS_PROM_FILE = PROJECT_ROOT / "metrics.prom"  # format textfile de node_exporter
+METRICS_PORT = None            # ex. 9108 pour servir /metrics en HTTP
+METRICS_BIND = "127.0.0.1"     # adresse d'écoute de /metrics (aucune authentification)
+METRICS_FLUSH_INTERVAL = 15    # seconds entre deux écritures de METRICS_PROM_FILE
+SAM_PROFILE_DIR = None         # ex. PROJECT_ROOT / "profiles" : cProfile de chaque job SAM
+
 # creates folders automatically 
 for d in [CLIP_FOLDER, CROP_FOLDER, LOCAL_TMP_DIR]:
     d.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
@@ -1,6 +1,7 @@
 import os
-from config import NUM_FRAMES_PER_CLIP, PRETRAIN_DIR
+from config import NUM_FRAMES_PER_CLIP, PRETRAIN_DIR, PRETRAIN_STREAMS, SHARD_SIZE, SHARD_WORKERS
 from pipeline.cloud import download_sftp_pretrain_dataset
+from pipeline.shards import write_memmap_shards, write_tar_shards
 import argparse
 from typing import List, Dict
 
@@ -34,10 +35,20 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--download", action="store_true", default=False,
                         help="Télécharger le dataset depuis le SFTP")
+    parser.add_argument("--streams", type=int, default=PRETRAIN_STREAMS,
+                        help="Nombre de téléchargements simultanés")
+    parser.add_argument("--shards", choices=["none", "memmap", "tar", "tar-frames"], default="none",
+                        help="Export supplémentaire en shards : memmap uint8 + index, "
+                             "ou tar WebDataset (mp4 ou frames décodées)")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="Nombre d'échantillons par shard")
+    parser.add_argument("--workers", type=int, default=SHARD_WORKERS,
+                        help="Processus de décodage")
     args = parser.parse_args()
 
     if args.download:
-        dataset = download_sftp_pretrain_dataset()
+        # Reprise possible : les vidéos déjà téléchargées ne sont pas re-transférées
+        dataset = download_sftp_pretrain_dataset(streams=args.streams)
     else:
         dataset = get_train_test_local_paths()
 
@@ -45,3 +56,13 @@ if __name__ == "__main__":
                         out_file=f"{PRETRAIN_DIR}/train.csv")
     build_videomae_list(video_paths=dataset["test"], 
                         out_file=f"{PRETRAIN_DIR}/test.csv")
+
+    # Shards par split : le découpage train / test est conservé
+    shard_dir = os.path.join(PRETRAIN_DIR, "shards")
+    for split in ("train", "test"):
+        paths = sorted(dataset[split])
+        if args.shards == "memmap":
+            write_memmap_shards(paths, shard_dir, split, args.shard_size, args.workers)
+        elif args.shards in ("tar", "tar-frames"):
+            write_tar_shards(paths, shard_dir, split, args.shard_size,
+                             frames=args.shards == "tar-frames", workers=args.workers)
@@ -1,110 +1,421 @@
 import os
-import subprocess
+import shutil
 import logging
+import threading
+from collections import deque
 import config
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Union
 from video.clipper import extract_clips, is_daytime_video
-from pipeline.cloud import list_sftp_videos, download_sftp_video, remove_video, upload_video, check_if_exists
-import json
-import random
+from pipeline.catalog import VideoCatalog
+from pipeline.cloud import download_sftp_video, remove_video, upload_crops, check_if_exists
+from pipeline.frames import ClipFrames, sample_clips, sample_clips_seekable, source_name
+from pipeline import journal as states
+from pipeline.journal import WorkJournal
+from pipeline.metrics import MetricsExporter, metrics
+from pipeline.remote_file import open_remote_video
+from pipeline.sampler import StratifiedSampler, video_rng
+from pipeline.stages import Stage, StagePipeline
+from pipeline.upload_index import get_upload_index
+from pipeline.video_cache import Prefetcher, SourceVideoCache
+from pipeline.work_queue import LeaseKeeper, open_work_queue
+from pipeline.worker import SAMWorkerPool, ClipProcessingError, WorkerCrashed
 
 logging.basicConfig(
     filename="pipeline.log",
     level=logging.INFO,
-    format="%(asctime)s | %(levelname)s | %(message)s",
+    format="%(asctime)s | %(levelname)s | %(threadName)s | %(message)s",
 )
 
-logging.info("Pipeline started")
+# Nombre max de vidéos tirées par exécution (sans remise, voir StratifiedSampler)
+NUM_ITERATIONS = 1000
+
+
+@dataclass
+class VideoJob:
+    """A source video travelling through the pipeline."""
+    filename: str
+    alias: str
+    size: Optional[int] = None
+    mtime: Optional[int] = None
+    local_path: Optional[str] = None
+    clip_dir: Optional[str] = None
+    pending: int = 0
+    processed: int = 0
+    skipped: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def as_row(self) -> Dict:
+        """Catalog-style row, as expected by SourceVideoCache."""
+        return {"filename": self.filename, "alias": self.alias, "size": self.size, "mtime": self.mtime}
+
+
+@dataclass
+class ClipJob:
+    """A clip cut from a VideoJob, and the crops SAM produced for it.
+
+    source is the clip file path, or its frames in memory (IN_MEMORY_CLIPS).
+    """
+    video: VideoJob
+    source: Union[str, ClipFrames, None]
+    crops: List[str] = field(default_factory=list)
+    failed: bool = False
+
+    def __post_init__(self):
+        self.name = source_name(self.source)
+
 
 def clean_mp4_files(folder_path: str):
     if os.path.exists(folder_path):
-        for f in os.listdir(folder_path):
-            if f.lower().endswith(".mp4"):
-                file_path = os.path.join(folder_path, f)
-                try:
-                    os.unlink(file_path)
-                except Exception as e:
-                    logging.error(f"Erreur lors de la suppression de {file_path}: {e}")
+        for root, _, files in os.walk(folder_path):
+            for f in files:
+                if f.lower().endswith(".mp4"):
+                    file_path = os.path.join(root, f)
+                    try:
+                        os.unlink(file_path)
+                    except Exception as e:
+                        logging.error(f"Erreur lors de la suppression de {file_path}: {e}")
+
+
+def build_pipeline(pool: SAMWorkerPool, journal: WorkJournal,
+                   cache: Optional[SourceVideoCache] = None,
+                   leases: Optional[LeaseKeeper] = None) -> StagePipeline:
+    """Builds the download -> clip -> SAM -> upload -> cleanup pipeline.
+
+    Every video / clip / crop transition is recorded in the journal. With a
+    cache, source videos are taken from (and kept in) the local video cache
+    instead of being downloaded and deleted for every pick. With leases,
+    finished videos are reported to the shared work queue.
+    """
+    ranged_reads = config.RANGED_READS and config.IN_MEMORY_CLIPS
+
+    def finish(video: VideoJob, state: str, detail: Optional[str] = None) -> None:
+        journal.video(video.alias, video.filename, state, detail)
+        if leases is not None:
+            leases.complete(video.alias, video.filename, ok=state == states.VIDEO_DONE)
+        finish_video(video)
+
+    def download(video: VideoJob):
+        journal.video(video.alias, video.filename, states.VIDEO_STARTED)
+        if ranged_reads:
+            # Lecture par plages directement depuis le SFTP à l'étape clip
+            return [video]
+        try:
+            if cache is not None:
+                video.local_path = cache.get(video.as_row())
+            else:
+                video.local_path = download_sftp_video(video.filename, video.alias)
+        except Exception as e:
+            finish(video, states.VIDEO_FAILED, repr(e))
+            raise
+        return [video]
+
+    def clip(video: VideoJob):
+        # Fenêtres tirées avec une graine propre à la vidéo : mêmes clips après une reprise
+        rng = video_rng(config.SAMPLER_SEED, video.alias, video.filename)
+        try:
+            with metrics.span("extract_clips", file=video.filename) as span:
+                if ranged_reads:
+                    with open_remote_video(video.filename, video.alias, video.size) as remote:
+                        sources = sample_clips_seekable(
+                            remote,
+                            config.NUM_FRAMES_PER_CLIP,
+                            config.FRAME_STEP,
+                            config.NUM_CLIP,
+                            video.alias,
+                            rng=rng,
+                            candidates=config.PRESCREEN_RANGED_CANDIDATES,
+                        )
+                        span["bytes"] = remote.raw.bytes_transferred
+                elif config.IN_MEMORY_CLIPS:
+                    # Frames échantillonnées lues une seule fois, aucun clip écrit sur disque
+                    sources = sample_clips(
+                        video.local_path,
+                        config.NUM_FRAMES_PER_CLIP,
+                        config.FRAME_STEP,
+                        config.NUM_CLIP,
+                        video.alias,
+                        rng=rng,
+                        candidates=config.PRESCREEN_CANDIDATES,
+                    )
+                else:
+                    sources = extract_clip_files(video)
+                span["clips"] = len(sources)
+                span["frames"] = len(sources) * config.NUM_FRAMES_PER_CLIP
+        except Exception as e:
+            finish(video, states.VIDEO_FAILED, repr(e))
+            raise
+        finally:
+            if cache is not None:
+                cache.release(video.as_row())
+            elif video.local_path:
+                remove_video(video.local_path)
+
+        journal.video(video.alias, video.filename, states.VIDEO_CLIPPED, f"{len(sources)} clips")
+        done_clips = journal.done_clips(video.alias, video.filename)
+
+        clip_jobs = []
+        for source in sources:
+            clip_name = os.path.basename(source_name(source))
+
+            # Vérifier si le clip a déjà été traité (journal local, puis UPLOAD_DIR)
+            if clip_name in done_clips or check_if_exists(clip_name):
+                logging.info("Clip %s already processed, skipping.", clip_name)
+                journal.clip(video.alias, video.filename, clip_name, states.CLIP_SKIPPED)
+                video.skipped += 1
+                if isinstance(source, str):
+                    remove_video(source)
+                continue
+            journal.clip(video.alias, video.filename, clip_name, states.CLIP_SAMPLED)
+            clip_jobs.append(ClipJob(video, source))
+
+        video.pending = len(clip_jobs)
+        if not clip_jobs:
+            finish(video, states.VIDEO_DONE)
+            return None
+        # Tous les clips d'une vidéo partent ensemble vers un worker SAM
+        return [clip_jobs]
 
-clean_mp4_files(config.CLIP_FOLDER)
-clean_mp4_files(config.CROP_FOLDER)
+    def sam(clip_jobs: List[ClipJob]):
+        video = clip_jobs[0].video
+        logging.info("Processing %d clips of %s", len(clip_jobs), video.filename)
+        try:
+            results = pool.process_batch([job.source for job in clip_jobs])
+        except Exception as e:
+            # Toute erreur (pas seulement ClipProcessingError / WorkerCrashed) : les clips
+            # continuent vers l'upload et le nettoyage, qui terminent la vidéo
+            if isinstance(e, (ClipProcessingError, WorkerCrashed)):
+                logging.error("Batch processing failed: %s", e)
+            else:
+                logging.exception("Batch processing failed on %s", video.filename)
+            for job in clip_jobs:
+                job.failed = True
+                journal.clip(video.alias, video.filename, job.name, states.CLIP_FAILED, str(e))
+            return [clip_jobs]
+
+        for job in clip_jobs:
+            result = results.get(job.name) or {"paths": [], "error": "No result returned by the worker"}
+            if result["error"]:
+                logging.error("Clip processing failed: %s", job.name)
+                logging.error("%s", result["error"])
+                job.failed = True
+                journal.clip(video.alias, video.filename, job.name, states.CLIP_FAILED, result["error"])
+            else:
+                journal.clip(video.alias, video.filename, job.name, states.CLIP_PROCESSED,
+                             f"{len(result['paths'])} crops")
+            job.crops = result["paths"]
+            for out_path in job.crops:
+                journal.crop(video.alias, video.filename, os.path.basename(out_path), states.CROP_WRITTEN)
+            logging.info("out_all_paths: %s", job.crops)
+        # Les crops d'une même vidéo source partent ensemble à l'upload
+        return [clip_jobs]
 
-videos_path = list_sftp_videos(config.FARM_NAMES)
+    def upload(clip_jobs: List[ClipJob]):
+        video = clip_jobs[0].video
+        crops = [out_path for job in clip_jobs for out_path in job.crops]
+        failed = set(crops)
+        if crops:
+            try:
+                result = upload_crops(crops, video.alias, video.filename)
+                # Crops envoyés mais sans manifeste : la vidéo n'est pas terminée
+                failed = set() if result.ok else set(result.failed or crops)
+            except Exception:
+                logging.exception("Upload failed: %d crops of %s", len(crops), video.filename)
+        for job in clip_jobs:
+            for out_path in job.crops:
+                if out_path in failed:
+                    logging.error("Upload failed: %s", out_path)
+                    job.failed = True
+                else:
+                    journal.crop(video.alias, video.filename, os.path.basename(out_path), states.CROP_UPLOADED)
+            if not job.failed:
+                journal.clip(video.alias, video.filename, job.name, states.CLIP_UPLOADED)
+        # Chaque clip est ensuite nettoyé séparément
+        return clip_jobs
 
-# Sauvegarder videos_path avant filtrage
-with open("videos_before_filter.json", "w") as f:
-    json.dump(videos_path, f, indent=2)
+    def cleanup(job: ClipJob):
+        # toujours supprimer le clip et les crops, même si erreur
+        for out_path in job.crops:
+            remove_video(out_path)
+        if isinstance(job.source, str):
+            remove_video(job.source)
+        job.source = None  # libère les frames en mémoire
 
-videos_path = [path for path in videos_path if is_daytime_video(path.get("filename", ""), config.START, config.END)]
+        video = job.video
+        with video.lock:
+            video.processed += 1
+            video.pending -= 1
+            done = video.pending == 0
+        if done:
+            # Source consommée par SAM : jamais re-tirée, même si des clips ont échoué
+            finish(video, states.VIDEO_DONE)
 
-# Sauvegarder videos_path après filtrage
-with open("videos_after_filter.json", "w") as f:
-    json.dump(videos_path, f, indent=2)
+    workers = config.STAGE_WORKERS
+    return StagePipeline(
+        [
+            Stage("download", download, workers["download"]),
+            Stage("clip", clip, workers["clip"]),
+            Stage("sam", sam, workers["sam"]),
+            Stage("upload", upload, workers["upload"]),
+            Stage("cleanup", cleanup, workers["cleanup"]),
+        ],
+        queue_size=config.STAGE_QUEUE_SIZE,
+    )
 
-random.shuffle(videos_path)
 
-for iteration in range(1000):
-    video_path = random.choice(videos_path)
-    alias = video_path["alias"]
-    
-    local_path = download_sftp_video(video_path["filename"], alias)
+def extract_clip_files(video: VideoJob) -> List[str]:
+    """Cuts the clips of a video into its own folder of CLIP_FOLDER."""
+    stem = os.path.splitext(os.path.basename(video.local_path))[0]
+    # Un dossier de clips par vidéo : plusieurs vidéos peuvent être en cours
+    video.clip_dir = os.path.join(config.CLIP_FOLDER, stem)
+    shutil.rmtree(video.clip_dir, ignore_errors=True)
+    os.makedirs(video.clip_dir)
 
     extract_clips(
-        local_path,
-        config.CLIP_FOLDER,
+        video.local_path,
+        video.clip_dir,
         config.NUM_FRAMES_PER_CLIP,
         config.FRAME_STEP,
         config.NUM_CLIP,
-        alias,
+        video.alias,
     )
+    return [os.path.join(video.clip_dir, clip_name)
+            for clip_name in sorted(os.listdir(video.clip_dir))
+            if clip_name.lower().endswith(".mp4")]
 
-    remove_video(local_path)
 
-    clips_to_process = [clip for clip in sorted(os.listdir(config.CLIP_FOLDER))]
-    processed_count = 0
+def finish_video(video: VideoJob) -> None:
+    if video.clip_dir:
+        shutil.rmtree(video.clip_dir, ignore_errors=True)
+    logging.info("Finished video %s", os.path.basename(video.filename))
+    logging.info("Processing complete: %d clips processed, %d clips skipped.",
+                 video.processed, video.skipped)
 
-    for clip in clips_to_process:
-        if not clip.lower().endswith(".mp4"):
-            continue
 
-        # Vérifier si le clip a déjà été traité
-        if check_if_exists(clip):
-            logging.info("Clip %s already processed, skipping.", clip)
-            continue
+def run(pool: SAMWorkerPool, journal: WorkJournal, videos_path: List[Dict],
+        num_videos: int = NUM_ITERATIONS) -> None:
+    """Draws up to num_videos catalog videos and runs them through the pipeline.
 
-        processed_count += 1
+    With WORK_QUEUE set, the videos are claimed from the queue shared with the
+    other nodes (in the same stratified order) instead of drawn locally.
 
-        clip_path = os.path.join(config.CLIP_FOLDER, clip)
-        logging.info("Processing clip %s", clip_path)
+    Args:
+        pool (SAMWorkerPool): Resident SAM workers.
+        journal (WorkJournal): Work journal (finished videos are not drawn).
+        videos_path (List[Dict]): Catalog rows to sample from.
+        num_videos (int): Max number of videos drawn.
+    """
+    # Tirage stratifié par ferme, sans remise ; le journal permet la reprise
+    sampler = StratifiedSampler(
+        videos_path,
+        seed=config.SAMPLER_SEED,
+        exclude=journal.finished_videos(),
+        first=journal.interrupted_videos(),
+    )
+    logging.info("%d videos left to process", len(sampler))
 
-        try:
-            result = subprocess.run(
-                ["python", "process_clip.py", clip_path],
-                capture_output=True,
-                text=True,
-                check=True
-            )
-
-            # Prendre uniquement la dernière ligne du stdout pour le JSON
-            json_line = result.stdout.strip().splitlines()[-1]
-            out_all_paths = json.loads(json_line)
-
-            logging.info("out_all_paths: %s", out_all_paths)
-            for out_path in out_all_paths:
-                upload_video(out_path, alias)
-                remove_video(out_path)
-
-        except subprocess.CalledProcessError as e:
-            logging.error("Clip processing failed: %s", clip_path)
-            logging.error("STDOUT: %s", e.stdout)
-            logging.error("STDERR: %s", e.stderr)
-            continue  # passe au clip suivant
+    cache = prefetcher = None
+    if not (config.RANGED_READS and config.IN_MEMORY_CLIPS):
+        cache = SourceVideoCache()
+        prefetcher = Prefetcher(cache)
 
-        finally:
-            # toujours supprimer le clip même si erreur
-            remove_video(clip_path)
+    work_queue = leases = None
+    if config.WORK_QUEUE:
+        work_queue = open_work_queue(config.WORK_QUEUE)
+        # Chaque nœud ajoute le catalogue ; les vidéos déjà connues de la file sont ignorées
+        added = work_queue.populate(sampler)
+        logging.info("Work queue: %d videos added, %s", added, work_queue.stats())
+        leases = LeaseKeeper(work_queue)
+
+    def picked():
+        # Tirages faits à l'avance pour pouvoir précharger les prochaines vidéos
+        picks = sampler.draw(num_videos)
+        if prefetcher is not None:
+            for video_path in picks[:config.PREFETCH_DEPTH]:
+                prefetcher.schedule(video_path)
+
+        for iteration, video_path in enumerate(picks):
+            ahead = iteration + config.PREFETCH_DEPTH
+            if prefetcher is not None and ahead < len(picks):
+                prefetcher.schedule(picks[ahead])
+            yield video_path
+
+    def claimed():
+        # Vidéos réservées une à une dans la file partagée ; PREFETCH_DEPTH d'avance seulement
+        # si elles sont préchargées, sinon les autres nœuds pourraient les traiter
+        depth = config.PREFETCH_DEPTH if prefetcher is not None else 0
+        ahead = deque()
+        for _ in range(num_videos):
+            while len(ahead) <= depth:
+                batch = leases.claim(1)
+                if not batch:
+                    break
+                ahead.append(batch[0])
+                if prefetcher is not None:
+                    prefetcher.schedule(batch[0])
+            if not ahead:
+                logging.info("Work queue empty: %s", work_queue.stats())
+                return
+            yield ahead.popleft()
+
+    def source():
+        for video_path in (claimed() if leases is not None else picked()):
+            yield VideoJob(video_path["filename"], video_path["alias"],
+                           video_path.get("size"), video_path.get("mtime"))
+
+    pipeline = build_pipeline(pool, journal, cache, leases)
+    try:
+        pipeline.run(source())
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+            logging.info("Video cache: %d hits, %d misses", cache.hits, cache.misses)
+        if leases is not None:
+            # Baux restants (vidéos réservées d'avance ou interrompues) rendus à la file
+            leases.close()
+            work_queue.close()
+
+
+def main() -> None:
+    logging.info("Pipeline started")
+
+    metrics.configure(config.METRICS_FILE)
+    exporter = MetricsExporter(metrics, config.METRICS_PROM_FILE, config.METRICS_PORT,
+                               config.METRICS_FLUSH_INTERVAL, config.METRICS_BIND)
+
+    clean_mp4_files(config.CLIP_FOLDER)
+    clean_mp4_files(config.CROP_FOLDER)
+
+    # Index des clips déjà uploadés : un seul listing de UPLOAD_DIR
+    get_upload_index()
+
+    # Catalogue persistant : seuls les dossiers Dxx modifiés sont re-listés
+    catalog = VideoCatalog()
+    catalog.refresh(config.FARM_NAMES)
+    videos_path = catalog.query(start=config.START, end=config.END)
+    logging.info("%d daytime videos in catalog", len(videos_path))
+    # Sélection SQL comparée à l'ancien filtre par nom de fichier
+    differing = catalog.check_daytime_filter(is_daytime_video, config.START, config.END)
+    if differing:
+        logging.warning("Catalog daytime selection differs from is_daytime_video on %d videos, e.g. %s",
+                        len(differing), differing[:5])
+
+    journal = WorkJournal()
+    logging.info("Journal: %s", journal.summary())
+    try:
+        # Les workers SAM restent chargés pendant toute la durée du pipeline
+        with SAMWorkerPool() as pool:
+            run(pool, journal, videos_path)
+    except KeyboardInterrupt:
+        logging.warning("Pipeline interrupted")
+        return
+    finally:
+        logging.info("Journal: %s", journal.summary())
+        journal.close()
+        exporter.close()
+
+    logging.info("Pipeline finished")
 
-    logging.info("Finished video %s", os.path.basename(local_path))
-    logging.info("Processing complete: %d clips processed, %d clips skipped.",
-             processed_count,len(clips_to_process) - processed_count)
 
-logging.info("Pipeline finished")
+if __name__ == "__main__":
+    main()
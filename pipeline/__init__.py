@@ -1,3 +1,3 @@
-from .extractor import run_extraction
+from .extractor import run_batch_extraction, run_extraction
 
-__all__ = ["run_extraction"]
+__all__ = ["run_extraction", "run_batch_extraction"]
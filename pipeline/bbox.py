@@ -0,0 +1,145 @@
+"""Vectorized bounding boxes for every object on every frame.
+
+``masks_to_bboxes`` replaces the per-mask ``mask_to_bbox`` loop: it takes a
+stack of masks ``[..., H, W]`` (typically ``[frames, objects, H, W]``) and
+returns all boxes and the presence matrix with a handful of NumPy reductions,
+including the SAFETY_MARGIN expansion. Masks kept as RLE (``MaskStore``) are
+boxed from their run lengths, without decoding them.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import config
+
+BBox = Tuple[int, int, int, int]
+
+# Nombre de frames empilées à la fois (borne la mémoire du stack dense)
+FRAME_CHUNK = 8
+
+
+def _to_numpy(mask) -> np.ndarray:
+    if hasattr(mask, "detach"):  # torch.Tensor
+        mask = mask.detach().cpu().numpy()
+    return np.asarray(mask)
+
+
+def masks_to_bboxes(masks, margin: float = config.SAFETY_MARGIN) -> Tuple[np.ndarray, np.ndarray]:
+    """Computes the bounding boxes of a stack of binary masks.
+
+    Args:
+        masks: Array or tensor of shape [..., H, W] (non-zero = object).
+        margin (float): Expansion of each box, as a fraction of its largest side.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: boxes [..., 4] as int (x1, y1, x2, y2),
+            inclusive and clipped to the frame, and present [...] (bool).
+            Boxes of absent objects are zeros.
+    """
+    masks = _to_numpy(masks).astype(bool, copy=False)
+    height, width = masks.shape[-2:]
+
+    rows = masks.any(axis=-1)  # [..., H]
+    cols = masks.any(axis=-2)  # [..., W]
+    present = rows.any(axis=-1)
+
+    y1 = rows.argmax(axis=-1)
+    y2 = height - 1 - rows[..., ::-1].argmax(axis=-1)
+    x1 = cols.argmax(axis=-1)
+    x2 = width - 1 - cols[..., ::-1].argmax(axis=-1)
+
+    boxes = np.stack([x1, y1, x2, y2], axis=-1).astype(np.float32)
+    return expand_boxes(boxes, present, height, width, margin), present
+
+
+def expand_boxes(boxes: np.ndarray, present: np.ndarray, height: int, width: int,
+                 margin: float = config.SAFETY_MARGIN) -> np.ndarray:
+    """Adds the safety margin to inclusive (x1, y1, x2, y2) boxes and clips them to the frame.
+
+    Returns:
+        np.ndarray: int64 boxes, zeros where present is False.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32)
+    if margin:
+        side = np.maximum(boxes[..., 2] - boxes[..., 0], boxes[..., 3] - boxes[..., 1]) + 1
+        pad = np.round(side * margin)[..., None]
+        boxes += np.concatenate([-pad, -pad, pad, pad], axis=-1)
+
+    boxes = boxes.astype(np.int64)
+    np.clip(boxes[..., 0::2], 0, width - 1, out=boxes[..., 0::2])
+    np.clip(boxes[..., 1::2], 0, height - 1, out=boxes[..., 1::2])
+    boxes[~present] = 0
+    return boxes
+
+
+def frame_bboxes(frame_output: Dict, obj_ids: List[int],
+                 margin: float = config.SAFETY_MARGIN) -> Dict[int, Optional[BBox]]:
+    """Boxes of obj_ids on one frame of SAM3's streamed output.
+
+    Args:
+        frame_output (Dict): {"out_obj_ids", "out_binary_masks", ...} of the frame.
+        obj_ids (List[int]): Objects to box.
+        margin (float): Safety margin (fraction of the largest box side).
+
+    Returns:
+        Dict[int, Optional[BBox]]: {obj_id: box, or None if absent from the frame}.
+    """
+    frame_ids = [int(obj_id) for obj_id in _to_numpy(frame_output["out_obj_ids"]).reshape(-1)]
+    keep = set(obj_ids)
+    wanted = [(i, obj_id) for i, obj_id in enumerate(frame_ids) if obj_id in keep]
+    result: Dict[int, Optional[BBox]] = {obj_id: None for obj_id in obj_ids}
+    if not wanted:
+        return result
+    masks = _to_numpy(frame_output["out_binary_masks"])
+    masks = masks.reshape((-1,) + masks.shape[-2:])[[i for i, _ in wanted]]
+    boxes, present = masks_to_bboxes(masks, margin)
+    for (_, obj_id), box, found in zip(wanted, boxes.tolist(), present.tolist()):
+        result[obj_id] = tuple(box) if found else None
+    return result
+
+
+def bboxes_from_outputs(outputs: Dict[int, Dict[int, object]], obj_ids: List[int],
+                        margin: float = config.SAFETY_MARGIN) -> Dict[int, Dict[int, Optional[BBox]]]:
+    """Boxes of every object on every frame of a propagate() output.
+
+    Args:
+        outputs (Dict[int, Dict[int, mask]] | MaskStore): {frame_idx: {obj_id: mask}},
+            as returned by prepare_masks_for_visualization, or a MaskStore (RLE).
+        obj_ids (List[int]): Objects to box.
+        margin (float): Safety margin (fraction of the largest box side).
+
+    Returns:
+        Dict[int, Dict[int, Optional[BBox]]]: {obj_id: {frame_idx: box or None}},
+            the per-object layout expected by write_cropped.
+    """
+    if hasattr(outputs, "bboxes"):  # MaskStore : boîtes calculées sur les RLE
+        return outputs.bboxes(obj_ids, margin)
+
+    frame_idxs = sorted(outputs)
+    boxes_by_obj = {obj_id: {} for obj_id in obj_ids}
+    if not frame_idxs or not obj_ids:
+        return boxes_by_obj
+
+    shape = None
+    for masks in outputs.values():
+        if masks:
+            shape = _to_numpy(next(iter(masks.values()))).shape[-2:]
+            break
+    if shape is None:
+        return {obj_id: {idx: None for idx in frame_idxs} for obj_id in obj_ids}
+
+    for start in range(0, len(frame_idxs), FRAME_CHUNK):
+        chunk = frame_idxs[start:start + FRAME_CHUNK]
+        stack = np.zeros((len(chunk), len(obj_ids)) + tuple(shape), dtype=bool)
+        for f, idx in enumerate(chunk):
+            for o, obj_id in enumerate(obj_ids):
+                mask = outputs[idx].get(obj_id)
+                if mask is not None:
+                    stack[f, o] = _to_numpy(mask).reshape(shape)
+
+        boxes, present = masks_to_bboxes(stack, margin)
+        for f, idx in enumerate(chunk):
+            for o, obj_id in enumerate(obj_ids):
+                boxes_by_obj[obj_id][idx] = tuple(boxes[f, o].tolist()) if present[f, o] else None
+
+    return boxes_by_obj
@@ -0,0 +1,201 @@
+"""Persistent catalog of the source videos available on the SFTP server.
+
+The catalog is a SQLite file holding, for every video, its farm alias, its
+``Dxx`` folder, size, mtime and the capture hour parsed from the filename.
+``refresh()`` lists the ``Dxx`` folders concurrently and only re-lists those
+whose mtime changed since the previous run; ``query()`` then selects videos
+(e.g. daytime ones) with an indexed query instead of a new crawl.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import config
+from pipeline.transport import get_pool, is_dir
+
+FOLDER_PATTERN = re.compile(r"^D\d{2}$")
+VIDEO_PATTERN = re.compile(r"\.mp4$")
+# Horodatage de capture dans le nom, ex. 202502051430_D01.mp4 -> 14h
+TIMESTAMP_PATTERN = re.compile(r"(?:19|20)\d{2}[01]\d[0-3]\d[_\-T]?([0-2]\d)[0-5]\d")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    alias TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    mtime INTEGER,
+    PRIMARY KEY (alias, folder)
+);
+CREATE TABLE IF NOT EXISTS videos (
+    alias TEXT NOT NULL,
+    folder TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    hour INTEGER,
+    PRIMARY KEY (alias, filename)
+);
+CREATE INDEX IF NOT EXISTS idx_videos_hour ON videos (hour, alias);
+CREATE INDEX IF NOT EXISTS idx_videos_folder ON videos (alias, folder);
+"""
+
+
+def parse_capture_hour(filename: str) -> Optional[int]:
+    """Returns the capture hour encoded in a video filename, or None."""
+    match = TIMESTAMP_PATTERN.search(os.path.basename(filename))
+    if match is None:
+        return None
+    hour = int(match.group(1))
+    return hour if hour < 24 else None
+
+
+class VideoCatalog:
+    """SQLite-backed catalog of remote source videos.
+
+    Args:
+        db_path (str): SQLite file (":memory:" for a throwaway catalog).
+    """
+
+    def __init__(self, db_path: str = config.CATALOG_DB):
+        self.db_path = str(db_path)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _list_attrs(self, remote_path: str):
+        try:
+            return get_pool().run(lambda sftp: sftp.listdir_attr(remote_path))
+        except IOError as e:
+            logging.error("Cannot list %s: %s", remote_path, e)
+            return None
+
+    def refresh(self, folders_dict: Dict[str, str], full: bool = False) -> "VideoCatalog":
+        """Updates the catalog from the SFTP server.
+
+        Args:
+            folders_dict (Dict[str, str]): Alias -> remote farm directory.
+            full (bool): Re-list every folder, even those whose mtime is unchanged.
+        """
+        with ThreadPoolExecutor(max_workers=config.CATALOG_LIST_WORKERS) as executor:
+            # 1. Dossiers de ferme (un listing par alias, en parallèle)
+            farms = dict(zip(folders_dict, executor.map(self._list_attrs, folders_dict.values())))
+
+            known = {
+                (row["alias"], row["folder"]): row["mtime"]
+                for row in self._conn.execute("SELECT alias, folder, mtime FROM folders")
+            }
+
+            current: Dict[Tuple[str, str], int] = {}
+            to_list: List[Tuple[str, str, str]] = []
+            for alias, attrs in farms.items():
+                if attrs is None:
+                    # Ferme inaccessible : on garde ce que l'on connaît
+                    current.update({key: mtime for key, mtime in known.items() if key[0] == alias})
+                    continue
+                for attr in attrs:
+                    if not (is_dir(attr) and FOLDER_PATTERN.match(attr.filename)):
+                        continue
+                    key = (alias, attr.filename)
+                    current[key] = attr.st_mtime
+                    if full or known.get(key) != attr.st_mtime:
+                        path = f"{folders_dict[alias].rstrip('/')}/{attr.filename}"
+                        to_list.append((alias, attr.filename, path))
+
+            # 2. Dossiers Dxx nouveaux ou modifiés uniquement, en parallèle
+            listings = list(executor.map(lambda item: self._list_attrs(item[2]), to_list))
+
+        with self._lock, self._conn:
+            for alias, folder in set(known) - set(current):
+                self._conn.execute("DELETE FROM videos WHERE alias = ? AND folder = ?", (alias, folder))
+                self._conn.execute("DELETE FROM folders WHERE alias = ? AND folder = ?", (alias, folder))
+
+            for (alias, folder, _), attrs in zip(to_list, listings):
+                if attrs is None:
+                    continue
+                self._conn.execute("DELETE FROM videos WHERE alias = ? AND folder = ?", (alias, folder))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO videos (alias, folder, filename, size, mtime, hour) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (alias, folder, f"{folder}/{attr.filename}", attr.st_size, attr.st_mtime,
+                         parse_capture_hour(attr.filename))
+                        for attr in attrs if VIDEO_PATTERN.search(attr.filename)
+                    ],
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO folders (alias, folder, mtime) VALUES (?, ?, ?)",
+                    (alias, folder, current[(alias, folder)]),
+                )
+
+        logging.info("Catalog refreshed: %d folders re-listed out of %d, %d videos",
+                     len(to_list), len(current), self.count())
+        unparsed = self.without_hour()
+        if unparsed:
+            # Exclues de toute sélection par heure (hour >= ? est faux pour NULL)
+            logging.warning("%d videos without a capture hour in their name, never selected by "
+                            "START/END, e.g. %s", len(unparsed), unparsed[:5])
+        return self
+
+    def without_hour(self) -> List[str]:
+        """Filenames whose capture hour could not be parsed (hour IS NULL)."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                "SELECT filename FROM videos WHERE hour IS NULL ORDER BY alias, filename")]
+
+    def check_daytime_filter(self, is_daytime, start: int, end: int) -> List[str]:
+        """Filenames on which query(start, end) and a per-filename filter disagree.
+
+        Args:
+            is_daytime (Callable): is_daytime(filename, start, end) -> bool,
+                e.g. video.clipper.is_daytime_video.
+            start (int): First capture hour kept.
+            end (int): Last capture hour (exclusive in query()).
+
+        Returns:
+            List[str]: Videos selected by only one of the two filters.
+        """
+        selected = {row["filename"] for row in self.query(start=start, end=end)}
+        return [row["filename"] for row in self.query()
+                if (row["filename"] in selected) != bool(is_daytime(row["filename"], start, end))]
+
+    def query(self, start: Optional[int] = None, end: Optional[int] = None,
+              aliases: Optional[List[str]] = None) -> List[Dict]:
+        """Selects videos, optionally by capture hour and farm.
+
+        Args:
+            start (int, optional): First capture hour kept (inclusive).
+            end (int, optional): Last capture hour (exclusive).
+            aliases (List[str], optional): Farms to keep.
+
+        Returns:
+            List[Dict]: Dicts with 'filename', 'alias', 'folder', 'size', 'mtime', 'hour'.
+        """
+        clauses, params = [], []
+        if start is not None:
+            clauses.append("hour >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("hour < ?")
+            params.append(end)
+        if aliases is not None:
+            clauses.append(f"alias IN ({', '.join('?' for _ in aliases)})")
+            params.extend(aliases)
+
+        sql = "SELECT filename, alias, folder, size, mtime, hour FROM videos"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY alias, filename"
+
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
@@ -1,15 +1,18 @@
-import subprocess
 import os
 import logging
 import config
-import re
-from typing import Dict, List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from pipeline.catalog import VideoCatalog
+from pipeline.metrics import metrics
+from pipeline.transfer import (MANIFEST_SUFFIX, TransferItem, UploadResult, download_files,
+                               make_remote_dirs, read_manifest, upload_files)
+from pipeline.transport import get_pool, is_dir
+from pipeline.upload_index import get_upload_index
 
 # Import SFTP server params 
 from config import (
-    SFTP_USER,
-    SFTP_HOST,
-    SFTP_PORT,
     REMOTE_DIR,
     UPLOAD_DIR,
     LOCAL_TMP_DIR,
@@ -28,69 +31,35 @@ def list_sftp_videos(folders_dict: Dict[str, str]) -> List[Dict[str, str]]:
     Returns:
         List[Dict[str, str]]: List of dicts with 'filename' and 'alias' for each video found.
     """
-    folder_pattern = re.compile(r"^D\d{2}$")
-    video_pattern = re.compile(r"\.mp4$")
-
-    cmd = ["sftp", "-P", str(SFTP_PORT), f"{SFTP_USER}@{SFTP_HOST}"]
+    # Catalogue jetable en mémoire : mêmes listings parallèles que VideoCatalog
+    catalog = VideoCatalog(":memory:").refresh(folders_dict, full=True)
+    try:
+        return [{'filename': v['filename'], 'alias': v['alias']} for v in catalog.query()]
+    finally:
+        catalog.close()
 
-    all_videos = []
-
-    for alias, remote_path in folders_dict.items():
-        # First, list the farm directory to find DXX folders
-        proc = subprocess.run(
-            cmd,
-            input=f"ls \"{remote_path}\"\nexit\n",
-            capture_output=True,
-            text=True
-        )
 
-        subfolders = []
-        for line in proc.stdout.splitlines():
-            line = line.replace("sftp>", "").strip()
-            if not line:
-                continue
-            name = os.path.basename(line)
-            if folder_pattern.match(name):
-                subfolders.append(name)
-
-        # Then, for each DXX subfolder, list videos
-        for subfolder in subfolders:
-            subfolder_path = f"{remote_path.rstrip('/')}/{subfolder}"
-            proc_sub = subprocess.run(
-                cmd,
-                input=f"ls \"{subfolder_path}\"\nexit\n",
-                capture_output=True,
-                text=True
-            )
-
-            for line in proc_sub.stdout.splitlines():
-                line = line.replace("sftp>", "").strip()
-                if not line:
-                    continue
-                if video_pattern.search(line):
-                    all_videos.append({'filename': f"{subfolder}/{os.path.basename(line)}", 'alias': alias})
-
-    return all_videos
-
-
-def download_sftp_video(filename: str, alias: str) -> str:
+def download_sftp_video(filename: str, alias: str, local_path: Optional[str] = None) -> str:
     """Downloads a video file from the SFTP server.
     
     Args:
         filename (str): The name of the video file.
         alias (str): The alias of the folder where the video is located.
+        local_path (str, optional): Destination file; defaults to LOCAL_TMP_DIR/<basename>.
     
     Returns:
         str: The local path where the video was downloaded.
     """
     remote_path = f"{FARM_NAMES[alias]}/{filename}"
     logging.info("Downloading video %s from %s", filename, remote_path)
-    local_path = os.path.join(LOCAL_TMP_DIR, os.path.basename(filename))
+    if local_path is None:
+        local_path = os.path.join(LOCAL_TMP_DIR, os.path.basename(filename))
 
-    os.makedirs(LOCAL_TMP_DIR, exist_ok=True)
+    os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
 
-    cmd = f"echo 'get \"{remote_path}\" \"{local_path}\"' | sftp -P {SFTP_PORT} {SFTP_USER}@{SFTP_HOST}"
-    subprocess.run(cmd, shell=True, check=True)
+    with metrics.span("download", file=filename) as span:
+        get_pool().run(lambda sftp: sftp.get(remote_path, local_path))
+        span["bytes"] = os.path.getsize(local_path)
     return local_path
 
 def remove_video(local_path: str) -> None:
@@ -108,25 +77,13 @@ CREATED_FOLDERS = set()
 def mkdir_sftp(remote_dir: str) -> None:
     if remote_dir in CREATED_FOLDERS:
         return
-    
-    folders = remote_dir.strip("/").split("/")
-    cmds = []
-    current_path = ""
-    for folder in folders:
-        current_path += f"/{folder}"
-        cmds.append(f"-mkdir \"{current_path}\"")
-    
-    batch_cmds = "\n".join(cmds) + "\nexit"
-    cmd = f"echo '{batch_cmds}' | sftp -b - -P {SFTP_PORT} {SFTP_USER}@{SFTP_HOST}"
-    result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    
-    if result.returncode == 0:
+
+    try:
+        get_pool().run(make_remote_dirs, remote_dir)
         logging.info("Dossier %s prêt (créé ou existant) ", remote_dir)
         CREATED_FOLDERS.add(remote_dir)
-    else:
-        logging.error("Erreur de création du dossier %s (Code %d) : %s", 
-                      remote_dir, result.returncode, result.stderr)
-        
+    except IOError as e:
+        logging.error("Erreur de création du dossier %s : %s", remote_dir, e)
 
 
 def upload_video(local_path: str, alias: str) -> str:
@@ -146,45 +103,92 @@ def upload_video(local_path: str, alias: str) -> str:
     
     mkdir_sftp(remote_dir_full)
 
-    put_cmd = f"echo 'put \"{local_path}\" \"{remote_dir_full}/{original_filename}\"\nexit' | sftp -P {SFTP_PORT} {SFTP_USER}@{SFTP_HOST}"
-    subprocess.run(put_cmd, shell=True, check=True)
+    remote_path = f"{remote_dir_full}/{original_filename}"
+    with metrics.span("upload", file=original_filename) as span:
+        get_pool().run(lambda sftp: sftp.put(str(local_path), remote_path))
+        span["bytes"] = os.path.getsize(local_path)
+    get_upload_index().add(remote_path)
 
     return local_path
 
 
+def upload_crops(local_paths: List[str], alias: str, source: str) -> UploadResult:
+    """Uploads all the crops of one source video at once, with their manifest.
+
+    The files go to UPLOAD_DIR/<alias>/ in a single SFTP session, followed by
+    <source stem>.manifest.json (name, size and sha256 of each crop). Failed
+    transfers are retried SFTP_RETRIES times from the first file not sent.
+
+    Args:
+        local_paths (List[str]): Local crop files.
+        alias (str): The alias of the farm (remote sub-folder).
+        source (str): The source video the crops come from.
+
+    Returns:
+        UploadResult: Remote paths sent, local paths that failed, manifest path.
+    """
+    remote_dir = f"{UPLOAD_DIR}/{alias}"
+    logging.info("Uploading %d crops of %s to %s", len(local_paths), source, remote_dir)
+    index = get_upload_index()
+    with metrics.span("upload", file=os.path.basename(source), files=len(local_paths)) as span:
+        result = upload_files(get_pool(), local_paths, remote_dir, source, on_uploaded=index.add)
+        span["bytes"] = result.bytes
+        span["failed"] = len(result.failed)
+    if result.uploaded:
+        CREATED_FOLDERS.add(remote_dir)
+    if result.manifest is not None:
+        index.add(result.manifest)
+    return result
+
+
 def check_if_exists(local_path: str) -> bool:
     """
-    Vérifie récursivement si un fichier contenant local_path existe sur le serveur.
-    
+    Vérifie si un fichier contenant local_path a déjà été uploadé.
+
+    La recherche se fait dans l'index local des uploads (pipeline/upload_index.py),
+    construit une seule fois à partir de UPLOAD_DIR : aucun appel réseau ici.
+
     Args:
         local_path (str): Le nom du clip à rechercher.
         
     Returns:
         bool: True si le fichier existe, False sinon.
     """
-    find_cmd = (
-        f"ssh -p {SFTP_PORT} {SFTP_USER}@{SFTP_HOST} "
-        f"\"find {UPLOAD_DIR} -type f -name '*{local_path}*'\""
-    )
-
-    result = subprocess.run(find_cmd, shell=True, capture_output=True, text=True)
-    found_files = result.stdout.splitlines()
-
-    pattern = re.compile(re.escape(local_path))  # échappe les caractères spéciaux
-
-    try: 
-        for f in found_files:
-            basename = os.path.basename(f)
-            if pattern.search(basename):
-                logging.info(f"Fichier correspondant à '{local_path}' déjà présent sur le cloud : {f}")
-                return True
-        return False
-    
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Erreur lors de la vérification sur le cloud : {e}")
-        return False
+    if get_upload_index().contains(local_path):
+        logging.info(f"Fichier correspondant à '{local_path}' déjà présent sur le cloud")
+        return True
+    return False
 
-def download_sftp_pretrain_dataset() -> Dict[str, List[str]]:
+def list_uploaded_videos() -> List[Dict]:
+    """Lists the cropped videos uploaded to UPLOAD_DIR/<alias>/.
+
+    Returns:
+        List[Dict]: Dicts with 'alias', 'filename', 'remote_path', 'size' and
+            'sha256' (from the upload manifests, None for crops without one).
+    """
+    aliases = [attr.filename
+               for attr in get_pool().run(lambda sftp: sftp.listdir_attr(UPLOAD_DIR))
+               if is_dir(attr)]
+
+    def _list(alias: str) -> List[Dict]:
+        remote_dir = f"{UPLOAD_DIR}/{alias}"
+        attrs = get_pool().run(lambda sftp: sftp.listdir_attr(remote_dir))
+        checksums = {}
+        for attr in attrs:
+            if attr.filename.endswith(MANIFEST_SUFFIX):
+                entries = get_pool().run(read_manifest, f"{remote_dir}/{attr.filename}")
+                checksums.update({name: entry["sha256"] for name, entry in entries.items()})
+        return [{"alias": alias, "filename": attr.filename,
+                 "remote_path": f"{remote_dir}/{attr.filename}", "size": attr.st_size,
+                 "sha256": checksums.get(attr.filename)}
+                for attr in attrs
+                if not is_dir(attr) and attr.filename.lower().endswith(".mp4")]
+
+    with ThreadPoolExecutor(max_workers=config.CATALOG_LIST_WORKERS) as executor:
+        return [video for videos in executor.map(_list, aliases) for video in videos]
+
+
+def download_sftp_pretrain_dataset(streams: int = config.PRETRAIN_STREAMS) -> Dict[str, List[str]]:
     """
     Télécharge le dataset de prétraining depuis UPLOAD_DIR.
 
@@ -192,55 +196,48 @@ def download_sftp_pretrain_dataset() -> Dict[str, List[str]]:
       sauf TEST_FOLDER -> dataset/train
     - Tous les fichiers vidéo dans TEST_FOLDER -> dataset/test
 
+    Les fichiers sont écrits directement dans train/ ou test/ par `streams`
+    transferts simultanés (pipeline/transfer.py) : les fichiers déjà présents
+    avec la bonne taille sont ignorés, les fichiers partiels (.part) sont repris.
+    Les crops décrits par un manifeste d'upload sont vérifiés (sha256) avant
+    d'être renommés.
+
+    Args:
+        streams (int): Nombre de téléchargements simultanés.
+
     Returns:
         Dict[str, List[str]]: {
             "train": [liste des chemins locaux des videos en train],
             "test": [liste des chemins locaux des videos en test]
         }
     """
-    cmd = ["sftp", "-P", str(SFTP_PORT), f"{SFTP_USER}@{SFTP_HOST}"]
-    proc = subprocess.run(
-        cmd,
-        input=f'ls "{UPLOAD_DIR}"\nexit\n',
-        capture_output=True,
-        text=True
-    )
-
-    folders = [os.path.basename(line.replace("sftp>", "").strip())
-               for line in proc.stdout.splitlines() if line.strip()]
-    folders_dict = {folder: f"{UPLOAD_DIR}/{folder}" for folder in folders}
-    all_videos = list_sftp_videos(folders_dict)
+    all_videos = list_uploaded_videos()
 
     train_dir = os.path.join(PRETRAIN_DIR, "train")
     test_dir = os.path.join(PRETRAIN_DIR, "test")
     os.makedirs(train_dir, exist_ok=True)
     os.makedirs(test_dir, exist_ok=True)
 
-    train_files = []
-    test_files = []
-    total = len(all_videos)
-
-    for i,video in enumerate(all_videos):
-        alias = video["alias"]
-        filename = video["filename"]
-
-        local_path = os.path.join(
-            test_dir if alias == TEST_FOLDER else train_dir,
-            os.path.basename(filename)
+    items = [
+        TransferItem(
+            remote_path=video["remote_path"],
+            local_path=os.path.join(test_dir if video["alias"] == TEST_FOLDER else train_dir,
+                                    video["filename"]),
+            size=video["size"],
+            sha256=video["sha256"],
         )
-        download_sftp_video(filename, alias)
-        
-        if alias == TEST_FOLDER:
-            test_files.append(local_path)
-        else:
-            train_files.append(local_path)
-
-        progress = int((i / total) * 50)
-        bar = "#" * progress + "-" * (50 - progress)
-        print(f"\rTéléchargement: [{bar}] {i}/{total} videos", end="", flush=True)
-    print("\nTéléchargement terminé")
-
-    return {
-        "train": train_files,
-        "test": test_files,
-    }
+        for video in all_videos
+    ]
+    results = download_files(items, streams=streams)
+
+    failed = [r.item.remote_path for r in results if not r.ok]
+    if failed:
+        logging.error("%d videos could not be downloaded: %s", len(failed), failed)
+    print(f"Téléchargement terminé : {len(results) - len(failed)}/{len(results)} vidéos "
+          f"({sum(r.skipped for r in results)} déjà présentes)")
+
+    split = {"train": [], "test": []}
+    for video, result in zip(all_videos, results):
+        if result.ok:
+            split["test" if video["alias"] == TEST_FOLDER else "train"].append(result.item.local_path)
+    return split
@@ -0,0 +1,252 @@
+"""Multi-object crop writer: decode a clip once, encode one crop video per object.
+
+``write_cropped`` decodes the clip again for every object. ``write_crops``
+decodes it a single time (or reads in-memory ClipFrames) and fans each frame
+out to the encoders (crop, black padding, resize, mp4 encoding), which run on
+threads so they overlap the decoding. There is one VideoWriter per object, but
+at most CROP_ENCODER_THREADS threads per clip, each writing a group of objects.
+
+``CropStream`` is the same fan-out fed one frame at a time: the extractor
+pushes each frame's boxes as the tracker produces them, so crops are encoded
+while inference is still running.
+"""
+import logging
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+import config
+from pipeline.frames import ClipFrames, source_name
+
+BBox = Tuple[int, int, int, int]
+
+# Frames en attente par encodeur (contre-pression sur le décodage)
+ENCODER_QUEUE_SIZE = 8
+DEFAULT_FPS = 25.0
+
+_END = None
+
+
+def crop_path(video_path: str, out_folder: str, obj_id: int) -> str:
+    """Output path of the crop of obj_id, e.g. crops/cropped_3_<clip>.mp4."""
+    return os.path.join(str(out_folder), f"cropped_{obj_id}_{os.path.basename(str(video_path))}")
+
+
+def crop_frame(frame: np.ndarray, box: Optional[BBox], size: int = config.CROP_SIZE) -> np.ndarray:
+    """Crops box out of frame, pads it to a black square and resizes it.
+
+    Args:
+        frame (np.ndarray): HxWx3 uint8 frame.
+        box (BBox, optional): Inclusive (x1, y1, x2, y2); None gives a black frame.
+        size (int): Side of the output square.
+
+    Returns:
+        np.ndarray: size x size x 3 uint8 crop.
+    """
+    if box is None:
+        return np.zeros((size, size, 3), dtype=np.uint8)
+
+    x1, y1, x2, y2 = (int(v) for v in box)
+    crop = frame[y1:y2 + 1, x1:x2 + 1]
+    h, w = crop.shape[:2]
+    side = max(h, w, 1)
+
+    square = np.zeros((side, side, 3), dtype=np.uint8)
+    top, left = (side - h) // 2, (side - w) // 2
+    square[top:top + h, left:left + w] = crop
+    return cv2.resize(square, (size, size), interpolation=cv2.INTER_AREA)
+
+
+def _encode(paths: Dict[int, str], fps: float, size: int, frames: "queue.Queue", rgb: bool) -> None:
+    # Un thread écrit les vidéos d'un groupe d'objets, frame par frame
+    fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+    writers = {obj_id: cv2.VideoWriter(path, fourcc, fps, (size, size)) for obj_id, path in paths.items()}
+    try:
+        while True:
+            item = frames.get()
+            if item is _END:
+                break
+            frame, boxes = item
+            for obj_id, writer in writers.items():
+                crop = crop_frame(frame, boxes.get(obj_id), size)
+                if rgb:
+                    # Conversion sur le crop (224x224) plutôt que sur la frame entière
+                    crop = cv2.cvtColor(crop, cv2.COLOR_RGB2BGR)
+                writer.write(crop)
+    finally:
+        for writer in writers.values():
+            writer.release()
+
+
+def _decode(video_path: str) -> Iterator[np.ndarray]:
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        raise IOError(f"Cannot open video {video_path}")
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield frame
+    finally:
+        cap.release()
+
+
+def _video_fps(video_path: str) -> float:
+    cap = cv2.VideoCapture(str(video_path))
+    try:
+        return cap.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+    finally:
+        cap.release()
+
+
+def _put(frames: "queue.Queue", item, future) -> None:
+    # Un encodeur en erreur ne consomme plus sa file : ne pas bloquer dessus
+    while True:
+        try:
+            frames.put(item, timeout=1.0)
+            return
+        except queue.Full:
+            if future.done():
+                future.result()
+                return
+
+
+class CropStream:
+    """Per-object crop encoders fed frame by frame, e.g. while the tracker runs.
+
+    Frames are written in order: boxes pushed out of order wait in a small
+    buffer, and source frames without boxes give black crop frames (as in
+    write_crops). The objects are split into at most ``threads`` groups, each
+    encoded by its own thread; their bounded queues apply back-pressure to push().
+
+    Args:
+        source (str | ClipFrames): Path to the clip, or its frames in memory.
+        out_folder (str): Output folder for the cropped videos.
+        obj_ids (List[int]): Objects to crop, one video each.
+        size (int): Side of the square crops (CROP_SIZE).
+        drop_empty (bool): On close, delete the videos of objects that never had a box.
+        threads (int): Max encoder threads (CROP_ENCODER_THREADS).
+    """
+
+    def __init__(self, source: Union[str, ClipFrames], out_folder: str, obj_ids: List[int],
+                 size: int = config.CROP_SIZE, drop_empty: bool = True,
+                 threads: int = config.CROP_ENCODER_THREADS):
+        self.source = source
+        self.obj_ids = list(obj_ids)
+        self.drop_empty = drop_empty
+        if isinstance(source, ClipFrames):
+            self._frames, fps, rgb = iter(source.frames), source.fps, True
+        else:
+            self._frames, fps, rgb = _decode(source), _video_fps(source), False
+        self._next = 0
+        self._waiting: Dict[int, Dict[int, Optional[BBox]]] = {}
+        self._seen = set()
+
+        os.makedirs(str(out_folder), exist_ok=True)
+        self.paths = {obj_id: crop_path(source_name(source), out_folder, obj_id) for obj_id in self.obj_ids}
+        # Threads bornés même dans les scènes denses : chaque thread encode un groupe d'objets
+        num_groups = max(1, min(threads, len(self.obj_ids)))
+        self._groups = [self.obj_ids[i::num_groups] for i in range(num_groups)]
+        self._queues = [queue.Queue(maxsize=ENCODER_QUEUE_SIZE) for _ in self._groups]
+        self._encoders = ThreadPoolExecutor(max_workers=num_groups, thread_name_prefix="crop")
+        self._futures = [
+            self._encoders.submit(_encode, {obj_id: self.paths[obj_id] for obj_id in group},
+                                  fps, size, frames, rgb)
+            for group, frames in zip(self._groups, self._queues)
+        ]
+
+    def _write(self, boxes: Dict[int, Optional[BBox]]) -> bool:
+        frame = next(self._frames, None)
+        if frame is None:
+            return False  # clip plus court que la sortie du tracker
+        self._seen.update(obj_id for obj_id, box in boxes.items() if box is not None)
+        for group, frames, future in zip(self._groups, self._queues, self._futures):
+            _put(frames, (frame, {obj_id: boxes.get(obj_id) for obj_id in group}), future)
+        self._next += 1
+        return True
+
+    def push(self, frame_idx: int, boxes: Dict[int, Optional[BBox]]) -> None:
+        """Adds the boxes {obj_id: box or None} of one frame; writes every frame now complete."""
+        if frame_idx < self._next:
+            return  # frame déjà écrite (doublon)
+        self._waiting[frame_idx] = boxes
+        while self._next in self._waiting:
+            if not self._write(self._waiting.pop(self._next)):
+                self._waiting.clear()
+                return
+
+    def _finish(self) -> None:
+        if hasattr(self._frames, "close"):
+            self._frames.close()  # libère le VideoCapture du décodage
+        for frames, future in zip(self._queues, self._futures):
+            try:
+                # Jamais de put bloquant : un encodeur en erreur ne vide plus sa file
+                _put(frames, _END, future)
+            except Exception:
+                pass  # erreur de l'encodeur relevée ci-dessous
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._encoders.shutdown()
+
+    def close(self) -> List[str]:
+        """Writes the remaining frames, finishes the videos and returns their paths."""
+        try:
+            # Frames restantes : boîtes en attente ou crop noir
+            while self._write(self._waiting.pop(self._next, {})):
+                pass
+        finally:
+            self._finish()
+        paths = []
+        for obj_id in self.obj_ids:
+            if self.drop_empty and obj_id not in self._seen:
+                # Objet jamais détecté : pas de crop
+                os.remove(self.paths[obj_id])
+            else:
+                paths.append(self.paths[obj_id])
+        logging.debug("Wrote %d crops of %s (%d frames)", len(paths), source_name(self.source), self._next)
+        return paths
+
+    def abort(self) -> None:
+        """Stops the encoders and deletes the partial videos."""
+        try:
+            self._finish()
+        except Exception:
+            pass
+        for path in self.paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def write_crops(source: Union[str, ClipFrames], out_folder: str,
+                boxes_by_obj: Dict[int, Dict[int, Optional[BBox]]],
+                size: int = config.CROP_SIZE) -> List[str]:
+    """Writes one cropped video per object while decoding the clip only once.
+
+    Args:
+        source (str | ClipFrames): Path to the clip, or its frames in memory.
+        out_folder (str): Output folder for the cropped videos.
+        boxes_by_obj (Dict[int, Dict[int, BBox]]): {obj_id: {frame_idx: box or None}}.
+        size (int): Side of the square crops (CROP_SIZE).
+
+    Returns:
+        List[str]: Paths of the cropped videos, in boxes_by_obj order.
+    """
+    if not boxes_by_obj:
+        return []
+
+    stream = CropStream(source, out_folder, list(boxes_by_obj), size, drop_empty=False)
+    try:
+        frame_idxs = sorted({idx for boxes in boxes_by_obj.values() for idx in boxes})
+        for idx in frame_idxs:
+            stream.push(idx, {obj_id: boxes.get(idx) for obj_id, boxes in boxes_by_obj.items()})
+    except BaseException:
+        stream.abort()
+        raise
+    return stream.close()
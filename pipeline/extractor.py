@@ -1,8 +1,20 @@
 import logging
-from video.cropper import mask_to_bbox, write_cropped
-from sam3.visualization_utils import prepare_masks_for_visualization
-import json
 import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterator, List, Tuple, Union
+
+from PIL import Image
+
+import config
+from pipeline.bbox import bboxes_from_outputs, frame_bboxes
+from pipeline.crop_writer import CropStream, write_crops
+from pipeline.frames import ClipFrames, source_name
+from pipeline.inference import propagate_frames
+from pipeline.mask_store import MaskStore
+from pipeline.metrics import metrics
+from pipeline.object_chunks import is_out_of_memory
 
 # Logger vers stderr pour ne pas polluer stdout
 logger = logging.getLogger(__name__)
@@ -12,38 +24,261 @@ formatter = logging.Formatter("%(asctime)s | %(levelname)s | %(name)s | %(messag
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
-def run_extraction(sam, video_path: str, out_folder: str, prompt: str) -> None:
+
+def close_session(sam, sid) -> None:
+    """Frees the tracker state of a SAM session.
+
+    Resident workers run many sessions in a row, so a finished session must be
+    released instead of waiting for the process to exit.
+    """
+    close = getattr(sam, "close_session", None)
+    if close is not None:
+        close(sid)
+    elif hasattr(sam, "predictor"):
+        sam.predictor.handle_request(dict(type="close_session", session_id=sid))
+
+
+def _session_resource(source: Union[str, ClipFrames]):
+    # SAM3 accepte une liste d'images PIL comme ressource vidéo
+    if isinstance(source, ClipFrames):
+        return [Image.fromarray(frame) for frame in source.frames]
+    return source
+
+
+def remove_objects(sam, sid, obj_ids: List[int]) -> None:
+    """Stops tracking obj_ids in a SAM session (before propagating another chunk)."""
+    remove = getattr(sam, "remove_object", None)
+    for obj_id in obj_ids:
+        if remove is not None:
+            remove(sid, obj_id)
+        else:
+            sam.predictor.handle_request(dict(type="remove_object", session_id=sid, obj_id=obj_id))
+
+
+def _track(sam, video_path: Union[str, ClipFrames], prompt: str,
+           on_chunk: Callable[[List[int], Iterator[Tuple[int, Dict]]], None]) -> List[int]:
+    """Detects the objects, then streams their tracking chunk by chunk to on_chunk.
+
+    on_chunk(chunk, frames) consumes the (frame_idx, frame output) pairs of one
+    chunk of objects as they come off the tracker; it must undo its own work if
+    the iteration raises (an out-of-memory error is retried with smaller chunks).
+
+    Returns:
+        List[int]: Object ids found by add_prompt (empty: propagate was skipped).
+    """
+    clip = source_name(video_path)
+    resource = _session_resource(video_path)
+    chunker = getattr(sam, "chunker", None)
+    with metrics.span("sam.start", clip=clip):
+        sid = sam.start(resource)
+    try:
+        with metrics.span("sam.add_prompt", clip=clip) as span:
+            first = sam.add_prompt(sid, prompt)
+            span["objects"] = len(first.get("out_obj_ids", []))
+    except BaseException:
+        close_session(sam, sid)
+        raise
+    obj_ids = [int(obj_id) for obj_id in first.get("out_obj_ids", [])]
+    if not obj_ids:
+        # Rien détecté sur la première frame : propagate (le plus coûteux) est évité
+        close_session(sam, sid)
+        return []
+    if len(obj_ids) >= config.MAX_NUM_OBJECTS:
+        logger.warning("%s: %d objects detected, MAX_NUM_OBJECTS reached, extra objects are dropped",
+                       clip, len(obj_ids))
+
+    # Objets suivis par paquets tenant dans le budget mémoire
+    size = chunker.chunk_size(len(obj_ids)) if chunker is not None else len(obj_ids)
+    done = 0
+    while done < len(obj_ids):
+        if sid is None:
+            # Nouvelle session pour le paquet suivant : mêmes détections, mêmes identifiants
+            with metrics.span("sam.start", clip=clip):
+                sid = sam.start(resource)
+            ids = [int(obj_id) for obj_id in sam.add_prompt(sid, prompt).get("out_obj_ids", [])]
+            if ids != obj_ids:
+                logger.warning("%s: detections differ between chunks (%d vs %d objects)",
+                               clip, len(ids), len(obj_ids))
+        chunk = obj_ids[done:done + size]
+        try:
+            others = [obj_id for obj_id in obj_ids if obj_id not in chunk]
+            if others:
+                remove_objects(sam, sid, others)
+            baseline = chunker.start_measure() if chunker is not None else None
+            # Objets retirés puis re-détectés : le plafond les empêche de s'ajouter au paquet
+            limit = chunker.limit(len(chunk)) if chunker is not None and others else nullcontext()
+            with limit, metrics.span("sam.propagate", clip=clip) as span:
+                span["objects"] = len(chunk)
+                span["frames"] = 0
+
+                def frames() -> Iterator[Tuple[int, Dict]]:
+                    for item in propagate_frames(sam, sid):
+                        span["frames"] += 1
+                        yield item
+
+                on_chunk(chunk, frames())
+            if chunker is not None:
+                chunker.observe(baseline, len(chunk))
+        except Exception as e:
+            if chunker is None or size == 1 or not is_out_of_memory(e):
+                raise
+            size = chunker.on_out_of_memory(size)
+            logger.warning("%s: out of memory with %d objects, retrying by chunks of %d",
+                           clip, len(chunk), size)
+            continue
+        finally:
+            close_session(sam, sid)
+            sid = None
+        done += len(chunk)
+
+    return obj_ids
+
+
+def _infer(sam, video_path: Union[str, ClipFrames], prompt: str) -> Tuple[List[int], MaskStore]:
+    # Masques gardés en RLE : pas de masque dense par objet et par frame
+    merged = MaskStore()
+
+    def on_chunk(chunk: List[int], frames: Iterator[Tuple[int, Dict]]) -> None:
+        merged.update(MaskStore.from_frames(frames, keep=chunk))
+
+    obj_ids = _track(sam, video_path, prompt, on_chunk)
+    return obj_ids, merged
+
+
+def _infer_streaming(sam, video_path: Union[str, ClipFrames], prompt: str,
+                     out_folder: str) -> List[CropStream]:
+    """Tracks the objects and encodes their crops frame by frame, while inference runs.
+
+    Only the current frame's masks are alive at any time: each frame is boxed
+    and pushed to the per-object encoders as soon as the tracker yields it.
+
+    Returns:
+        List[CropStream]: One stream per object chunk; close() them to finish the videos.
+    """
+    streams = []
+
+    def on_chunk(chunk: List[int], frames: Iterator[Tuple[int, Dict]]) -> None:
+        stream = CropStream(video_path, out_folder, chunk)
+        try:
+            for frame_idx, frame_output in frames:
+                stream.push(frame_idx, frame_bboxes(frame_output, chunk))
+        except BaseException:
+            stream.abort()
+            raise
+        streams.append(stream)
+
+    try:
+        _track(sam, video_path, prompt, on_chunk)
+    except BaseException:
+        for stream in streams:
+            stream.abort()
+        raise
+    return streams
+
+
+def _close_streams(video_path: Union[str, ClipFrames], streams: List[CropStream]) -> List[str]:
+    # Fin de l'encodage : frames restantes, fermeture des vidéos
+    with metrics.span("write_crops", clip=source_name(video_path)) as span:
+        paths = []
+        try:
+            for stream in streams:
+                paths.extend(stream.close())
+        except BaseException:
+            for stream in streams:
+                stream.abort()
+            raise
+        span["objects"] = len(paths)
+        return paths
+
+
+def _write_crops(video_path: Union[str, ClipFrames], out_folder: str,
+                 obj_ids: List[int], outputs: MaskStore) -> List[str]:
+    # Toutes les boîtes (objets x frames) en quelques opérations vectorisées
+    boxes_by_obj = bboxes_from_outputs(outputs, obj_ids)
+    # Objets jamais détectés : pas de crop
+    boxes_by_obj = {obj_id: boxes for obj_id, boxes in boxes_by_obj.items() if any(boxes.values())}
+
+    # Le clip est décodé une seule fois pour tous les objets
+    with metrics.span("write_crops", clip=source_name(video_path)) as span:
+        span["objects"] = len(boxes_by_obj)
+        span["frames"] = len(outputs) * len(boxes_by_obj)
+        return write_crops(video_path, out_folder, boxes_by_obj)
+
+
+def run_extraction(sam, video_path: Union[str, ClipFrames], out_folder: str, prompt: str) -> List[str]:
     """Run SAM-based object extraction and video cropping on a single video.
-    
+
     Args:
         sam: SAM session object for video processing.
-        video_path (str): Path to the input video file.
+        video_path (str | ClipFrames): Path to the input video file, or its
+            frames already in memory.
         out_folder (str): Output folder where cropped videos will be saved.
         prompt (str): Text prompt for object detection and segmentation.
-    
+
     Returns:
-        None: Outputs JSON list of cropped video paths to stdout.
+        List[str]: Paths of the cropped videos written to out_folder.
     """
-    logger.info("Starting extraction for %s", video_path)
+    logger.info("Starting extraction for %s", source_name(video_path))
 
-    sid = sam.start(video_path)
-    first = sam.add_prompt(sid, prompt)
-    outputs = sam.propagate(sid)
+    if config.STREAM_CROPS:
+        return _close_streams(video_path, _infer_streaming(sam, video_path, prompt, out_folder))
+    obj_ids, outputs = _infer(sam, video_path, prompt)
+    return _write_crops(video_path, out_folder, obj_ids, outputs)
 
-    outputs = prepare_masks_for_visualization(outputs)
-    obj_ids = first.get("out_obj_ids", [])
 
-    out_all_paths = []
+def run_batch_extraction(sam, video_paths: List[Union[str, ClipFrames]], out_folder: str,
+                         prompt: str) -> Dict[str, Dict]:
+    """Run extraction on several clips (e.g. all clips of one source video).
 
-    for obj_id in obj_ids:
-        boxes = {}
-        for idx, masks in outputs.items():
-            boxes[idx] = mask_to_bbox(masks[obj_id]) if obj_id in masks else None
-        if not any(boxes.values()):
-            continue
+    Inference runs clip after clip on the loaded model while the crops of the
+    previous clips are written on a thread pool, so the model never waits for
+    the CPU-bound crop encoding. With STREAM_CROPS, the crops of a clip are
+    already encoded during its inference and only the end of the encoding is
+    left to the pool. A failing clip does not stop the batch.
+
+    Args:
+        sam: SAM session object for video processing.
+        video_paths (List[str | ClipFrames]): Input clips (paths or in-memory frames).
+        out_folder (str): Output folder where cropped videos will be saved.
+        prompt (str): Text prompt for object detection and segmentation.
+
+    Returns:
+        Dict[str, Dict]: For each clip (path, or ClipFrames.name), {"paths":
+            [cropped videos], "error": None} or {"paths": [], "error": traceback}.
+    """
+    logger.info("Starting batch extraction for %d clips", len(video_paths))
+    results = {}
+    pending = {}
+
+    with ThreadPoolExecutor(max_workers=config.CROP_WRITER_THREADS) as writers:
+        for video_path in video_paths:
+            name = source_name(video_path)
+            try:
+                if config.STREAM_CROPS:
+                    # Crops encodés pendant l'inférence ; seule la fin d'encodage passe au pool
+                    streams = _infer_streaming(sam, video_path, prompt, out_folder)
+                else:
+                    obj_ids, outputs = _infer(sam, video_path, prompt)
+            except Exception:
+                logger.exception("Inference failed for %s", name)
+                results[name] = {"paths": [], "error": traceback.format_exc()}
+                continue
+            if config.STREAM_CROPS:
+                pending[name] = writers.submit(_close_streams, video_path, streams)
+            else:
+                pending[name] = writers.submit(_write_crops, video_path, out_folder, obj_ids, outputs)
+                del outputs
+
+            # Borne le nombre de clips dont les masques attendent l'écriture
+            running = [f for f in pending.values() if not f.done()]
+            if len(running) >= config.CROP_WRITER_THREADS:
+                wait(running, return_when=FIRST_COMPLETED)
 
-        out_path = write_cropped(video_path, out_folder, boxes, obj_id)
-        out_all_paths.append(out_path)
+        for name, future in pending.items():
+            try:
+                results[name] = {"paths": future.result(), "error": None}
+            except Exception:
+                logger.exception("Cropping failed for %s", name)
+                results[name] = {"paths": [], "error": traceback.format_exc()}
 
-    # Seul print sur stdout, pour le pipeline
-    print(json.dumps(out_all_paths))
+    return {source_name(path): results[source_name(path)] for path in video_paths}
@@ -0,0 +1,286 @@
+"""In-memory clips: sample frames from the source once and share them.
+
+Instead of re-encoding NUM_CLIP mp4 files into CLIP_FOLDER and decoding them
+again for SAM and for the crop writer, ``sample_clips`` reads the sampled
+frames (NUM_FRAMES_PER_CLIP frames every FRAME_STEP) straight from the source
+with decord (or with PyAV for seekable remote files, see
+``sample_clips_seekable``). The uint8 arrays are handed to the SAM workers through shared
+memory (``SharedClip``), so no intermediate clip file is written.
+
+Pre-screening: with ``candidates`` > num_clips, more windows than needed are
+drawn and probed on 3 downscaled frames each (``rank_windows``). Windows that
+are too dark or overexposed are dropped, and the rest are ranked by motion
+(frame difference) times exposure. Only the best num_clips are decoded in
+full and sent to SAM. On seekable (remote) sources, each probe is the
+keyframe preceding the probed frame, so a candidate window costs a few
+keyframe reads instead of the demuxing of the whole window.
+"""
+import os
+import random
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import av
+import numpy as np
+from decord import VideoReader, cpu
+
+import config
+
+# Largeur approximative des frames de sondage (sous-échantillonnage par pas entier)
+PROBE_WIDTH = 64
+
+
+@dataclass
+class ClipFrames:
+    """A clip held in memory.
+
+    Attributes:
+        name (str): Clip file name it would have had on disk (used for dedup and crop names).
+        frames (np.ndarray): [T, H, W, 3] uint8 RGB frames.
+        fps (float): Frame rate of the clip.
+    """
+    name: str
+    frames: np.ndarray
+    fps: float
+
+
+def clip_windows(num_source_frames: int, num_frames: int, step: int, num_clips: int,
+                 rng: Optional[random.Random] = None) -> List[int]:
+    """Picks the start frames of num_clips non-overlapping windows.
+
+    Args:
+        num_source_frames (int): Number of frames of the source video.
+        num_frames (int): Frames per clip.
+        step (int): Distance between two sampled frames.
+        num_clips (int): Number of windows wanted.
+        rng (random.Random, optional): Random generator.
+
+    Returns:
+        List[int]: Sorted start frames (fewer than num_clips if the video is short).
+    """
+    rng = rng or random
+    span = (num_frames - 1) * step + 1
+    slots = num_source_frames // span
+    chosen = rng.sample(range(slots), min(num_clips, slots))
+    return sorted(slot * span for slot in chosen)
+
+
+def probe_offsets(num_frames: int, step: int) -> List[int]:
+    """Offsets (from the window start) of the frames probed by the pre-screen."""
+    return sorted({0, (num_frames // 2) * step, (num_frames - 1) * step})
+
+
+def small_gray(frame: np.ndarray) -> np.ndarray:
+    """Downscaled (integer stride) float32 grayscale copy of an RGB frame, for probes."""
+    stride = max(1, frame.shape[1] // PROBE_WIDTH)
+    return frame[::stride, ::stride].mean(axis=2, dtype=np.float32)
+
+
+def window_score(probes: Sequence[np.ndarray],
+                 min_brightness: float = config.PRESCREEN_MIN_BRIGHTNESS,
+                 max_brightness: float = config.PRESCREEN_MAX_BRIGHTNESS) -> float:
+    """Informativeness of a window from a few of its frames (``small_gray`` probes).
+
+    Returns:
+        float: motion (mean absolute difference between consecutive probes,
+            in [0, 1]) times exposure (1 at mid-grey, 0 at black / white);
+            -1 if the mean brightness is outside [min_brightness, max_brightness].
+    """
+    gray = list(probes)
+    brightness = float(np.mean([g.mean() for g in gray]))
+    if not min_brightness <= brightness <= max_brightness:
+        return -1.0
+    motion = float(np.mean([np.abs(a - b).mean() for a, b in zip(gray, gray[1:])])) / 255 if len(gray) > 1 else 0.0
+    exposure = 1.0 - abs(brightness - 128.0) / 128.0
+    # Petit terme d'exposition : départage les fenêtres sans mouvement
+    return motion * exposure + 1e-6 * exposure
+
+
+def rank_windows(probes_by_start: Dict[int, Sequence[np.ndarray]], num_clips: int) -> List[int]:
+    """Best num_clips window starts (sorted), dark / overexposed windows excluded."""
+    scores = {start: window_score(probes) for start, probes in probes_by_start.items()}
+    kept = sorted((start for start, score in scores.items() if score >= 0),
+                  key=lambda start: scores[start], reverse=True)
+    return sorted(kept[:num_clips])
+
+
+def sample_clips(video_path: str, num_frames: int, step: int, num_clips: int,
+                 alias: str, starts: Optional[List[int]] = None,
+                 rng: Optional[random.Random] = None,
+                 candidates: Optional[int] = None) -> List[ClipFrames]:
+    """Reads the frames of num_clips clips from a source video in one pass.
+
+    Args:
+        video_path (str): Path to the source video.
+        num_frames (int): Frames per clip (NUM_FRAMES_PER_CLIP).
+        step (int): Distance between sampled frames (FRAME_STEP).
+        num_clips (int): Number of clips (NUM_CLIP).
+        alias (str): Farm alias, used as clip name prefix.
+        starts (List[int], optional): Window start frames; random windows otherwise.
+        rng (random.Random, optional): Generator for the random windows (reproducible runs).
+        candidates (int, optional): Random windows probed by the pre-screen
+            (PRESCREEN_CANDIDATES); only the best num_clips are kept.
+
+    Returns:
+        List[ClipFrames]: The sampled clips.
+    """
+    vr = VideoReader(video_path, ctx=cpu(0))
+    if starts is None and candidates and candidates > num_clips:
+        offsets = probe_offsets(num_frames, step)
+        probes = {}
+        for start in clip_windows(len(vr), num_frames, step, candidates, rng):
+            # Quelques frames par fenêtre, réduites aussitôt
+            batch = vr.get_batch([start + o for o in offsets]).asnumpy()
+            probes[start] = [small_gray(frame) for frame in batch]
+        starts = rank_windows(probes, num_clips)
+    elif starts is None:
+        starts = clip_windows(len(vr), num_frames, step, num_clips, rng)
+    if not starts:
+        return []
+
+    indices = [start + i * step for start in starts for i in range(num_frames)]
+    frames = vr.get_batch(indices).asnumpy()  # [num_clips * num_frames, H, W, 3]
+    fps = vr.get_avg_fps() / step
+
+    stem = os.path.splitext(os.path.basename(getattr(video_path, "name", str(video_path))))[0]
+    return [
+        ClipFrames(
+            name=f"{alias}_{stem}_{start:06d}.mp4",
+            frames=frames[k * num_frames:(k + 1) * num_frames],
+            fps=fps,
+        )
+        for k, start in enumerate(starts)
+    ]
+
+
+def _decode_frames_av(container, stream, fps: float, offset: float, time_base: float,
+                      indices: Sequence[int]) -> Dict[int, np.ndarray]:
+    """Decodes the given frame indices of one window (seek to the preceding keyframe)."""
+    wanted = set(indices)
+    last = max(wanted)
+    found = {}
+    container.seek(int((min(wanted) / fps + offset) / time_base), stream=stream, backward=True)
+    for frame in container.decode(stream):
+        if frame.time is None:
+            continue
+        idx = int(round((frame.time - offset) * fps))
+        if idx in wanted:
+            found[idx] = frame.to_ndarray(format="rgb24")
+        if idx >= last:
+            break
+    return found
+
+
+def _probe_keyframes(container, stream, fps: float, offset: float, time_base: float,
+                     indices: Sequence[int]) -> List[np.ndarray]:
+    """``small_gray`` probes of the keyframes preceding the given frame indices.
+
+    Each index gets its own seek, and non-key frames are skipped by the
+    decoder, so only the keyframe packets (and a few packets of decoder
+    delay) are read, whatever the length of the window.
+    """
+    codec = stream.codec_context
+    codec.skip_frame = "NONKEY"
+    try:
+        probes = []
+        for idx in indices:
+            container.seek(int((idx / fps + offset) / time_base), stream=stream, backward=True)
+            for frame in container.decode(stream):
+                probes.append(small_gray(frame.to_ndarray(format="rgb24")))
+                break
+        return probes
+    finally:
+        codec.skip_frame = "DEFAULT"
+
+
+def sample_clips_seekable(fileobj, num_frames: int, step: int, num_clips: int,
+                          alias: str, starts: Optional[List[int]] = None,
+                          rng: Optional[random.Random] = None,
+                          candidates: Optional[int] = None) -> List[ClipFrames]:
+    """Same as sample_clips, but only reads the parts of the file it needs.
+
+    decord loads a file object entirely into memory, so seekable sources
+    (e.g. RemoteFile) are decoded with PyAV instead: for every window, seek to
+    the preceding keyframe and decode only until the last sampled frame.
+    Candidate windows are probed on keyframes only (``_probe_keyframes``);
+    with a GOP longer than the window, its probes may be the same keyframe
+    and the window is then ranked on exposure alone.
+
+    Args:
+        fileobj: Seekable binary file object (path also accepted).
+        num_frames (int): Frames per clip (NUM_FRAMES_PER_CLIP).
+        step (int): Distance between sampled frames (FRAME_STEP).
+        num_clips (int): Number of clips (NUM_CLIP).
+        alias (str): Farm alias, used as clip name prefix.
+        starts (List[int], optional): Window start frames; random windows otherwise.
+        rng (random.Random, optional): Generator for the random windows (reproducible runs).
+        candidates (int, optional): Random windows probed by the pre-screen
+            (PRESCREEN_CANDIDATES); only the best num_clips are kept.
+
+    Returns:
+        List[ClipFrames]: The sampled clips.
+    """
+    with av.open(fileobj, mode="r") as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        fps = float(stream.average_rate or stream.guessed_rate)
+        time_base = float(stream.time_base)
+        offset = float(stream.start_time or 0) * time_base
+        total = stream.frames or int(float(stream.duration or 0) * time_base * fps)
+
+        if starts is None and candidates and candidates > num_clips:
+            offsets = probe_offsets(num_frames, step)
+            probes = {}
+            for start in clip_windows(total, num_frames, step, candidates, rng):
+                # Images clés seulement : la fenêtre n'est ni lue ni décodée en entier
+                gray = _probe_keyframes(container, stream, fps, offset, time_base,
+                                        [start + o for o in offsets])
+                if len(gray) == len(offsets):
+                    probes[start] = gray
+            starts = rank_windows(probes, num_clips)
+        elif starts is None:
+            starts = clip_windows(total, num_frames, step, num_clips, rng)
+
+        stem = os.path.splitext(os.path.basename(getattr(fileobj, "name", str(fileobj))))[0]
+        clips = []
+        for start in starts:
+            indices = [start + i * step for i in range(num_frames)]
+            found = _decode_frames_av(container, stream, fps, offset, time_base, indices)
+            if len(found) < num_frames:
+                continue  # fenêtre incomplète (fin de vidéo, horodatage irrégulier)
+            clips.append(ClipFrames(
+                name=f"{alias}_{stem}_{start:06d}.mp4",
+                frames=np.stack([found[idx] for idx in indices]),
+                fps=fps / step,
+            ))
+    return clips
+
+
+@dataclass
+class SharedClip:
+    """Picklable handle on a ClipFrames copied into shared memory."""
+    name: str
+    shm_name: str
+    shape: Tuple[int, ...]
+    dtype: str
+    fps: float
+
+    @classmethod
+    def create(cls, clip: ClipFrames) -> Tuple["SharedClip", shared_memory.SharedMemory]:
+        """Copies the clip into a new shared memory block (the caller unlinks it)."""
+        shm = shared_memory.SharedMemory(create=True, size=max(clip.frames.nbytes, 1))
+        view = np.ndarray(clip.frames.shape, dtype=clip.frames.dtype, buffer=shm.buf)
+        view[...] = clip.frames
+        return cls(clip.name, shm.name, clip.frames.shape, clip.frames.dtype.str, clip.fps), shm
+
+    def attach(self) -> Tuple[ClipFrames, shared_memory.SharedMemory]:
+        """Maps the frames without copying (the caller closes the block)."""
+        shm = shared_memory.SharedMemory(name=self.shm_name)
+        frames = np.ndarray(self.shape, dtype=np.dtype(self.dtype), buffer=shm.buf)
+        return ClipFrames(self.name, frames, self.fps), shm
+
+
+def source_name(source) -> str:
+    """Name of a clip source: the path itself, or ClipFrames.name."""
+    return source.name if isinstance(source, ClipFrames) else str(source)
@@ -0,0 +1,196 @@
+"""Device-agnostic inference settings for SAM sessions.
+
+``optimize_session`` wraps a loaded session (SAMSession or any object with its
+interface) according to config.py:
+
+- INFERENCE_DEVICE: "auto" picks cuda, then mps, then cpu; the model is moved
+  there if it is not already;
+- INFERENCE_DTYPE: start / add_prompt / propagate run under ``torch.autocast``
+  in bf16 or fp16 ("auto": bf16 on GPU, fp32 on CPU);
+- INFERENCE_INT8: dynamic int8 quantization of the ``nn.Linear`` layers (CPU
+  only, in place, so the predictor keeps using the same module);
+- INFERENCE_THREADS: torch intra-op threads (default on CPU: cores shared
+  between the NUM_SAM_WORKERS processes);
+- INFERENCE_COMPILE: ``torch.compile`` of the model (first clips slower);
+- MAX_NUM_OBJECTS: detection cap set on the model at load time, and the
+  ``chunker`` splitting crowded clips to the memory budget (see
+  pipeline/object_chunks.py).
+
+Every call also runs under ``torch.inference_mode``. ``release_memory`` frees
+the device caches between jobs, on any device.
+"""
+import gc
+import logging
+import os
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import Dict, Iterator, Optional, Tuple
+
+import config
+from pipeline.object_chunks import ObjectChunker, apply_object_cap
+
+DTYPES = {"bf16": "bfloat16", "fp16": "float16", "fp32": "float32"}
+
+
+@dataclass
+class InferenceSettings:
+    """Inference options; defaults are read from config.py."""
+    device: str = config.INFERENCE_DEVICE
+    dtype: str = config.INFERENCE_DTYPE
+    int8: bool = config.INFERENCE_INT8
+    threads: Optional[int] = config.INFERENCE_THREADS
+    compile: bool = config.INFERENCE_COMPILE
+
+
+def resolve_device(device: str = config.INFERENCE_DEVICE) -> str:
+    """"auto" -> "cuda", "mps" or "cpu", whichever is available first."""
+    import torch
+    if device != "auto":
+        return device
+    if torch.cuda.is_available():
+        return "cuda"
+    if getattr(torch.backends, "mps", None) is not None and torch.backends.mps.is_available():
+        return "mps"
+    return "cpu"
+
+
+def resolve_dtype(dtype: str, device: str) -> str:
+    """"auto" -> "bf16" on GPU, "fp32" on CPU (where autocast is often slower)."""
+    if dtype == "auto":
+        return "fp32" if device == "cpu" else "bf16"
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown INFERENCE_DTYPE {dtype!r}, expected auto, {', '.join(DTYPES)}")
+    return dtype
+
+
+def configure_threads(threads: Optional[int], device: str) -> int:
+    """Sets torch's intra-op thread count and returns it."""
+    import torch
+    if threads is None and device == "cpu":
+        # Les cœurs sont partagés entre les workers SAM d'une même machine
+        threads = max(1, (os.cpu_count() or 1) // max(1, config.NUM_SAM_WORKERS))
+    if threads:
+        torch.set_num_threads(threads)
+    return torch.get_num_threads()
+
+
+def find_model(session):
+    """The torch module behind a session (predictor.model, model or predictor), or None."""
+    import torch
+    predictor = getattr(session, "predictor", None)
+    for candidate in (getattr(predictor, "model", None), getattr(session, "model", None), predictor):
+        if isinstance(candidate, torch.nn.Module):
+            return candidate
+    return None
+
+
+def release_memory(device: Optional[str] = None) -> None:
+    """Garbage-collects and empties the device allocator cache (no-op on CPU)."""
+    gc.collect()
+    import torch
+    device = device or resolve_device()
+    if device.startswith("cuda") and torch.cuda.is_available():
+        torch.cuda.synchronize()
+        torch.cuda.empty_cache()
+    elif device == "mps" and hasattr(torch, "mps"):
+        torch.mps.empty_cache()
+
+
+def propagate_frames(session, sid) -> Iterator[Tuple[int, Dict]]:
+    """(frame_idx, frame output) pairs, as the tracker produces them.
+
+    Uses the session's propagate_stream, else the SAM3 predictor's streaming
+    request, else falls back to the whole propagate() dict.
+    """
+    stream = getattr(session, "propagate_stream", None)
+    if stream is not None:
+        yield from stream(sid)
+    elif hasattr(session, "predictor"):
+        request = dict(type="propagate_in_video", session_id=sid)
+        for response in session.predictor.handle_stream_request(request):
+            yield response["frame_index"], response["outputs"]
+    else:
+        yield from session.propagate(sid).items()
+
+
+class OptimizedSession:
+    """Session wrapper running every call with the configured inference settings.
+
+    Args:
+        session: Loaded session (start / add_prompt / propagate / close_session).
+        settings (InferenceSettings, optional): Options; config.py values by default.
+    """
+
+    def __init__(self, session, settings: Optional[InferenceSettings] = None):
+        import torch
+        self.session = session
+        self.settings = settings or InferenceSettings()
+        self.device = resolve_device(self.settings.device)
+        self.dtype = resolve_dtype(self.settings.dtype, self.device)
+        self.threads = configure_threads(self.settings.threads, self.device)
+
+        model = find_model(session)
+        # Plafond abaissé à la taille du paquet pendant la propagation d'un paquet
+        capped = model is not None and apply_object_cap(model) > 0
+        self.chunker = ObjectChunker(self.device, model=model if capped else None)
+        if model is not None:
+            model.eval()
+            if next(model.parameters(), torch.empty(0)).device.type != self.device.split(":")[0]:
+                model.to(self.device)
+            if self.settings.int8:
+                if self.device != "cpu":
+                    logging.warning("INFERENCE_INT8 ignored on %s (CPU only)", self.device)
+                else:
+                    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear},
+                                                           dtype=torch.qint8, inplace=True)
+            if self.settings.compile:
+                # Compilation en place : le prédicteur garde sa référence au module
+                model.compile()
+        elif self.settings.int8 or self.settings.compile:
+            logging.warning("No torch model found on %s, INFERENCE_INT8 / INFERENCE_COMPILE ignored",
+                            type(session).__name__)
+        logging.info("Inference on %s, %s, int8=%s, %d threads, compile=%s", self.device, self.dtype,
+                     self.settings.int8 and self.device == "cpu", self.threads, self.settings.compile)
+
+    @contextmanager
+    def _context(self) -> Iterator[None]:
+        import torch
+        autocast = nullcontext() if self.dtype == "fp32" else torch.autocast(
+            device_type=self.device.split(":")[0], dtype=getattr(torch, DTYPES[self.dtype]))
+        with torch.inference_mode(), autocast:
+            yield
+
+    def start(self, resource):
+        with self._context():
+            return self.session.start(resource)
+
+    def add_prompt(self, sid, prompt: str):
+        with self._context():
+            return self.session.add_prompt(sid, prompt)
+
+    def propagate(self, sid):
+        with self._context():
+            return self.session.propagate(sid)
+
+    def propagate_stream(self, sid) -> Iterator[Tuple[int, Dict]]:
+        with self._context():
+            yield from propagate_frames(self.session, sid)
+
+    def remove_object(self, sid, obj_id: int):
+        with self._context():
+            remove = getattr(self.session, "remove_object", None)
+            if remove is not None:
+                return remove(sid, obj_id)
+            return self.session.predictor.handle_request(
+                dict(type="remove_object", session_id=sid, obj_id=obj_id))
+
+    def __getattr__(self, name):
+        # close_session, predictor... : délégués à la session d'origine
+        if name == "session":
+            raise AttributeError(name)
+        return getattr(self.session, name)
+
+
+def optimize_session(session, settings: Optional[InferenceSettings] = None) -> OptimizedSession:
+    """Wraps a loaded session with the inference settings (see OptimizedSession)."""
+    return OptimizedSession(session, settings)
@@ -0,0 +1,151 @@
+"""Durable journal of the pipeline's work, to resume after a crash.
+
+Every state transition of a source video, of its clips and of their crops is
+appended to the ``events`` table of a SQLite file (JOURNAL_DB); the ``videos``
+and ``clips`` tables hold the latest state of each, updated in the same
+transaction. On restart, main.py leaves out the finished videos, draws the
+interrupted ones first and skips their clips that were already uploaded, so
+no source is sent to SAM twice.
+
+Video states: started -> clipped -> done, or failed.
+Clip states: sampled -> processed -> uploaded, or skipped / failed.
+Crop events: written, uploaded (events table only).
+"""
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Set, Tuple
+
+import config
+
+Key = Tuple[str, str]  # (alias, filename)
+
+VIDEO_STARTED = "started"
+VIDEO_CLIPPED = "clipped"
+VIDEO_DONE = "done"
+VIDEO_FAILED = "failed"
+
+CLIP_SAMPLED = "sampled"
+CLIP_PROCESSED = "processed"
+CLIP_UPLOADED = "uploaded"
+CLIP_SKIPPED = "skipped"
+CLIP_FAILED = "failed"
+
+CROP_WRITTEN = "written"
+CROP_UPLOADED = "uploaded"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    alias TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    item TEXT,
+    state TEXT NOT NULL,
+    detail TEXT
+);
+CREATE TABLE IF NOT EXISTS videos (
+    alias TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL,
+    PRIMARY KEY (alias, filename)
+);
+CREATE TABLE IF NOT EXISTS clips (
+    clip TEXT PRIMARY KEY,
+    alias TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS idx_clips_video ON clips (alias, filename);
+"""
+
+
+class WorkJournal:
+    """Append-only SQLite journal of video / clip / crop state transitions.
+
+    Args:
+        db_path (str): SQLite file (":memory:" for a throwaway journal).
+    """
+
+    def __init__(self, db_path: str = config.JOURNAL_DB):
+        self.db_path = str(db_path)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _event(self, now: float, kind: str, alias: str, filename: str,
+               item: Optional[str], state: str, detail: Optional[str]) -> None:
+        self._conn.execute(
+            "INSERT INTO events (ts, kind, alias, filename, item, state, detail) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (now, kind, alias, filename, item, state, detail),
+        )
+
+    def video(self, alias: str, filename: str, state: str, detail: Optional[str] = None) -> None:
+        """Records a state transition of a source video."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._event(now, "video", alias, filename, None, state, detail)
+            self._conn.execute(
+                "INSERT INTO videos (alias, filename, state, attempts, updated) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (alias, filename) DO UPDATE SET state = excluded.state, "
+                "attempts = attempts + excluded.attempts, updated = excluded.updated",
+                (alias, filename, state, int(state == VIDEO_STARTED), now),
+            )
+
+    def clip(self, alias: str, filename: str, clip: str, state: str,
+             detail: Optional[str] = None) -> None:
+        """Records a state transition of a clip of a source video."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._event(now, "clip", alias, filename, clip, state, detail)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO clips (clip, alias, filename, state, updated) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (clip, alias, filename, state, now),
+            )
+
+    def crop(self, alias: str, filename: str, crop: str, state: str) -> None:
+        """Records a crop event (not tracked as a state, crops are rebuilt from their clip)."""
+        with self._lock, self._conn:
+            self._event(time.time(), "crop", alias, filename, crop, state, None)
+
+    def finished_videos(self, max_attempts: int = config.JOURNAL_MAX_ATTEMPTS) -> Set[Key]:
+        """Videos never to draw again: done, or failed max_attempts times."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT alias, filename FROM videos WHERE state = ? OR (state = ? AND attempts >= ?)",
+                (VIDEO_DONE, VIDEO_FAILED, max_attempts),
+            )
+            return {(alias, filename) for alias, filename in rows}
+
+    def interrupted_videos(self) -> Set[Key]:
+        """Videos started by a previous run that never reached done or failed."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT alias, filename FROM videos WHERE state IN (?, ?)",
+                (VIDEO_STARTED, VIDEO_CLIPPED),
+            )
+            return {(alias, filename) for alias, filename in rows}
+
+    def done_clips(self, alias: str, filename: str) -> Set[str]:
+        """Clips of a video that need no more work (uploaded or skipped)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT clip FROM clips WHERE alias = ? AND filename = ? AND state IN (?, ?)",
+                (alias, filename, CLIP_UPLOADED, CLIP_SKIPPED),
+            )
+            return {clip for (clip,) in rows}
+
+    def summary(self) -> Dict[str, int]:
+        """Number of videos per state."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM videos GROUP BY state"))
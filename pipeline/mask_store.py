@@ -0,0 +1,139 @@
+"""Run-length-encoded masks of a propagate() output.
+
+``prepare_masks_for_visualization`` keeps a dense full-resolution mask per
+object and per frame, so memory grows with frames x objects x H x W although
+the extractor only needs boxes. ``MaskStore`` encodes each frame's masks to
+COCO RLE (pycocotools) as soon as the frame comes out of the model:
+
+- boxes come from ``pycocotools.mask.toBbox`` on the RLEs, no decoding;
+- ``mask`` decodes on demand, for the rare consumer of pixels;
+- a 1080p cow mask takes a few hundred bytes instead of ~2 MB.
+
+Layout: {frame_idx: {obj_id: rle}}, empty masks dropped (as
+prepare_masks_for_visualization does).
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from pycocotools import mask as mask_utils
+
+import config
+from pipeline.bbox import BBox, expand_boxes
+
+
+def _to_numpy(array) -> np.ndarray:
+    if hasattr(array, "detach"):  # torch.Tensor
+        array = array.detach().cpu().numpy()
+    return np.asarray(array)
+
+
+def encode_masks(masks) -> List[Dict]:
+    """COCO RLEs of a [N, H, W] stack of binary masks (array or tensor)."""
+    masks = _to_numpy(masks)
+    # [N, H, W], [N, 1, H, W] ou [H, W]
+    masks = masks.reshape((-1,) + masks.shape[-2:])
+    if not len(masks):
+        return []
+    # pycocotools attend [H, W, N] uint8 en ordre Fortran
+    return mask_utils.encode(np.asfortranarray(masks.transpose(1, 2, 0).astype(np.uint8, copy=False)))
+
+
+class MaskStore:
+    """Per-frame, per-object RLE masks of one clip.
+
+    Args:
+        shape (Tuple[int, int], optional): (H, W) of the masks, set by the first frame added.
+    """
+
+    def __init__(self, shape: Optional[Tuple[int, int]] = None):
+        self.shape = shape
+        self.frames: Dict[int, Dict[int, Dict]] = {}
+
+    def add_frame(self, frame_idx: int, frame_output: Dict, keep: Optional[Iterable[int]] = None) -> None:
+        """Encodes one frame of SAM3's per-frame output.
+
+        Args:
+            frame_idx (int): Frame index.
+            frame_output (Dict): {"out_obj_ids", "out_binary_masks", ...} of the frame.
+            keep (Iterable[int], optional): Only store these objects.
+        """
+        obj_ids = [int(obj_id) for obj_id in _to_numpy(frame_output["out_obj_ids"]).reshape(-1)]
+        masks = frame_output["out_binary_masks"]
+        if self.shape is None and len(obj_ids):
+            self.shape = tuple(int(d) for d in masks.shape[-2:])
+        frame = self.frames.setdefault(frame_idx, {})
+        if keep is not None:
+            # Seuls les objets gardés sont encodés (un passage par paquet d'objets)
+            keep = set(keep)
+            rows = [i for i, obj_id in enumerate(obj_ids) if obj_id in keep]
+            if len(rows) < len(obj_ids):
+                masks = _to_numpy(masks).reshape((len(obj_ids), -1) + tuple(masks.shape[-2:]))[rows]
+                obj_ids = [obj_ids[i] for i in rows]
+        if not obj_ids:
+            return
+        for obj_id, rle in zip(obj_ids, encode_masks(masks)):
+            if mask_utils.area(rle) > 0:
+                frame[obj_id] = rle
+
+    @classmethod
+    def from_propagate(cls, outputs: Dict[int, Dict], keep: Optional[Iterable[int]] = None) -> "MaskStore":
+        """Encodes a whole propagate() output; each dense frame is dropped once encoded."""
+        store = cls()
+        for frame_idx in sorted(outputs):
+            store.add_frame(frame_idx, outputs.pop(frame_idx), keep)
+        return store
+
+    @classmethod
+    def from_frames(cls, frames: Iterable[Tuple[int, Dict]], keep: Optional[Iterable[int]] = None) -> "MaskStore":
+        """Encodes (frame_idx, frame output) pairs as the tracker streams them."""
+        store = cls()
+        keep = set(keep) if keep is not None else None
+        for frame_idx, frame_output in frames:
+            store.add_frame(frame_idx, frame_output, keep)
+        return store
+
+    def update(self, other: "MaskStore") -> None:
+        """Merges the masks of another store (e.g. another object chunk)."""
+        self.shape = self.shape or other.shape
+        for frame_idx, masks in other.frames.items():
+            self.frames.setdefault(frame_idx, {}).update(masks)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def mask(self, frame_idx: int, obj_id: int) -> Optional[np.ndarray]:
+        """Dense [H, W] bool mask of one object on one frame (None if absent)."""
+        rle = self.frames.get(frame_idx, {}).get(obj_id)
+        return None if rle is None else mask_utils.decode(rle).astype(bool)
+
+    def bboxes(self, obj_ids: List[int],
+               margin: float = config.SAFETY_MARGIN) -> Dict[int, Dict[int, Optional[BBox]]]:
+        """Boxes of obj_ids on every frame, from the RLEs (same layout as bboxes_from_outputs)."""
+        frame_idxs = sorted(self.frames)
+        boxes_by_obj = {obj_id: {idx: None for idx in frame_idxs} for obj_id in obj_ids}
+        if not frame_idxs or not obj_ids or self.shape is None:
+            return boxes_by_obj
+
+        keys, rles = [], []
+        for idx in frame_idxs:
+            for obj_id in obj_ids:
+                rle = self.frames[idx].get(obj_id)
+                if rle is not None:
+                    keys.append((obj_id, idx))
+                    rles.append(rle)
+        if not rles:
+            return boxes_by_obj
+
+        # toBbox : [x, y, w, h] -> (x1, y1, x2, y2) inclusifs, comme masks_to_bboxes
+        xywh = mask_utils.toBbox(rles)
+        boxes = np.stack([xywh[:, 0], xywh[:, 1],
+                          xywh[:, 0] + xywh[:, 2] - 1, xywh[:, 1] + xywh[:, 3] - 1], axis=-1)
+        height, width = self.shape
+        boxes = expand_boxes(boxes, np.ones(len(boxes), dtype=bool), height, width, margin)
+        for (obj_id, idx), box in zip(keys, boxes.tolist()):
+            boxes_by_obj[obj_id][idx] = tuple(box)
+        return boxes_by_obj
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the encoded masks."""
+        return sum(len(rle["counts"]) for masks in self.frames.values() for rle in masks.values())
@@ -0,0 +1,239 @@
+"""Structured timings and counters for the pipeline.
+
+``metrics.span(name)`` times a block and records one event: duration, success,
+process / thread, any attributes set on the span (bytes, frames, objects...)
+and the peak RSS / GPU memory of the process so far. Events are appended to
+METRICS_FILE (JSONL) and aggregated into Prometheus text metrics, written to
+METRICS_PROM_FILE (node_exporter textfile format) and optionally served on
+METRICS_PORT.
+
+SAM workers run in other processes: their events are buffered and sent back
+to the parent with each job result (see pipeline/worker.py), so a single
+process writes the files.
+
+    with metrics.span("download", file=filename) as span:
+        ...
+        span["bytes"] = os.path.getsize(local_path)
+"""
+import json
+import logging
+import multiprocessing as mp
+import os
+import resource
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PREFIX = "sam3"
+# Champs d'un événement qui ne sont pas des attributs du span
+_RESERVED = {"ts", "span", "seconds", "ok", "process", "thread", "peak_rss_bytes", "peak_gpu_bytes"}
+
+
+def _peak_memory() -> Tuple[int, Optional[int]]:
+    # ru_maxrss est en KiB sous Linux
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    gpu = None
+    torch = sys.modules.get("torch")  # jamais importé ici : seulement s'il est déjà chargé
+    if torch is not None and torch.cuda.is_available():
+        gpu = int(torch.cuda.max_memory_allocated())
+    return rss, gpu
+
+
+class Metrics:
+    """Span recorder and Prometheus aggregator of one process.
+
+    Args:
+        jsonl_path (str, optional): JSONL file receiving every event.
+        forward (bool): Buffer events for drain() (SAM worker processes).
+    """
+
+    def __init__(self, jsonl_path: Optional[str] = None, forward: bool = False):
+        self._lock = threading.Lock()
+        self._file = None
+        self._forward = forward
+        self._buffer: List[Dict] = []
+        self._calls: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._seconds: Dict[str, float] = defaultdict(float)
+        self._max_seconds: Dict[str, float] = defaultdict(float)
+        self._totals: Dict[Tuple[str, str], float] = defaultdict(float)
+        self._peaks: Dict[Tuple[str, str], int] = {}
+        if jsonl_path:
+            self.configure(jsonl_path, forward)
+
+    def configure(self, jsonl_path: Optional[str] = None, forward: bool = False) -> None:
+        """Sets where events go (file in the main process, buffer in workers)."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if jsonl_path:
+                os.makedirs(os.path.dirname(str(jsonl_path)) or ".", exist_ok=True)
+                self._file = open(jsonl_path, "a", buffering=1)
+            self._forward = forward
+
+    @contextmanager
+    def span(self, name: str, **attrs) -> Iterator[Dict]:
+        """Times the block; numeric attributes set on the yielded dict become counters."""
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield attrs
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            rss, gpu = _peak_memory()
+            self.record({
+                "ts": time.time(),
+                "span": name,
+                "seconds": time.perf_counter() - start,
+                "ok": ok,
+                "process": mp.current_process().name,
+                "thread": threading.current_thread().name,
+                "peak_rss_bytes": rss,
+                "peak_gpu_bytes": gpu,
+                **attrs,
+            })
+
+    def record(self, event: Dict) -> None:
+        """Aggregates one event and writes / buffers it."""
+        name = event["span"]
+        with self._lock:
+            self._calls[name] += 1
+            self._errors[name] += not event["ok"]
+            self._seconds[name] += event["seconds"]
+            self._max_seconds[name] = max(self._max_seconds[name], event["seconds"])
+            for key, value in event.items():
+                if key not in _RESERVED and isinstance(value, (int, float)) and not isinstance(value, bool):
+                    self._totals[(key, name)] += value
+            for key in ("peak_rss_bytes", "peak_gpu_bytes"):
+                if event.get(key) is not None:
+                    peak_key = (key, event["process"])
+                    self._peaks[peak_key] = max(self._peaks.get(peak_key, 0), event[key])
+
+            if self._file is not None:
+                self._file.write(json.dumps(event, default=str) + "\n")
+            if self._forward:
+                self._buffer.append(event)
+
+    def drain(self) -> List[Dict]:
+        """Returns and clears the buffered events (forward mode)."""
+        with self._lock:
+            events, self._buffer = self._buffer, []
+            return events
+
+    def merge(self, events: List[Dict]) -> None:
+        """Ingests events recorded by another process."""
+        for event in events:
+            self.record(event)
+
+    def prometheus_text(self) -> str:
+        """Current aggregates in the Prometheus text exposition format."""
+        lines = []
+
+        def family(metric: str, kind: str, help_text: str, samples) -> None:
+            lines.append(f"# HELP {PREFIX}_{metric} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f"{PREFIX}_{metric}{{{label_text}}} {value}")
+
+        with self._lock:
+            family("span_calls_total", "counter", "Completed spans.",
+                   [({"span": n}, v) for n, v in sorted(self._calls.items())])
+            family("span_errors_total", "counter", "Spans that raised.",
+                   [({"span": n}, v) for n, v in sorted(self._errors.items())])
+            family("span_seconds_total", "counter", "Time spent in spans.",
+                   [({"span": n}, round(v, 6)) for n, v in sorted(self._seconds.items())])
+            family("span_seconds_max", "gauge", "Longest span.",
+                   [({"span": n}, round(v, 6)) for n, v in sorted(self._max_seconds.items())])
+            for key in sorted({key for key, _ in self._totals}):
+                family(f"{key}_total", "counter", f"Sum of the '{key}' span attribute.",
+                       [({"span": n}, v) for (k, n), v in sorted(self._totals.items()) if k == key])
+            for key in ("peak_rss_bytes", "peak_gpu_bytes"):
+                family(key, "gauge", "Peak memory of the process.",
+                       [({"process": p}, v) for (k, p), v in sorted(self._peaks.items()) if k == key])
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        """Writes prometheus_text() atomically (textfile collector format)."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+
+class MetricsExporter:
+    """Periodically writes the Prometheus file, and optionally serves /metrics.
+
+    Args:
+        metrics (Metrics): Aggregates to export.
+        prom_path (str, optional): Textfile written every `interval` seconds.
+        port (int, optional): HTTP port serving the same text on /metrics.
+        interval (float): Seconds between two writes of prom_path.
+        host (str): Address the HTTP server listens on (METRICS_BIND).
+    """
+
+    def __init__(self, metrics: Metrics, prom_path: Optional[str] = None,
+                 port: Optional[int] = None, interval: float = 15.0,
+                 host: str = "127.0.0.1"):
+        self.metrics = metrics
+        self.prom_path = str(prom_path) if prom_path else None
+        self.interval = interval
+        self._stop = threading.Event()
+        self._server = None
+
+        if port:
+            self._server = ThreadingHTTPServer((host, port), self._handler())
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            logging.info("Serving metrics on %s:%d/metrics", host, port)
+        if self.prom_path:
+            self._thread = threading.Thread(target=self._run, name="metrics-export", daemon=True)
+            self._thread.start()
+
+    def _handler(self):
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._flush()
+
+    def _flush(self) -> None:
+        try:
+            self.metrics.write_prometheus(self.prom_path)
+        except OSError as e:
+            logging.error("Cannot write %s: %s", self.prom_path, e)
+
+    def close(self) -> None:
+        """Writes the final values and stops the exporter."""
+        self._stop.set()
+        if self.prom_path:
+            self._flush()
+        if self._server is not None:
+            self._server.shutdown()
+
+
+# Instance du processus courant (configurée par main.py, ou par _worker_main)
+metrics = Metrics()
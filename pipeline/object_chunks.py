@@ -0,0 +1,151 @@
+"""Runtime object cap and memory-budgeted object chunks for SAM tracking.
+
+``apply_object_cap`` sets ``max_num_objects`` on the loaded SAM3 modules
+(MAX_NUM_OBJECTS), replacing the ``update_max_objects.sh`` patch of the
+installed sam3 sources. It is a detection cap, read by the tracker on every
+frame, and is kept high: memory is handled by the chunks below, not by
+dropping objects. ``num_obj_for_compile`` is not set here, sam3 only reads it
+when the model is built (torch.compile warm-up).
+
+Tracking memory grows with the number of objects, so a crowded clip may not
+fit at once. ``ObjectChunker`` splits the objects found by add_prompt into
+chunks whose estimated cost (SAM_MEMORY_PER_OBJECT_MB each) fits the budget
+(SAM_MEMORY_BUDGET_MB, or the free GPU memory). The extractor propagates chunk
+by chunk and merges the masks. While a chunk is propagated, the detection cap
+is lowered to the chunk size (``ObjectChunker.limit``): objects removed from
+the session and re-detected on later frames cannot be tracked on top of the
+chunk. On GPU, the estimate is corrected from the peak memory of each chunk;
+an out-of-memory error halves the chunk and retries it.
+"""
+import logging
+import sys
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import config
+
+
+def _set_cap(model, max_objects: int) -> int:
+    updated = 0
+    for module in model.modules():
+        if hasattr(module, "max_num_objects"):
+            module.max_num_objects = max_objects
+            updated += 1
+    return updated
+
+
+def apply_object_cap(model, max_objects: int = config.MAX_NUM_OBJECTS) -> int:
+    """Sets the detection cap on every sub-module that defines it.
+
+    Returns:
+        int: Number of modules updated (0: this sam3 version has no such attribute).
+    """
+    updated = _set_cap(model, max_objects)
+    if not updated:
+        logging.warning("No max_num_objects attribute found on the SAM model, MAX_NUM_OBJECTS not applied")
+    return updated
+
+
+def is_out_of_memory(error: BaseException) -> bool:
+    """True for torch's (or the CUDA allocator's) out-of-memory errors."""
+    if "out of memory" in str(error).lower():
+        return True
+    # torch jamais importé : l'erreur ne peut pas venir de lui
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return False
+    oom = getattr(torch, "OutOfMemoryError", None) or getattr(torch.cuda, "OutOfMemoryError", None)
+    return oom is not None and isinstance(error, oom)
+
+
+def available_memory_mb(device: str) -> Optional[float]:
+    """Memory SAM may use on device: free + cached-but-unused GPU memory, None on CPU."""
+    import torch
+    if not device.startswith("cuda") or not torch.cuda.is_available():
+        return None
+    free, _ = torch.cuda.mem_get_info()
+    reusable = torch.cuda.memory_reserved() - torch.cuda.memory_allocated()
+    return (free + reusable) / 1024**2
+
+
+class ObjectChunker:
+    """Splits tracked objects into chunks fitting a memory budget.
+
+    Args:
+        device (str): Inference device ("cuda", "cpu"...).
+        budget_mb (float, optional): Memory for the tracking of one chunk; default
+            SAM_MEMORY_BUDGET_MB, or SAM_MEMORY_FRACTION of the available GPU memory.
+        per_object_mb (float): Initial estimate of the memory of one tracked object.
+        max_objects (int, optional): Optional upper bound of a chunk
+            (SAM_MAX_CHUNK_OBJECTS); None lets the budget alone decide.
+        model (torch.nn.Module, optional): SAM model whose detection cap is
+            lowered to the chunk size by ``limit``.
+    """
+
+    def __init__(self, device: str, budget_mb: Optional[float] = config.SAM_MEMORY_BUDGET_MB,
+                 per_object_mb: float = config.SAM_MEMORY_PER_OBJECT_MB,
+                 max_objects: Optional[int] = config.SAM_MAX_CHUNK_OBJECTS,
+                 model=None):
+        self.device = device
+        self.budget_mb = budget_mb
+        self.per_object_mb = per_object_mb
+        self.max_objects = max_objects
+        self.model = model
+
+    def chunk_size(self, num_objects: int) -> int:
+        """Objects tracked at once: budget / per-object estimate, within [1, num_objects]."""
+        limit = min(num_objects, self.max_objects or num_objects)
+        budget = self.budget_mb
+        if budget is None:
+            available = available_memory_mb(self.device)
+            if available is None:
+                return max(1, limit)  # CPU sans budget configuré : pas de découpage
+            budget = available * config.SAM_MEMORY_FRACTION
+        return max(1, min(limit, int(budget // self.per_object_mb)))
+
+    @contextmanager
+    def limit(self, num_objects: int) -> Iterator[None]:
+        """Lowers the model's detection cap to num_objects, restores MAX_NUM_OBJECTS after."""
+        if self.model is None:
+            yield
+            return
+        _set_cap(self.model, num_objects)
+        try:
+            yield
+        finally:
+            _set_cap(self.model, config.MAX_NUM_OBJECTS)
+
+    def start_measure(self) -> Optional[int]:
+        """Memory allocated before the chunk (None off GPU).
+
+        The peak counter is not reset: it also feeds the peak_gpu_bytes
+        metric of the worker (pipeline/metrics.py).
+        """
+        if not self.device.startswith("cuda"):
+            return None
+        import torch
+        if not torch.cuda.is_available():
+            return None
+        return torch.cuda.memory_allocated()
+
+    def observe(self, baseline: Optional[int], num_objects: int) -> None:
+        """Corrects per_object_mb from the peak memory of a chunk of num_objects.
+
+        max_memory_allocated() is the peak since the worker started, so the
+        difference with baseline is an upper bound of the chunk's own use
+        (exact when the chunk sets a new peak): the estimate errs on the safe side.
+        """
+        if baseline is None or not num_objects:
+            return
+        import torch
+        measured = (torch.cuda.max_memory_allocated() - baseline) / 1024**2 / num_objects
+        # Estimation prudente : remonte tout de suite, redescend lentement
+        if measured > self.per_object_mb:
+            self.per_object_mb = measured
+        else:
+            self.per_object_mb = 0.8 * self.per_object_mb + 0.2 * measured
+
+    def on_out_of_memory(self, size: int) -> int:
+        """Doubles the per-object estimate after an OOM; returns the size to retry with."""
+        self.per_object_mb *= 2
+        return max(1, min(size // 2, self.chunk_size(size)))
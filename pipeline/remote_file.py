@@ -0,0 +1,163 @@
+"""Seekable read-only file over SFTP, with block cache and read-ahead.
+
+A decoder opened on a ``RemoteFile`` only transfers what it actually reads:
+the container index and the GOPs covering the sampled clip windows, instead
+of the whole multi-hundred-MB source video. Reads are served from an LRU
+cache of fixed-size blocks; a miss fetches the missing block and the next
+REMOTE_READAHEAD_BLOCKS in one pipelined ``readv`` request. The remote file is
+opened once, on a pool session borrowed for the RemoteFile's whole life (an
+SFTP channel cannot be shared between threads), and both are released by
+close(); a new session is borrowed only if the connection drops.
+"""
+import io
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack
+from typing import Optional
+
+import paramiko
+
+import config
+from pipeline.transport import SFTPPool, get_pool
+
+
+class RemoteFile(io.RawIOBase):
+    """Read-only, seekable view of a remote file.
+
+    Args:
+        remote_path (str): Path of the file on the SFTP server.
+        size (int, optional): File size if already known (e.g. from the catalog).
+        block_size (int): Size of a cached block in bytes.
+        cache_blocks (int): Max number of blocks kept in memory.
+        readahead_blocks (int): Extra blocks fetched after a miss.
+        pool (SFTPPool, optional): Pool to borrow the session from (shared pool by default).
+    """
+
+    def __init__(self, remote_path: str, size: Optional[int] = None,
+                 block_size: int = config.REMOTE_BLOCK_SIZE,
+                 cache_blocks: int = config.REMOTE_CACHE_BLOCKS,
+                 readahead_blocks: int = config.REMOTE_READAHEAD_BLOCKS,
+                 pool: Optional[SFTPPool] = None):
+        super().__init__()
+        self.name = remote_path
+        self.block_size = block_size
+        self.cache_blocks = max(cache_blocks, readahead_blocks + 1)
+        self.readahead_blocks = readahead_blocks
+        self._pool = pool if pool is not None else get_pool()
+        self.size = size if size is not None else self._pool.run(lambda sftp: sftp.stat(remote_path).st_size)
+
+        self.bytes_transferred = 0
+        self.requests = 0
+        self._pos = 0
+        self._blocks: "OrderedDict[int, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._handle: Optional[paramiko.SFTPFile] = None
+        self._session = ExitStack()
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if pos < 0:
+            raise ValueError("Negative seek position")
+        self._pos = pos
+        return pos
+
+    def _fetch(self, first: int) -> None:
+        last_block = (self.size - 1) // self.block_size
+        wanted = [b for b in range(first, min(first + self.readahead_blocks, last_block) + 1)
+                  if b not in self._blocks]
+        chunks = [(b * self.block_size, min(self.block_size, self.size - b * self.block_size))
+                  for b in wanted]
+
+        for attempt in range(1, config.SFTP_RETRIES + 1):
+            try:
+                if self._handle is None:
+                    # Session gardée jusqu'à close() : aucun autre thread ne l'emprunte entre deux lectures
+                    sftp = self._session.enter_context(self._pool.session())
+                    # Ouvert une seule fois : pas d'aller-retour open/close par bloc manquant
+                    self._handle = sftp.open(self.name, "rb")
+                data = list(self._handle.readv(chunks))
+                break
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                # Connexion perdue : session rendue (ou jetée si morte), une autre est empruntée
+                self._close_handle()
+                if attempt == config.SFTP_RETRIES:
+                    raise
+                logging.warning("Remote read of %s failed (%s), reopening (%d/%d)",
+                                self.name, e, attempt, config.SFTP_RETRIES)
+        self.requests += 1
+        for block, payload in zip(wanted, data):
+            self.bytes_transferred += len(payload)
+            self._blocks[block] = payload
+        while len(self._blocks) > self.cache_blocks:
+            self._blocks.popitem(last=False)
+
+    def _block(self, block: int) -> bytes:
+        if block not in self._blocks:
+            self._fetch(block)
+        self._blocks.move_to_end(block)
+        return self._blocks[block]
+
+    def readinto(self, buffer) -> int:
+        with self._lock:
+            view = memoryview(buffer).cast("B")
+            n = min(len(view), max(self.size - self._pos, 0))
+            written = 0
+            while written < n:
+                block, offset = divmod(self._pos + written, self.block_size)
+                data = self._block(block)
+                chunk = min(n - written, len(data) - offset)
+                view[written:written + chunk] = data[offset:offset + chunk]
+                written += chunk
+            self._pos += written
+            return written
+
+    def _close_handle(self) -> None:
+        handle, self._handle = self._handle, None
+        if handle is not None:
+            try:
+                handle.close()
+            except Exception:
+                pass
+        # Rend la session au pool
+        self._session.close()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._close_handle()
+            logging.info("Remote read of %s: %.1f MB of %.1f MB in %d requests",
+                         self.name, self.bytes_transferred / 1e6, self.size / 1e6, self.requests)
+            self._blocks.clear()
+        super().close()
+
+
+def open_remote_video(filename: str, alias: str, size: Optional[int] = None) -> io.BufferedReader:
+    """Opens a source video of FARM_NAMES for ranged reads.
+
+    Args:
+        filename (str): Video filename relative to the farm folder ("Dxx/name.mp4").
+        alias (str): Farm alias.
+        size (int, optional): Known file size, saves a stat round trip.
+
+    Returns:
+        io.BufferedReader: Buffered file object; ``.raw`` is the RemoteFile
+            (with its bytes_transferred counter).
+    """
+    remote = RemoteFile(f"{config.FARM_NAMES[alias]}/{filename}", size=size)
+    return io.BufferedReader(remote, buffer_size=64 * 1024)
@@ -0,0 +1,75 @@
+"""Seeded, farm-stratified sampling of source videos without replacement.
+
+``random.choice`` over the whole catalog draws the same video several times
+and favours the farms with the most videos. ``StratifiedSampler`` shuffles
+each farm's videos with a seed derived from SAMPLER_SEED and interleaves the
+farms round-robin, so every farm is visited at the same rate and a video is
+drawn at most once. With the same catalog and seed the order is identical
+from one run to the next; videos already finished (see WorkJournal) are
+simply left out.
+"""
+import random
+from collections import defaultdict
+from typing import Collection, Dict, Iterator, List, Optional, Tuple
+
+import config
+
+Key = Tuple[str, str]  # (alias, filename)
+
+
+def video_rng(seed: int, alias: str, filename: str) -> random.Random:
+    """Generator dedicated to one video (e.g. its clip windows), stable across runs."""
+    return random.Random(f"{seed}:{alias}:{filename}")
+
+
+class StratifiedSampler:
+    """Draws catalog videos farm by farm, without replacement.
+
+    Args:
+        videos (List[Dict]): Catalog rows ('filename', 'alias', ...).
+        seed (int): Seed of the per-farm shuffles.
+        exclude (Collection[Key], optional): (alias, filename) never drawn (finished videos).
+        first (Collection[Key], optional): (alias, filename) drawn before the others
+            (videos interrupted by a previous run).
+    """
+
+    def __init__(self, videos: List[Dict], seed: int = config.SAMPLER_SEED,
+                 exclude: Optional[Collection[Key]] = None,
+                 first: Optional[Collection[Key]] = None):
+        self.seed = seed
+        exclude = set(exclude or ())
+        first = set(first or ())
+
+        by_alias: Dict[str, List[Dict]] = defaultdict(list)
+        for video in sorted(videos, key=lambda v: (v["alias"], v["filename"])):
+            if (video["alias"], video["filename"]) not in exclude:
+                by_alias[video["alias"]].append(video)
+
+        self._resumed: List[Dict] = []
+        self._strata: Dict[str, List[Dict]] = {}
+        for alias in sorted(by_alias):
+            rows = by_alias[alias]
+            random.Random(f"{seed}:{alias}").shuffle(rows)
+            self._resumed.extend(v for v in rows if (v["alias"], v["filename"]) in first)
+            self._strata[alias] = [v for v in rows if (v["alias"], v["filename"]) not in first]
+
+    def __len__(self) -> int:
+        return len(self._resumed) + sum(len(rows) for rows in self._strata.values())
+
+    def __iter__(self) -> Iterator[Dict]:
+        yield from self._resumed
+        # Tour de rôle entre fermes ; une ferme épuisée sort de la rotation
+        depth = max((len(rows) for rows in self._strata.values()), default=0)
+        for i in range(depth):
+            for rows in self._strata.values():
+                if i < len(rows):
+                    yield rows[i]
+
+    def draw(self, n: int) -> List[Dict]:
+        """First n videos of the sampling order."""
+        picks = []
+        for video in self:
+            if len(picks) >= n:
+                break
+            picks.append(video)
+        return picks
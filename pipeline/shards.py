@@ -0,0 +1,201 @@
+"""Packed shard formats for the VideoMAE pretraining set.
+
+Decoding thousands of small 224x224 mp4 crops every epoch makes training
+decode-bound. The crops are decoded once here and packed:
+
+- memmap shards: raw uint8 files holding ``[n, NUM_FRAMES_PER_CLIP,
+  CROP_SIZE, CROP_SIZE, 3]`` RGB frames, plus ``<split>_index.json`` (shape,
+  shards, sample -> shard/offset). ``MemmapShards`` maps them with
+  ``np.memmap``: a sample is a zero-copy view, no decoding at training time.
+- tar shards (WebDataset layout): ``<split>-000000.tar`` with ``<key>.mp4``
+  (the crop as is) or ``<key>.npy`` (decoded frames) and ``<key>.json``
+  members, for streaming loaders.
+"""
+import io
+import json
+import logging
+import os
+import tarfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import cv2
+import numpy as np
+
+import config
+
+DTYPE = "uint8"
+
+
+def decode_crop(path: str, num_frames: int = config.NUM_FRAMES_PER_CLIP,
+                size: int = config.CROP_SIZE) -> Optional[np.ndarray]:
+    """Decodes a crop video into a fixed [num_frames, size, size, 3] RGB array.
+
+    Short videos are padded by repeating their last frame, long ones truncated.
+
+    Returns:
+        np.ndarray or None: The frames, or None if the video cannot be read.
+    """
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    try:
+        while len(frames) < num_frames:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            if frame.shape[:2] != (size, size):
+                frame = cv2.resize(frame, (size, size), interpolation=cv2.INTER_AREA)
+            frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    finally:
+        cap.release()
+    if not frames:
+        return None
+    frames.extend([frames[-1]] * (num_frames - len(frames)))
+    return np.stack(frames)
+
+
+def _decode_all(paths: List[str], workers: int) -> Iterator[Optional[np.ndarray]]:
+    # Décodage en parallèle, résultats dans l'ordre des chemins
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(decode_crop, paths, chunksize=8)
+
+
+def sample_key(path: str) -> str:
+    """WebDataset key of a crop: its file name without extension."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def write_memmap_shards(paths: List[str], out_dir: str, split: str,
+                        shard_size: int = config.SHARD_SIZE,
+                        workers: int = config.SHARD_WORKERS) -> Dict:
+    """Packs the crops of one split into raw uint8 shards and writes the index.
+
+    Args:
+        paths (List[str]): Crop videos of the split.
+        out_dir (str): Output folder.
+        split (str): "train" or "test" (file name prefix).
+        shard_size (int): Samples per shard.
+        workers (int): Decoding processes.
+
+    Returns:
+        Dict: The index, also written to <out_dir>/<split>_index.json.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    sample_shape = [config.NUM_FRAMES_PER_CLIP, config.CROP_SIZE, config.CROP_SIZE, 3]
+    index = {"shape": sample_shape, "dtype": DTYPE, "shards": [], "samples": []}
+
+    shard_file, count = None, 0
+    try:
+        for path, frames in zip(paths, _decode_all(paths, workers)):
+            if frames is None:
+                logging.warning("Cannot decode %s, skipped", path)
+                continue
+            if shard_file is None or count == shard_size:
+                if shard_file is not None:
+                    shard_file.close()
+                    index["shards"][-1]["count"] = count
+                name = f"{split}_{len(index['shards']):05d}.u8"
+                shard_file = open(os.path.join(out_dir, name), "wb")
+                index["shards"].append({"file": name, "count": 0})
+                count = 0
+            shard_file.write(np.ascontiguousarray(frames, dtype=DTYPE).tobytes())
+            index["samples"].append({"path": path, "key": sample_key(path),
+                                     "shard": len(index["shards"]) - 1, "offset": count})
+            count += 1
+    finally:
+        if shard_file is not None:
+            shard_file.close()
+            index["shards"][-1]["count"] = count
+
+    index_path = os.path.join(out_dir, f"{split}_index.json")
+    with open(f"{index_path}.tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(f"{index_path}.tmp", index_path)
+    logging.info("Packed %d %s samples into %d shards", len(index["samples"]), split, len(index["shards"]))
+    return index
+
+
+class MemmapShards:
+    """Zero-copy reader of the shards written by write_memmap_shards.
+
+    Args:
+        out_dir (str): Folder holding the shards and the index.
+        split (str): "train" or "test".
+    """
+
+    def __init__(self, out_dir: str, split: str):
+        with open(os.path.join(out_dir, f"{split}_index.json")) as f:
+            self.index = json.load(f)
+        shape = tuple(self.index["shape"])
+        self._shards = [
+            np.memmap(os.path.join(out_dir, shard["file"]), dtype=self.index["dtype"], mode="r",
+                      shape=(shard["count"],) + shape)
+            for shard in self.index["shards"]
+        ]
+        self.samples = self.index["samples"]
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def __getitem__(self, i: int) -> np.ndarray:
+        """[NUM_FRAMES_PER_CLIP, CROP_SIZE, CROP_SIZE, 3] uint8 view of sample i."""
+        sample = self.samples[i]
+        return self._shards[sample["shard"]][sample["offset"]]
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def write_tar_shards(paths: List[str], out_dir: str, split: str,
+                     shard_size: int = config.SHARD_SIZE, frames: bool = False,
+                     workers: int = config.SHARD_WORKERS) -> List[str]:
+    """Writes WebDataset-style tar shards of one split.
+
+    Args:
+        paths (List[str]): Crop videos of the split.
+        out_dir (str): Output folder.
+        split (str): "train" or "test" (shard name prefix).
+        shard_size (int): Samples per tar.
+        frames (bool): Store decoded frames (<key>.npy) instead of the mp4 bytes.
+        workers (int): Decoding processes (frames=True only).
+
+    Returns:
+        List[str]: Paths of the tar shards.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    decoded = _decode_all(paths, workers) if frames else iter([None] * len(paths))
+
+    shard_paths, tar, count = [], None, 0
+    try:
+        for path, array in zip(paths, decoded):
+            if frames and array is None:
+                logging.warning("Cannot decode %s, skipped", path)
+                continue
+            if tar is None or count == shard_size:
+                if tar is not None:
+                    tar.close()
+                shard_paths.append(os.path.join(out_dir, f"{split}-{len(shard_paths):06d}.tar"))
+                tar = tarfile.open(shard_paths[-1], "w")
+                count = 0
+
+            key = sample_key(path)
+            if frames:
+                buffer = io.BytesIO()
+                np.save(buffer, array)
+                _add_member(tar, f"{key}.npy", buffer.getvalue())
+            else:
+                with open(path, "rb") as f:
+                    _add_member(tar, f"{key}.mp4", f.read())
+            meta = {"source": os.path.basename(path), "split": split,
+                    "num_frames": config.NUM_FRAMES_PER_CLIP, "size": config.CROP_SIZE}
+            _add_member(tar, f"{key}.json", json.dumps(meta).encode())
+            count += 1
+    finally:
+        if tar is not None:
+            tar.close()
+
+    logging.info("Wrote %d %s tar shards", len(shard_paths), split)
+    return shard_paths
@@ -0,0 +1,137 @@
+"""Threaded stage pipeline with bounded queues.
+
+Each stage has its own pool of threads and reads from a bounded queue fed by
+the previous stage, so a slow stage applies backpressure upstream while the
+other stages keep working (e.g. downloads and uploads overlap SAM inference).
+"""
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Optional
+
+from pipeline.metrics import metrics
+
+# Marqueur de fin de flux entre deux étapes
+_END = object()
+
+# Période de réveil des threads bloqués, pour réagir à stop()
+_TICK = 0.5
+
+
+@dataclass
+class Stage:
+    """One step of the pipeline.
+
+    Args:
+        name (str): Stage name, used in logs and thread names.
+        fn (Callable): fn(item) -> iterable of items for the next stage
+            (None means nothing to forward).
+        workers (int): Number of threads running fn.
+    """
+    name: str
+    fn: Callable[[object], Optional[Iterable[object]]]
+    workers: int = 1
+
+
+class StagePipeline:
+    """Runs items from a source through a chain of stages.
+
+    Args:
+        stages (List[Stage]): Stages in execution order.
+        queue_size (int): Capacity of each inter-stage queue.
+    """
+
+    def __init__(self, stages: List[Stage], queue_size: int = 4):
+        self.stages = stages
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._remaining = [stage.workers for stage in stages]
+        self._lock = threading.Lock()
+
+    def _put(self, index: int, item: object) -> bool:
+        """Blocking put that gives up when the pipeline is stopped."""
+        while not self._stop.is_set():
+            try:
+                self._queues[index].put(item, timeout=_TICK)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _finish_worker(self, index: int) -> None:
+        # Le dernier thread d'une étape propage la fin à l'étape suivante
+        with self._lock:
+            self._remaining[index] -= 1
+            last = self._remaining[index] == 0
+        if last and index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                self._put(index + 1, _END)
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = inbox.get(timeout=_TICK)
+                except queue.Empty:
+                    continue
+                if item is _END:
+                    break
+
+                try:
+                    # Temps par étape (attente des files exclue)
+                    with metrics.span(f"stage.{stage.name}"):
+                        outputs = stage.fn(item)
+                except Exception:
+                    logging.exception("Stage %s failed on %r", stage.name, item)
+                    continue
+
+                if outputs is None or index + 1 == len(self.stages):
+                    continue
+                for output in outputs:
+                    if not self._put(index + 1, output):
+                        break
+        finally:
+            self._finish_worker(index)
+
+    def stop(self) -> None:
+        """Asks every stage to stop after its current item."""
+        self._stop.set()
+
+    def run(self, source: Iterable[object]) -> None:
+        """Feeds source into the first stage and waits for the pipeline to drain.
+
+        On Ctrl-C, items already being processed are finished and queued ones
+        are dropped; a second Ctrl-C aborts without waiting.
+        """
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work, args=(index,),
+                    name=f"{stage.name}-{n}", daemon=True,
+                )
+                thread.start()
+                self._threads.append(thread)
+
+        try:
+            for item in source:
+                if not self._put(0, item):
+                    break
+            for _ in range(self.stages[0].workers):
+                self._put(0, _END)
+
+            # join() avec timeout pour rester interruptible par Ctrl-C
+            for thread in self._threads:
+                while thread.is_alive():
+                    thread.join(timeout=_TICK)
+
+        except KeyboardInterrupt:
+            logging.warning("Interrupted: finishing in-flight items (Ctrl-C again to abort)")
+            self.stop()
+            for thread in self._threads:
+                while thread.is_alive():
+                    thread.join(timeout=_TICK)
+            raise
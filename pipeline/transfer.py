@@ -0,0 +1,370 @@
+"""Parallel, resumable bulk transfers with the SFTP server.
+
+``download_files`` runs N transfer streams, each on its own SSH session of a
+dedicated pool. Every file is written to ``<local_path>.part`` and renamed
+once its size matches the remote one, so:
+
+- files already present with the right size are skipped,
+- an interrupted or failed transfer restarts where the ``.part`` stopped
+  (remote seek + append) instead of from zero, up to SFTP_RETRIES times.
+
+``TransferProgress`` prints files, bytes, throughput and ETA while the
+streams run.
+
+``upload_files`` sends the crops of one source video in a single SFTP session,
+then a manifest (``<source stem>.manifest.json`` next to the crops) with the
+name, size and sha256 of every file. Downloads of items carrying a sha256
+are checked against it before the ``.part`` file is renamed.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+import paramiko
+
+import config
+from pipeline.transport import SFTPPool, make_pool
+
+CHUNK_SIZE = 1024 * 1024
+MANIFEST_SUFFIX = ".manifest.json"
+
+
+@dataclass
+class TransferItem:
+    """One remote file to download.
+
+    Attributes:
+        remote_path (str): Path on the SFTP server.
+        local_path (str): Final local path.
+        size (int, optional): Remote size if known (from a listing).
+        sha256 (str, optional): Expected checksum (from the upload manifest).
+    """
+    remote_path: str
+    local_path: str
+    size: Optional[int] = None
+    sha256: Optional[str] = None
+
+
+@dataclass
+class TransferResult:
+    item: TransferItem
+    ok: bool
+    skipped: bool = False
+    bytes: int = 0
+    error: Optional[str] = None
+
+
+class TransferProgress:
+    """Thread-safe progress counters with a periodic one-line report on stderr.
+
+    Args:
+        total_files (int): Number of files to transfer.
+        total_bytes (int): Total bytes expected (0 if unknown).
+        interval (float): Seconds between two reports.
+    """
+
+    def __init__(self, total_files: int, total_bytes: int = 0, interval: float = 1.0):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.files = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last = (self._start, 0)
+        self._rate = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="transfer-progress", daemon=True)
+        self._thread.start()
+
+    def add_bytes(self, n: int) -> None:
+        with self._lock:
+            self.bytes += n
+
+    def file_done(self, result: TransferResult) -> None:
+        with self._lock:
+            self.files += 1
+            self.skipped += result.skipped
+            self.failed += not result.ok
+
+    def line(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            last_time, last_bytes = self._last
+            if now > last_time:
+                instant = (self.bytes - last_bytes) / (now - last_time)
+                # Moyenne glissante pour un débit lisible
+                self._rate = instant if not self._rate else 0.7 * self._rate + 0.3 * instant
+            self._last = (now, self.bytes)
+            done, total = self.bytes, self.total_bytes
+            text = (f"{self.files}/{self.total_files} files ({self.skipped} skipped, {self.failed} failed)  "
+                    f"{done / 1e9:.2f}/{total / 1e9:.2f} GB  {self._rate / 1e6:.1f} MB/s")
+            if self._rate > 0 and total > done:
+                text += f"  ETA {int((total - done) / self._rate) // 60:d} min"
+        return text
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            print(f"\r{self.line():<100}", end="", file=sys.stderr, flush=True)
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=2)
+        elapsed = time.monotonic() - self._start
+        print(f"\r{self.line():<100}", file=sys.stderr, flush=True)
+        logging.info("Transfer finished: %d files, %.2f GB in %.0f s (%.1f MB/s average)",
+                     self.files, self.bytes / 1e9, elapsed, self.bytes / max(elapsed, 1e-9) / 1e6)
+
+
+def file_sha256(path: str) -> str:
+    """Hex sha256 of a local file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _fetch(pool: SFTPPool, item: TransferItem, progress: Optional[TransferProgress]) -> int:
+    """Downloads item into its .part file, resuming after the bytes already there."""
+    part_path = f"{item.local_path}.part"
+
+    def _copy(sftp: paramiko.SFTPClient) -> int:
+        size = item.size if item.size is not None else sftp.stat(item.remote_path).st_size
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset > size:
+            offset = 0  # fichier distant remplacé entre-temps
+        with sftp.open(item.remote_path, "rb") as remote, open(part_path, "r+b" if offset else "wb") as local:
+            remote.seek(offset)
+            local.seek(offset)
+            local.truncate()
+            # Lectures pipelinées depuis la position courante
+            remote.prefetch(size)
+            received = 0
+            while offset + received < size:
+                data = remote.read(min(CHUNK_SIZE, size - offset - received))
+                if not data:
+                    break
+                local.write(data)
+                received += len(data)
+                if progress is not None:
+                    progress.add_bytes(len(data))
+        actual = os.path.getsize(part_path)
+        if actual != size:
+            raise IOError(f"Incomplete transfer of {item.remote_path}: {actual} / {size} bytes")
+        if item.sha256 is not None and file_sha256(part_path) != item.sha256:
+            # Contenu corrompu : la tentative suivante repart de zéro
+            os.remove(part_path)
+            raise IOError(f"Checksum mismatch for {item.remote_path}")
+        return received
+
+    # Pas de pool.run : les reprises sont faites par download_file, sur une seule couche
+    with pool.session() as sftp:
+        return _copy(sftp)
+
+
+def is_complete(item: TransferItem) -> bool:
+    """True if the local file exists with the expected size."""
+    return item.size is not None and os.path.exists(item.local_path) \
+        and os.path.getsize(item.local_path) == item.size
+
+
+def download_file(pool: SFTPPool, item: TransferItem, retries: int = config.SFTP_RETRIES,
+                  progress: Optional[TransferProgress] = None) -> TransferResult:
+    """Downloads one file (skip if complete, resume the .part, retry on failure)."""
+    if is_complete(item):
+        return TransferResult(item, ok=True, skipped=True)
+
+    os.makedirs(os.path.dirname(item.local_path) or ".", exist_ok=True)
+    transferred = 0
+    error = None
+    for attempt in range(1, retries + 1):
+        try:
+            transferred += _fetch(pool, item, progress)
+            os.replace(f"{item.local_path}.part", item.local_path)
+            return TransferResult(item, ok=True, bytes=transferred)
+        except Exception as e:
+            # Le .part est conservé : la tentative suivante reprend où elle s'est arrêtée
+            logging.warning("Transfer of %s failed (%s), attempt %d/%d",
+                            item.remote_path, e, attempt, retries)
+            error = repr(e)
+            if attempt < retries:
+                time.sleep(min(2 ** attempt, 30))
+    return TransferResult(item, ok=False, bytes=transferred, error=error)
+
+
+def download_files(items: List[TransferItem], streams: int = config.PRETRAIN_STREAMS,
+                   retries: int = config.SFTP_RETRIES, show_progress: bool = True) -> List[TransferResult]:
+    """Downloads items over `streams` concurrent SFTP sessions.
+
+    Args:
+        items (List[TransferItem]): Files to download.
+        streams (int): Concurrent transfers (one SSH session each).
+        retries (int): Attempts per file.
+        show_progress (bool): Print a progress line on stderr.
+
+    Returns:
+        List[TransferResult]: One result per item, in items order.
+    """
+    pool = make_pool(size=streams)
+    # Fichiers déjà complets exclus du total : le débit et l'ETA portent sur le reste
+    total_bytes = sum(item.size or 0 for item in items if not is_complete(item))
+    progress = TransferProgress(len(items), total_bytes) if show_progress else None
+
+    def _one(item: TransferItem) -> TransferResult:
+        result = download_file(pool, item, retries, progress)
+        if progress is not None:
+            progress.file_done(result)
+        if not result.ok:
+            logging.error("Giving up on %s: %s", item.remote_path, result.error)
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=streams, thread_name_prefix="transfer") as executor:
+            return list(executor.map(_one, items))
+    finally:
+        if progress is not None:
+            progress.close()
+        pool.close()
+
+
+def manifest_path(remote_dir: str, source: str) -> str:
+    """Remote manifest of the crops of one source video."""
+    stem = os.path.splitext(os.path.basename(source))[0]
+    return f"{remote_dir}/{stem}{MANIFEST_SUFFIX}"
+
+
+def make_remote_dirs(sftp: paramiko.SFTPClient, remote_dir: str) -> None:
+    """mkdir -p on the server."""
+    current_path = ""
+    for folder in remote_dir.strip("/").split("/"):
+        current_path += f"/{folder}"
+        try:
+            sftp.stat(current_path)
+        except IOError:
+            try:
+                sftp.mkdir(current_path)
+            except IOError:
+                # Créé entre-temps par un autre thread / une autre machine
+                sftp.stat(current_path)
+
+
+def read_manifest(sftp: paramiko.SFTPClient, remote_path: str) -> Dict[str, Dict]:
+    """Entries of a remote manifest by file name ({} if there is none)."""
+    try:
+        with sftp.open(remote_path, "r") as f:
+            return {entry["name"]: entry for entry in json.loads(f.read())["files"]}
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(sftp: paramiko.SFTPClient, remote_path: str, source: str,
+                    entries: Dict[str, Dict]) -> None:
+    # Fusion avec le manifeste d'un passage précédent sur la même vidéo
+    files = {**read_manifest(sftp, remote_path), **entries}
+    manifest = {"source": source, "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "files": [files[name] for name in sorted(files)]}
+    tmp_path = f"{remote_path}.part"
+    with sftp.open(tmp_path, "w") as f:
+        f.write(json.dumps(manifest, indent=1))
+    try:
+        sftp.posix_rename(tmp_path, remote_path)
+    except IOError:
+        # Serveur sans l'extension posix-rename
+        try:
+            sftp.remove(remote_path)
+        except FileNotFoundError:
+            pass
+        sftp.rename(tmp_path, remote_path)
+
+
+@dataclass
+class UploadResult:
+    """Outcome of upload_files.
+
+    Attributes:
+        uploaded (List[str]): Remote paths of the files sent.
+        failed (List[str]): Local paths given up on: all of them when the
+            manifest could not be written, even those already sent.
+        manifest (str, optional): Remote manifest path, None if it was not written.
+        bytes (int): Bytes sent.
+        error (str, optional): Last error.
+    """
+    uploaded: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)
+    manifest: Optional[str] = None
+    bytes: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed and self.manifest is not None
+
+
+def upload_files(pool: SFTPPool, local_paths: List[str], remote_dir: str, source: str,
+                 retries: int = config.SFTP_RETRIES,
+                 on_uploaded: Optional[Callable[[str], None]] = None) -> UploadResult:
+    """Uploads the crops of one source video in one SFTP session, then their manifest.
+
+    Args:
+        pool (SFTPPool): Pool to borrow the session from.
+        local_paths (List[str]): Files to send to remote_dir (same base names).
+        remote_dir (str): Remote folder, created if needed.
+        source (str): Source video the files were cut from (names the manifest).
+        retries (int): Attempts; each one resumes at the first file not sent yet.
+        on_uploaded (Callable, optional): Called with each remote path once sent.
+
+    Returns:
+        UploadResult: Files sent, files given up on and manifest path
+            (``ok`` only once every file and the manifest were written).
+    """
+    local = {os.path.basename(path): path for path in local_paths}
+    # Sommes calculées avant l'envoi : le manifeste décrit les fichiers locaux
+    entries = {name: {"name": name, "size": os.path.getsize(path), "sha256": file_sha256(path)}
+               for name, path in local.items()}
+    pending = deque(sorted(local))
+    result = UploadResult()
+    remote_manifest = manifest_path(remote_dir, source)
+
+    def _send(sftp: paramiko.SFTPClient) -> None:
+        make_remote_dirs(sftp, remote_dir)
+        while pending:
+            name = pending[0]
+            remote_path = f"{remote_dir}/{name}"
+            # confirm=True (défaut) : la taille distante est vérifiée après l'envoi
+            sftp.put(local[name], remote_path)
+            pending.popleft()
+            result.uploaded.append(remote_path)
+            result.bytes += entries[name]["size"]
+            if on_uploaded is not None:
+                on_uploaded(remote_path)
+        sent = {os.path.basename(path): entries[os.path.basename(path)] for path in result.uploaded}
+        _write_manifest(sftp, remote_manifest, os.path.basename(source), sent)
+
+    for attempt in range(1, retries + 1):
+        try:
+            # Session empruntée directement : cette boucle est la seule couche de reprise
+            with pool.session() as sftp:
+                _send(sftp)
+            result.manifest = remote_manifest
+            return result
+        except Exception as e:
+            # Les fichiers déjà envoyés ne le sont pas une seconde fois
+            logging.warning("Upload to %s failed (%s), attempt %d/%d, %d files left",
+                            remote_dir, e, attempt, retries, len(pending))
+            result.error = repr(e)
+            if attempt < retries:
+                time.sleep(min(2 ** attempt, 30))
+    # Sans manifeste, aucun crop n'est vérifiable à la réception : tous sont en échec
+    result.failed = [local[name] for name in sorted(local)]
+    return result
@@ -0,0 +1,242 @@
+"""Persistent SFTP sessions shared by every remote operation.
+
+Opening an ``sftp``/``ssh`` process per call costs a full SSH handshake each
+time. ``SFTPPool`` keeps a few authenticated paramiko sessions open (with
+keepalive), lends them to callers and transparently reconnects when a session
+dropped. ``configure()`` points the module-level pool at another server, e.g.
+a local SFTP stand-in.
+"""
+import logging
+import queue
+import stat
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional, TypeVar
+
+import paramiko
+
+import config
+
+T = TypeVar("T")
+
+
+class _Session:
+    """One SSH connection and its SFTP channel."""
+
+    def __init__(self, client: paramiko.SSHClient, keepalive: int):
+        self.client = client
+        self.transport = client.get_transport()
+        if keepalive:
+            self.transport.set_keepalive(keepalive)
+        self.sftp = client.open_sftp()
+
+    def is_active(self) -> bool:
+        return self.transport is not None and self.transport.is_active()
+
+    def close(self) -> None:
+        try:
+            self.sftp.close()
+        finally:
+            self.client.close()
+
+
+class SFTPPool:
+    """Bounded pool of reusable SFTP sessions.
+
+    Args:
+        host (str): SFTP server host.
+        port (int): SFTP server port.
+        user (str): Username.
+        password (str, optional): Password; keys/agent are used otherwise.
+        key_filename (str, optional): Private key file.
+        size (int): Max number of simultaneous sessions.
+        keepalive (int): SSH keepalive interval in seconds (0 disables it).
+        retries (int): Attempts per operation when the connection drops.
+        strict_host_key (bool): Reject hosts missing from known_hosts.
+    """
+
+    def __init__(self, host: str, port: int, user: str,
+                 password: Optional[str] = None,
+                 key_filename: Optional[str] = None,
+                 size: int = 2,
+                 keepalive: int = 30,
+                 retries: int = 3,
+                 strict_host_key: bool = True):
+        self.host = host
+        self.port = port
+        self.user = user
+        self._password = password
+        self._key_filename = key_filename
+        self._keepalive = keepalive
+        self._retries = max(1, retries)
+        self._strict_host_key = strict_host_key
+
+        self._idle: "queue.LifoQueue[_Session]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._sessions: List[_Session] = []
+
+    def _connect(self) -> _Session:
+        client = paramiko.SSHClient()
+        client.load_system_host_keys()
+        if not self._strict_host_key:
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            self.host,
+            port=self.port,
+            username=self.user,
+            password=self._password,
+            key_filename=self._key_filename,
+            timeout=30,
+        )
+        logging.info("SFTP session opened to %s@%s:%d", self.user, self.host, self.port)
+        session = _Session(client, self._keepalive)
+        with self._lock:
+            self._sessions.append(session)
+        return session
+
+    def _discard(self, session: _Session) -> None:
+        with self._lock:
+            if session in self._sessions:
+                self._sessions.remove(session)
+        try:
+            session.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def _borrow(self) -> Iterator[_Session]:
+        self._slots.acquire()
+        session = None
+        try:
+            while session is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except queue.Empty:
+                    candidate = self._connect()
+                if candidate.is_active():
+                    session = candidate
+                else:
+                    self._discard(candidate)
+
+            yield session
+        finally:
+            if session is not None:
+                if session.is_active():
+                    self._idle.put(session)
+                else:
+                    self._discard(session)
+            self._slots.release()
+
+    @contextmanager
+    def session(self) -> Iterator[paramiko.SFTPClient]:
+        """Borrows an SFTP client; dead sessions are dropped, not returned."""
+        with self._borrow() as session:
+            yield session.sftp
+
+    def run(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Calls fn(sftp, *args, **kwargs), reconnecting if the session dropped.
+
+        Errors raised while the session is still alive (missing file,
+        permission denied...) are not retried.
+        """
+        for attempt in range(1, self._retries + 1):
+            connection_lost = True
+            try:
+                with self._borrow() as session:
+                    try:
+                        return fn(session.sftp, *args, **kwargs)
+                    except (OSError, EOFError, paramiko.SSHException):
+                        connection_lost = not session.is_active()
+                        raise
+            except (OSError, EOFError, paramiko.SSHException) as e:
+                # Erreurs de connexion (y compris à l'ouverture) : on réessaie
+                if not connection_lost or attempt == self._retries:
+                    raise
+                logging.warning("SFTP connection lost (%s), reconnecting (%d/%d)",
+                                e, attempt, self._retries)
+
+    def close(self) -> None:
+        """Closes every open session."""
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for session in sessions:
+            try:
+                session.close()
+            except Exception:
+                pass
+        self._idle = queue.LifoQueue()
+
+
+_pool: Optional[SFTPPool] = None
+_pool_params: Optional[dict] = None
+_pool_lock = threading.Lock()
+
+
+def _default_params() -> dict:
+    return dict(
+        host=config.SFTP_HOST,
+        port=config.SFTP_PORT,
+        user=config.SFTP_USER,
+        password=config.SFTP_PASSWORD,
+        key_filename=config.SFTP_KEY_FILE,
+        size=config.SFTP_POOL_SIZE,
+        keepalive=config.SFTP_KEEPALIVE,
+        retries=config.SFTP_RETRIES,
+        strict_host_key=config.SFTP_STRICT_HOST_KEY,
+    )
+
+
+def make_pool(**kwargs) -> SFTPPool:
+    """New pool on the configured server (e.g. a larger one for bulk transfers).
+
+    Keyword arguments are those of SFTPPool; missing ones come from config,
+    or from configure() if the shared pool was redirected.
+    """
+    params = dict(_pool_params or _default_params())
+    params.update(kwargs)
+    return SFTPPool(**params)
+
+
+def configure(**kwargs) -> SFTPPool:
+    """Replaces the shared pool, e.g. to target a local SFTP stand-in.
+
+    Keyword arguments are those of SFTPPool; missing ones come from config.
+    """
+    global _pool, _pool_params
+    params = _default_params()
+    params.update(kwargs)
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool_params = params
+        _pool = SFTPPool(**params)
+        return _pool
+
+
+def get_pool() -> SFTPPool:
+    """Returns the shared pool, creating it from config on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SFTPPool(**_default_params())
+        return _pool
+
+
+def is_dir(attr: paramiko.SFTPAttributes) -> bool:
+    return attr.st_mode is not None and stat.S_ISDIR(attr.st_mode)
+
+
+def walk_files(sftp: paramiko.SFTPClient, root: str) -> List[str]:
+    """Recursively lists the regular files under root (remote paths)."""
+    files = []
+    pending = [root.rstrip("/")]
+    while pending:
+        current = pending.pop()
+        for attr in sftp.listdir_attr(current):
+            path = f"{current}/{attr.filename}"
+            if is_dir(attr):
+                pending.append(path)
+            else:
+                files.append(path)
+    return files
@@ -0,0 +1,114 @@
+"""Local index of the files already uploaded to UPLOAD_DIR.
+
+The remote tree is listed once (or loaded from UPLOAD_INDEX_FILE on restart),
+then every lookup is a set membership test. Uploads are appended to the index
+and to its file as they happen.
+"""
+import logging
+import os
+import threading
+from typing import Iterable, Optional, Set
+
+import config
+from pipeline.transport import get_pool, walk_files
+
+
+def _keys(basename: str) -> Set[str]:
+    """Names under which a remote file can be found.
+
+    check_if_exists() used to match any file whose name *contains* the clip
+    name. To keep lookups O(1), names are split on "_" and every contiguous
+    run of tokens is indexed (with the extension when the run ends the name),
+    e.g. "cropped_3_clip_07.mp4" is found by "clip_07.mp4" or "3_clip_07".
+    """
+    stem, ext = os.path.splitext(basename)
+    tokens = stem.split("_")
+    keys = {basename}
+    for i in range(len(tokens)):
+        for j in range(i + 1, len(tokens) + 1):
+            key = "_".join(tokens[i:j])
+            keys.add(key)
+            if j == len(tokens):
+                keys.add(key + ext)
+    return keys
+
+
+class UploadIndex:
+    """In-memory set of uploaded files, persisted as one remote path per line.
+
+    Args:
+        index_file (str): Local file backing the index.
+        root (str): Remote folder that is indexed.
+    """
+
+    def __init__(self, index_file: str = config.UPLOAD_INDEX_FILE,
+                 root: str = config.UPLOAD_DIR):
+        self.index_file = str(index_file)
+        self.root = root
+        self._paths: Set[str] = set()
+        self._keys: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def _add_in_memory(self, remote_paths: Iterable[str]) -> None:
+        for remote_path in remote_paths:
+            if remote_path in self._paths:
+                continue
+            self._paths.add(remote_path)
+            self._keys.update(_keys(os.path.basename(remote_path)))
+
+    def load(self, refresh: bool = False) -> "UploadIndex":
+        """Loads the index from disk, or rebuilds it from one remote listing.
+
+        Args:
+            refresh (bool): Ignore the local file and list UPLOAD_DIR again.
+        """
+        if not refresh and os.path.exists(self.index_file):
+            with open(self.index_file) as f:
+                paths = [line.rstrip("\n") for line in f if line.strip()]
+            with self._lock:
+                self._add_in_memory(paths)
+            logging.info("Upload index loaded from %s (%d files)", self.index_file, len(paths))
+            return self
+
+        paths = get_pool().run(walk_files, self.root)
+        tmp_file = f"{self.index_file}.tmp"
+        with open(tmp_file, "w") as f:
+            for path in paths:
+                f.write(path + "\n")
+        os.replace(tmp_file, self.index_file)
+
+        with self._lock:
+            self._paths.clear()
+            self._keys.clear()
+            self._add_in_memory(paths)
+        logging.info("Upload index rebuilt from %s (%d files)", self.root, len(paths))
+        return self
+
+    def add(self, remote_path: str) -> None:
+        """Records a newly uploaded file (in memory and on disk)."""
+        with self._lock:
+            if remote_path in self._paths:
+                return
+            self._add_in_memory([remote_path])
+            with open(self.index_file, "a") as f:
+                f.write(remote_path + "\n")
+
+    def contains(self, name: str) -> bool:
+        """True if an uploaded file name contains `name` (see _keys)."""
+        return name in self._keys
+
+
+_index: Optional[UploadIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_upload_index() -> UploadIndex:
+    """Returns the shared index, loading it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = UploadIndex().load(refresh=config.UPLOAD_INDEX_REFRESH)
+        return _index
@@ -0,0 +1,202 @@
+"""Local cache of downloaded source videos, with LRU eviction and prefetching.
+
+Downloaded videos are kept in VIDEO_CACHE_DIR up to VIDEO_CACHE_BYTES instead
+of being deleted after clipping, so a video picked again is not downloaded
+twice. A cached file is only reused if its size and mtime still match the
+remote listing (catalog). A background prefetcher downloads the next videos
+while the current ones are being processed.
+"""
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import config
+from pipeline.cloud import download_sftp_video
+
+Key = Tuple[str, str]  # (alias, filename)
+
+
+@dataclass
+class _Entry:
+    path: str
+    size: int
+    pins: int = 0
+
+
+class SourceVideoCache:
+    """Disk-budgeted LRU cache of source videos.
+
+    Args:
+        cache_dir (str): Folder holding the cached videos.
+        budget_bytes (int): Max total size of the cached videos.
+    """
+
+    def __init__(self, cache_dir: str = config.VIDEO_CACHE_DIR,
+                 budget_bytes: int = config.VIDEO_CACHE_BYTES):
+        self.cache_dir = str(cache_dir)
+        self.budget_bytes = budget_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[Key, _Entry]" = OrderedDict()
+        self._downloading: Dict[Key, threading.Event] = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._scan()
+
+    def _path(self, key: Key) -> str:
+        alias, filename = key
+        return os.path.join(self.cache_dir, alias, filename)
+
+    def _scan(self) -> None:
+        # Reprend les fichiers d'une exécution précédente (ordre LRU : mtime d'accès)
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(".part"):
+                    os.remove(path)
+                    continue
+                rel = os.path.relpath(path, self.cache_dir).replace(os.sep, "/")
+                alias, _, filename = rel.partition("/")
+                found.append((os.path.getatime(path), (alias, filename), path))
+        for _, key, path in sorted(found):
+            self._entries[key] = _Entry(path, os.path.getsize(path))
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def _is_valid(self, entry: _Entry, size: Optional[int], mtime: Optional[int]) -> bool:
+        if not os.path.exists(entry.path):
+            return False
+        if size is not None and os.path.getsize(entry.path) != size:
+            return False
+        if mtime is not None and int(os.path.getmtime(entry.path)) != int(mtime):
+            return False
+        return True
+
+    def _evict(self, needed: int) -> None:
+        """Drops least recently used, unpinned videos until `needed` bytes fit."""
+        used = self.used_bytes
+        for key in list(self._entries):
+            if used + needed <= self.budget_bytes:
+                break
+            entry = self._entries[key]
+            if entry.pins:
+                continue
+            del self._entries[key]
+            used -= entry.size
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+            logging.info("Evicted %s from video cache", key[1])
+
+    def get(self, video: Dict, pin: bool = True) -> str:
+        """Returns the local path of a source video, downloading it if needed.
+
+        Args:
+            video (Dict): Catalog row with 'filename', 'alias' and optionally
+                'size' and 'mtime' (used for the integrity check).
+            pin (bool): Keep the file from eviction until release() is called.
+
+        Returns:
+            str: Local path of the video.
+        """
+        key = (video["alias"], video["filename"])
+        size, mtime = video.get("size"), video.get("mtime")
+
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and self._is_valid(entry, size, mtime):
+                    self._entries.move_to_end(key)
+                    entry.pins += pin
+                    self.hits += 1
+                    return entry.path
+                event = self._downloading.get(key)
+                if event is None:
+                    # Ce thread télécharge ; les autres attendent la fin
+                    if entry is not None:
+                        del self._entries[key]
+                    event = self._downloading[key] = threading.Event()
+                    self.misses += 1
+                    self._evict(size or 0)
+                    break
+            event.wait()
+
+        path = self._path(key)
+        tmp_path = f"{path}.part"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            download_sftp_video(video["filename"], video["alias"], local_path=tmp_path)
+            actual = os.path.getsize(tmp_path)
+            if size is not None and actual != size:
+                raise IOError(f"Size mismatch for {video['filename']}: {actual} != {size}")
+            if mtime is not None:
+                os.utime(tmp_path, (mtime, mtime))
+            os.replace(tmp_path, path)
+
+            with self._lock:
+                self._entries[key] = _Entry(path, actual, pins=int(pin))
+                self._evict(0)
+            return path
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            with self._lock:
+                self._downloading.pop(key).set()
+
+    def release(self, video: Dict) -> None:
+        """Unpins a video returned by get(); it may now be evicted."""
+        with self._lock:
+            entry = self._entries.get((video["alias"], video["filename"]))
+            if entry is not None and entry.pins:
+                entry.pins -= 1
+            self._evict(0)
+
+
+class Prefetcher:
+    """Background downloads of the videos the pipeline will need next.
+
+    The caller keeps it `depth` videos ahead by scheduling video i + depth
+    when it starts consuming video i (see main.py).
+
+    Args:
+        cache (SourceVideoCache): Cache to fill.
+    """
+
+    def __init__(self, cache: SourceVideoCache):
+        self.cache = cache
+        self._queue: "queue.Queue[Optional[Dict]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            video = self._queue.get()
+            if video is None:
+                break
+            try:
+                self.cache.get(video, pin=False)
+            except Exception:
+                logging.exception("Prefetch failed for %s", video["filename"])
+
+    def schedule(self, video: Dict) -> None:
+        """Queues a video (catalog row) for background download."""
+        self._queue.put(video)
+
+    def close(self) -> None:
+        # Vide la file pour ne pas attendre des téléchargements devenus inutiles
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+        self._queue.put(None)
+        self._thread.join(timeout=5)
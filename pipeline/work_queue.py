@@ -0,0 +1,353 @@
+"""Shared work queue handing out source videos to several nodes with leases.
+
+Every node running main.py claims videos from the same queue instead of
+sampling the catalog on its own. A claim is a lease: it expires after
+WORK_QUEUE_LEASE seconds unless the node keeps renewing it (``LeaseKeeper``
+heartbeats), so the videos of a node that crashed go back to the queue and
+are picked up by the others. Finished videos are never handed out again.
+
+The queue is a SQLite file (``LeaseQueue``). Nodes either open it directly
+(single machine, or a filesystem with working locks) or talk to a coordinator
+serving it over HTTP (``HTTPLeaseQueue``):
+
+    python -m pipeline.work_queue --db work_queue.sqlite --port 8765   # coordinator
+    WORK_QUEUE = "http://coordinator:8765"                              # config.py of each node
+
+The coordinator has no authentication and listens on WORK_QUEUE_BIND
+(127.0.0.1): reach it through an SSH tunnel, or pass ``--host`` with a public
+address only on a trusted network.
+"""
+import argparse
+import json
+import logging
+import sqlite3
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import config
+
+Key = Tuple[str, str]  # (alias, filename)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS work (
+    alias TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    rank INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    owner TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL,
+    PRIMARY KEY (alias, filename)
+);
+CREATE INDEX IF NOT EXISTS idx_work_state ON work (state, rank);
+"""
+
+
+class LeaseQueue:
+    """SQLite-backed queue of source videos with time-limited claims.
+
+    Args:
+        db_path (str): SQLite file shared by the nodes (or by the coordinator).
+        lease_seconds (float): Lease duration granted by claim() and heartbeat().
+        max_attempts (int): Failed claims after which a video is left out.
+    """
+
+    def __init__(self, db_path: str,
+                 lease_seconds: float = config.WORK_QUEUE_LEASE,
+                 max_attempts: int = config.JOURNAL_MAX_ATTEMPTS):
+        self.db_path = str(db_path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        # isolation_level=None : transactions explicites (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            # Verrou d'écriture pris dès le début : deux nœuds ne réservent pas la même vidéo
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def populate(self, videos: Iterable[Dict]) -> int:
+        """Adds videos (catalog rows, in sampling order); known ones are kept as they are.
+
+        Returns:
+            int: Number of videos added.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            start = conn.execute("SELECT COALESCE(MAX(rank) + 1, 0) FROM work").fetchone()[0]
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO work (alias, filename, size, mtime, rank, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(v["alias"], v["filename"], v.get("size"), v.get("mtime"), start + i, now)
+                 for i, v in enumerate(videos)],
+            )
+            return conn.total_changes - before
+
+    def _requeue_expired(self, conn, now: float) -> None:
+        # Un bail expiré compte comme un échec : une vidéo qui fait tomber son nœud
+        # (OOM, segfault...) est écartée après max_attempts au lieu de tourner sans fin
+        expired = conn.execute(
+            "UPDATE work SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "owner = NULL, lease_until = NULL, updated = ? WHERE state = ? AND lease_until < ?",
+            (self.max_attempts, FAILED, PENDING, now, LEASED, now),
+        ).rowcount
+        if expired:
+            logging.warning("Requeued %d expired leases", expired)
+
+    def claim(self, node: str, n: int = 1) -> List[Dict]:
+        """Leases up to n pending videos to node, in rank order."""
+        now = time.time()
+        with self._transaction() as conn:
+            self._requeue_expired(conn, now)
+            rows = conn.execute(
+                "SELECT alias, filename, size, mtime FROM work WHERE state = ? ORDER BY rank LIMIT ?",
+                (PENDING, n),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE work SET state = ?, owner = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated = ? WHERE alias = ? AND filename = ?",
+                [(LEASED, node, now + self.lease_seconds, now, alias, filename)
+                 for alias, filename, _, _ in rows],
+            )
+        return [dict(alias=alias, filename=filename, size=size, mtime=mtime)
+                for alias, filename, size, mtime in rows]
+
+    def heartbeat(self, node: str, keys: Iterable[Key]) -> List[Key]:
+        """Renews node's leases on keys.
+
+        Returns:
+            List[Key]: Keys whose lease was lost (expired and taken over).
+        """
+        now = time.time()
+        lost = []
+        with self._transaction() as conn:
+            for alias, filename in keys:
+                renewed = conn.execute(
+                    "UPDATE work SET lease_until = ?, updated = ? "
+                    "WHERE alias = ? AND filename = ? AND state = ? AND owner = ?",
+                    (now + self.lease_seconds, now, alias, filename, LEASED, node),
+                ).rowcount
+                if not renewed:
+                    lost.append((alias, filename))
+        return lost
+
+    def complete(self, node: str, alias: str, filename: str, ok: bool = True) -> None:
+        """Ends node's lease: done, or back to pending (failed after max_attempts)."""
+        now = time.time()
+        with self._transaction() as conn:
+            if ok:
+                state_sql = "?"
+                params = (DONE,)
+            else:
+                state_sql = "CASE WHEN attempts >= ? THEN ? ELSE ? END"
+                params = (self.max_attempts, FAILED, PENDING)
+            conn.execute(
+                f"UPDATE work SET state = {state_sql}, owner = NULL, lease_until = NULL, updated = ? "
+                "WHERE alias = ? AND filename = ? AND owner = ?",
+                params + (now, alias, filename, node),
+            )
+
+    def release(self, node: str) -> int:
+        """Gives back every lease of node (clean shutdown)."""
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE work SET state = ?, owner = NULL, lease_until = NULL, "
+                "attempts = MAX(attempts - 1, 0), updated = ? WHERE state = ? AND owner = ?",
+                (PENDING, now, LEASED, node),
+            ).rowcount
+
+    def stats(self) -> Dict[str, int]:
+        """Number of videos per state."""
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM work GROUP BY state"))
+
+
+class HTTPLeaseQueue:
+    """Client of a LeaseQueue served by ``python -m pipeline.work_queue``.
+
+    Args:
+        url (str): Base URL of the coordinator, e.g. "http://host:8765".
+        timeout (float): Seconds per request.
+    """
+
+    def __init__(self, url: str, timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def _call(self, method: str, **payload):
+        request = urllib.request.Request(
+            f"{self.url}/{method}", data=json.dumps(payload).encode(),
+            headers={"Content-Type": "application/json"}, method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def populate(self, videos: Iterable[Dict]) -> int:
+        return self._call("populate", videos=list(videos))
+
+    def claim(self, node: str, n: int = 1) -> List[Dict]:
+        return self._call("claim", node=node, n=n)
+
+    def heartbeat(self, node: str, keys: Iterable[Key]) -> List[Key]:
+        return [tuple(key) for key in self._call("heartbeat", node=node, keys=[list(k) for k in keys])]
+
+    def complete(self, node: str, alias: str, filename: str, ok: bool = True) -> None:
+        self._call("complete", node=node, alias=alias, filename=filename, ok=ok)
+
+    def release(self, node: str) -> int:
+        return self._call("release", node=node)
+
+    def stats(self) -> Dict[str, int]:
+        return self._call("stats")
+
+    def close(self) -> None:
+        pass
+
+
+def open_work_queue(spec: str):
+    """LeaseQueue for a SQLite path, HTTPLeaseQueue for an http(s):// URL."""
+    spec = str(spec)
+    if spec.startswith(("http://", "https://")):
+        return HTTPLeaseQueue(spec)
+    return LeaseQueue(spec)
+
+
+class LeaseKeeper:
+    """Claims videos for this node and renews their leases in the background.
+
+    Args:
+        queue (LeaseQueue | HTTPLeaseQueue): Shared queue.
+        node (str): Name of this node (NODE_NAME).
+        interval (float): Seconds between two heartbeats.
+    """
+
+    def __init__(self, queue, node: str = config.NODE_NAME,
+                 interval: float = config.WORK_QUEUE_HEARTBEAT):
+        self.queue = queue
+        self.node = node
+        self.interval = interval
+        self._held: Set[Key] = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def claim(self, n: int = 1) -> List[Dict]:
+        videos = self.queue.claim(self.node, n)
+        with self._lock:
+            self._held.update((v["alias"], v["filename"]) for v in videos)
+        return videos
+
+    def complete(self, alias: str, filename: str, ok: bool = True) -> None:
+        with self._lock:
+            self._held.discard((alias, filename))
+        self.queue.complete(self.node, alias, filename, ok)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                held = list(self._held)
+            if not held:
+                continue
+            try:
+                lost = self.queue.heartbeat(self.node, held)
+            except Exception:
+                logging.exception("Lease heartbeat failed")
+                continue
+            for alias, filename in lost:
+                # Bail expiré et repris par un autre nœud : le travail fait ici sera en double
+                logging.warning("Lost lease on %s/%s", alias, filename)
+                with self._lock:
+                    self._held.discard((alias, filename))
+
+    def close(self) -> None:
+        """Stops the heartbeats and gives back the leases still held."""
+        self._stop.set()
+        self._thread.join(timeout=5)
+        released = self.queue.release(self.node)
+        if released:
+            logging.info("Released %d leases", released)
+
+
+def _serve(queue: LeaseQueue, port: int, host: str = config.WORK_QUEUE_BIND) -> None:
+    handlers = {
+        "populate": lambda p: queue.populate(p["videos"]),
+        "claim": lambda p: queue.claim(p["node"], p.get("n", 1)),
+        "heartbeat": lambda p: queue.heartbeat(p["node"], [tuple(k) for k in p["keys"]]),
+        "complete": lambda p: queue.complete(p["node"], p["alias"], p["filename"], p.get("ok", True)),
+        "release": lambda p: queue.release(p["node"]),
+        "stats": lambda p: queue.stats(),
+    }
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            handler = handlers.get(self.path.strip("/"))
+            if handler is None:
+                self.send_error(404)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            try:
+                body = json.dumps(handler(payload)).encode()
+            except Exception as e:
+                logging.exception("Work queue request %s failed", self.path)
+                self.send_error(500, str(e))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    logging.info("Work queue %s served on %s:%d", queue.db_path, host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    parser = argparse.ArgumentParser(description="Serve the shared work queue over HTTP")
+    parser.add_argument("--db", default=str(config.PROJECT_ROOT / "work_queue.sqlite"))
+    parser.add_argument("--host", default=config.WORK_QUEUE_BIND,
+                        help="bind address (no authentication: expose on trusted networks only)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--lease", type=float, default=config.WORK_QUEUE_LEASE)
+    args = parser.parse_args()
+    _serve(LeaseQueue(args.db, lease_seconds=args.lease), args.port, args.host)
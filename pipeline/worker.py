@@ -0,0 +1,332 @@
+"""Resident SAM worker processes.
+
+Each worker loads a ``SAMSession`` once and then serves clip jobs sent over a
+pipe, so the interpreter start-up, the torch/sam3 imports and the model load
+are paid once per worker instead of once per clip. A worker that dies while
+processing a clip is respawned and only that clip is reported as failed.
+"""
+import cProfile
+import importlib
+import logging
+import multiprocessing as mp
+import os
+import queue
+import signal
+import time
+import traceback
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Union
+
+import config
+from pipeline.frames import ClipFrames, SharedClip
+from pipeline.metrics import metrics
+
+# Intervalle de vérification de l'état du worker pendant l'attente d'un résultat
+POLL_INTERVAL = 1.0
+
+
+class WorkerCrashed(RuntimeError):
+    """Raised when a worker process died (or timed out) while handling a job."""
+
+
+class ClipProcessingError(RuntimeError):
+    """Raised when run_extraction failed inside a worker; carries the traceback."""
+
+
+def load_session_factory(path: str):
+    """Resolves a "package.module:Class" path (SAM_SESSION_FACTORY)."""
+    module_name, _, attr = path.partition(":")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+def _worker_main(conn, out_folder: str, prompt: str,
+                 session_factory: str = config.SAM_SESSION_FACTORY) -> None:
+    """Entry point of a worker process: load SAM once, then serve jobs.
+
+    Protocol: the parent sends ("clip", path), ("batch", [path or SharedClip])
+    or None to stop; the worker answers ("ok", result, events) or ("error",
+    traceback, events), where result is the list of crop paths (clip) or the
+    run_batch_extraction dict (batch) and events the metrics spans recorded
+    during the job. ("ready", None, events) is sent once, after the model has
+    been loaded.
+
+    With SAM_PROFILE_DIR set, every job runs under cProfile and its stats are
+    dumped to SAM_PROFILE_DIR/<pid>_<job>.prof (pstats / snakeviz format).
+    """
+    # Ctrl-C est géré par le processus parent, qui arrête les workers proprement
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(processName)s | %(message)s",
+    )
+    # Imports lourds uniquement dans le worker
+    from pipeline.extractor import run_batch_extraction, run_extraction
+    from pipeline.inference import optimize_session, release_memory
+    session_cls = load_session_factory(session_factory)
+
+    # Les spans du worker repartent vers le parent avec chaque résultat
+    metrics.configure(forward=True)
+    with metrics.span("sam.load"):
+        sam = optimize_session(session_cls())
+    logging.info("SAM worker ready (pid %d)", os.getpid())
+    conn.send(("ready", None, metrics.drain()))
+
+    profile_dir = config.SAM_PROFILE_DIR
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    jobs = 0
+
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            break
+        if job is None:
+            break
+
+        kind, payload = job
+        attached = []
+        jobs += 1
+        profiler = cProfile.Profile() if profile_dir else None
+        if profiler is not None:
+            profiler.enable()
+        try:
+            if kind == "batch":
+                sources = []
+                for item in payload:
+                    if isinstance(item, SharedClip):
+                        # Frames lues directement dans la mémoire partagée, sans copie
+                        clip, shm = item.attach()
+                        attached.append(shm)
+                        sources.append(clip)
+                    else:
+                        sources.append(item)
+                result = run_batch_extraction(sam, sources, out_folder, prompt)
+                del sources
+            else:
+                result = run_extraction(sam, payload, out_folder, prompt)
+            status = ("ok", result)
+        except Exception:
+            status = ("error", traceback.format_exc())
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(os.path.join(profile_dir, f"{os.getpid()}_{jobs:05d}.prof"))
+            for shm in attached:
+                shm.close()
+            release_memory(sam.device)
+        conn.send(status + (metrics.drain(),))
+
+    device = sam.device
+    del sam
+    release_memory(device)
+
+
+@dataclass
+class _Worker:
+    slot: int
+    process: mp.Process
+    conn: object
+    ready: bool = False  # "ready" reçu : modèle chargé
+
+
+class SAMWorkerPool:
+    """Pool of long-lived processes each holding a loaded SAMSession.
+
+    ``process(clip_path)`` and ``process_batch(clip_paths)`` are thread-safe:
+    they block until a worker is idle, hand it the job and return the crops.
+
+    Args:
+        num_workers (int): Number of resident worker processes.
+        out_folder (str): Folder where the workers write cropped videos.
+        prompt (str): Text prompt used for detection.
+        job_timeout (float): Max seconds per clip once the model is loaded
+            (None or 0 disables the timeout).
+        session_factory (str): "module:Class" of the SAM session loaded by
+            each worker (e.g. a stub session for benchmarks).
+    """
+
+    def __init__(self,
+                 num_workers: int = config.NUM_SAM_WORKERS,
+                 out_folder: str = config.CROP_FOLDER,
+                 prompt: str = config.PROMPT_CLASS,
+                 job_timeout: Optional[float] = config.SAM_JOB_TIMEOUT,
+                 session_factory: str = config.SAM_SESSION_FACTORY):
+        # spawn : CUDA ne supporte pas fork après initialisation
+        self._ctx = mp.get_context("spawn")
+        self._out_folder = str(out_folder)
+        self._prompt = prompt
+        self._job_timeout = job_timeout
+        self._session_factory = session_factory
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers: List[_Worker] = []
+
+        for slot in range(num_workers):
+            worker = self._spawn(slot)
+            self._workers.append(worker)
+            self._idle.put(worker)
+
+    def _spawn(self, slot: int) -> _Worker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, self._out_folder, self._prompt, self._session_factory),
+            name=f"sam-worker-{slot}",
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+        logging.info("Started SAM worker %d (pid %d)", slot, proc.pid)
+        return _Worker(slot, proc, parent_conn)
+
+    def _respawn(self, worker: _Worker) -> _Worker:
+        if worker.process.is_alive():
+            worker.process.kill()
+        worker.process.join(timeout=5)
+        worker.conn.close()
+        logging.warning("Respawning SAM worker %d (exit code %s)",
+                        worker.slot, worker.process.exitcode)
+        new_worker = self._spawn(worker.slot)
+        self._workers[worker.slot] = new_worker
+        return new_worker
+
+    def _wait_result(self, worker: _Worker, clip_path: str, timeout: Optional[float]):
+        # Chargement du modèle exclu : le délai ne démarre qu'une fois le worker prêt
+        deadline = time.monotonic() + timeout if timeout and worker.ready else None
+        while True:
+            if worker.conn.poll(POLL_INTERVAL):
+                try:
+                    status, payload, events = worker.conn.recv()
+                except (EOFError, OSError) as e:
+                    raise WorkerCrashed(f"Worker {worker.slot} died on {clip_path}") from e
+                metrics.merge(events)
+                if status == "ready":
+                    # Le modèle vient d'être chargé : le timeout démarre maintenant
+                    worker.ready = True
+                    if timeout:
+                        deadline = time.monotonic() + timeout
+                    continue
+                return status, payload
+
+            if not worker.process.is_alive():
+                raise WorkerCrashed(
+                    f"Worker {worker.slot} died on {clip_path} "
+                    f"(exit code {worker.process.exitcode})"
+                )
+
+            if deadline is not None and time.monotonic() > deadline:
+                raise WorkerCrashed(
+                    f"Worker {worker.slot} timed out after {timeout}s on {clip_path}"
+                )
+
+    def _submit(self, job, label: str, timeout: Optional[float]):
+        worker = self._idle.get()
+        try:
+            if not worker.process.is_alive():
+                worker = self._respawn(worker)
+            try:
+                worker.conn.send(job)
+                return self._wait_result(worker, label, timeout)
+            except WorkerCrashed:
+                worker = self._respawn(worker)
+                raise
+            except (BrokenPipeError, OSError) as e:
+                # Pipe coupé pendant l'envoi : même traitement qu'un worker mort
+                worker = self._respawn(worker)
+                raise WorkerCrashed(f"Worker {worker.slot} died on {label}") from e
+        finally:
+            self._idle.put(worker)
+
+    def process(self, clip_path: str) -> List[str]:
+        """Runs SAM extraction for one clip on the next idle worker.
+
+        Args:
+            clip_path (str): Path to the clip to process.
+
+        Returns:
+            List[str]: Paths of the cropped videos.
+
+        Raises:
+            ClipProcessingError: run_extraction raised inside the worker.
+            WorkerCrashed: the worker died or timed out; it has been respawned.
+        """
+        status, payload = self._submit(("clip", str(clip_path)), clip_path, self._job_timeout)
+        if status == "error":
+            raise ClipProcessingError(f"Extraction failed for {clip_path}:\n{payload}")
+        return payload
+
+    def process_batch(self, sources: List[Union[str, ClipFrames]]) -> Dict[str, Dict]:
+        """Runs SAM extraction for several clips in a single worker round trip.
+
+        In-memory clips are copied once into shared memory and mapped by the
+        worker. If the worker crashes mid-batch, the clips are retried one by
+        one so that only the faulty clip is lost.
+
+        Args:
+            sources (List[str | ClipFrames]): Clip paths or in-memory clips,
+                e.g. all clips of one video.
+
+        Returns:
+            Dict[str, Dict]: For each clip (path, or ClipFrames.name),
+                {"paths": [...], "error": None or str}.
+        """
+        blocks = []
+        payload = []
+        try:
+            for source in sources:
+                if isinstance(source, ClipFrames):
+                    shared, shm = SharedClip.create(source)
+                    blocks.append(shm)
+                    payload.append(shared)
+                else:
+                    payload.append(str(source))
+
+            label = f"batch of {len(payload)} clips"
+            timeout = self._job_timeout * len(payload) if self._job_timeout else None
+            try:
+                status, result = self._submit(("batch", payload), label, timeout)
+            except WorkerCrashed as e:
+                logging.warning("%s; retrying clips one by one", e)
+                return self._process_one_by_one(payload)
+        finally:
+            for shm in blocks:
+                shm.close()
+                shm.unlink()
+
+        if status == "error":
+            raise ClipProcessingError(f"Batch extraction failed:\n{result}")
+        return result
+
+    def _process_one_by_one(self, payload: List) -> Dict[str, Dict]:
+        results = {}
+        for item in payload:
+            name = item.name if isinstance(item, SharedClip) else item
+            try:
+                status, result = self._submit(("batch", [item]), name, self._job_timeout)
+                if status == "error":
+                    raise ClipProcessingError(f"Extraction failed for {name}:\n{result}")
+                results[name] = result[name]
+            except (ClipProcessingError, WorkerCrashed) as e:
+                results[name] = {"paths": [], "error": str(e)}
+        return results
+
+    def close(self) -> None:
+        """Stops all workers, killing those that do not exit in time."""
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=30)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+            worker.conn.close()
+        self._workers = []
+
+    def __enter__(self) -> "SAMWorkerPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -1,9 +1,9 @@
 import sys
+import json
 import logging
-import torch
-import gc
 import config
 from pipeline.extractor import run_extraction
+from pipeline.inference import optimize_session, release_memory
 from sam.sam_session import SAMSession
 
 # Logger vers stderr
@@ -16,31 +16,31 @@ def main() -> None:
     """Main entry point for SAM-based video clip processing.
     
     Processes a video file provided as command-line argument using SAM
-    for object detection and segmentation. Cleans up GPU memory after processing.
+    for object detection and segmentation. Cleans up device memory after processing.
     
     Args:
         None: Video path is read from sys.argv[1].
     
     Returns:
-        None: JSON output is printed to stdout.
+        None: JSON list of cropped video paths is printed to stdout.
     """
     video_path = sys.argv[1]
     logging.info("Starting SAM worker for %s", video_path)
 
-    sam = SAMSession()
+    sam = optimize_session(SAMSession())
     try:
-        # run_extraction imprime le JSON final
-        run_extraction(
+        out_all_paths = run_extraction(
             sam,
             video_path,
             config.CROP_FOLDER,
             config.PROMPT_CLASS,
         )
+        # Seul print sur stdout, pour le pipeline
+        print(json.dumps(out_all_paths))
     finally:
+        device = sam.device
         del sam
-        torch.cuda.synchronize()
-        torch.cuda.empty_cache()
-        gc.collect()
+        release_memory(device)
 
     logging.info("Finished %s", video_path)
 
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Racine du dépôt (config.py, pipeline/) et application d'annotation importables
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "videos_annotation"))
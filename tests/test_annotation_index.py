@@ -0,0 +1,53 @@
+import csv
+
+import pytest
+
+from annotation_index import ANNOTATED, PENDING, AnnotationIndex
+
+
+@pytest.fixture
+def folders(tmp_path):
+    videos = tmp_path / "videos"
+    videos.mkdir()
+    for name in ("a.mp4", "b.mp4", "c.mp4"):
+        (videos / name).write_bytes(b"")
+    return videos, tmp_path / "annotations.csv"
+
+
+def _index(tmp_path, folders):
+    videos, csv_file = folders
+    return AnnotationIndex(str(tmp_path / "index.sqlite"), str(videos), str(csv_file))
+
+
+def _csv_rows(csv_file):
+    with open(csv_file, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_annotate_once_even_on_double_submit(tmp_path, folders):
+    index = _index(tmp_path, folders)
+    assert index.annotate("a.mp4", "lying", "alice")
+    # Deuxième envoi (double clic, deux onglets) : refusé, rien d'écrit
+    assert not index.annotate("a.mp4", "standing", "bob")
+    assert not index.annotate("unknown.mp4", "lying", "alice")
+    assert _csv_rows(folders[1]) == [["a.mp4", "lying"]]
+    assert index.stats() == {ANNOTATED: 1, PENDING: 2}
+
+
+def test_annotators_get_different_videos_until_annotated(tmp_path, folders):
+    index = _index(tmp_path, folders)
+    first = index.next_video("alice")
+    assert index.next_video("alice") == first  # sa propre réservation d'abord
+    second = index.next_video("bob")
+    assert second != first
+
+    index.annotate(first, "lying", "alice")
+    assert index.next_video("alice") not in (first, second)
+
+
+def test_previous_csv_is_imported(tmp_path, folders):
+    videos, csv_file = folders
+    csv_file.write_text("b.mp4,walking\n")
+    index = _index(tmp_path, folders)
+    assert index.stats() == {ANNOTATED: 1, PENDING: 2}
+    assert not index.annotate("b.mp4", "lying")
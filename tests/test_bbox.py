@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import config
+from pipeline.bbox import bboxes_from_outputs, frame_bboxes, masks_to_bboxes
+
+
+def reference_bbox(mask: np.ndarray, margin: float):
+    """Per-mask box: inclusive extent, margin of round(largest side * margin), clipped."""
+    ys, xs = np.where(mask)
+    if not len(ys):
+        return None
+    x1, y1, x2, y2 = xs.min(), ys.min(), xs.max(), ys.max()
+    side = np.float32(max(x2 - x1, y2 - y1) + 1)
+    pad = int(np.round(side * np.float32(margin)))
+    height, width = mask.shape
+    return (max(x1 - pad, 0), max(y1 - pad, 0), min(x2 + pad, width - 1), min(y2 + pad, height - 1))
+
+
+def random_masks(n: int, height: int = 48, width: int = 64, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    masks = np.zeros((n, height, width), dtype=bool)
+    for mask in masks[1:]:  # le premier reste vide (objet absent)
+        for _ in range(rng.integers(1, 4)):  # formes irrégulières : plusieurs rectangles
+            y, x = rng.integers(0, height - 2), rng.integers(0, width - 2)
+            mask[y:y + rng.integers(1, height - y), x:x + rng.integers(1, width - x)] = True
+    return masks
+
+
+@pytest.mark.parametrize("margin", [0.0, 0.1, 0.25])
+def test_masks_to_bboxes_matches_per_mask_reference(margin):
+    masks = random_masks(40)
+    boxes, present = masks_to_bboxes(masks, margin)
+    for mask, box, found in zip(masks, boxes.tolist(), present.tolist()):
+        expected = reference_bbox(mask, margin)
+        assert found == (expected is not None)
+        if found:
+            assert tuple(box) == expected
+
+
+def test_masks_to_bboxes_matches_mask_to_bbox():
+    cropper = pytest.importorskip("video.cropper")
+    masks = random_masks(20, seed=1)
+    boxes, present = masks_to_bboxes(masks)
+    for mask, box in zip(masks[present], boxes[present].tolist()):
+        assert tuple(box) == tuple(map(int, cropper.mask_to_bbox(mask)))
+
+
+def test_bboxes_from_outputs_and_frame_bboxes_agree():
+    masks = random_masks(12, seed=2).reshape(4, 3, 48, 64)
+    outputs = {f: {obj_id: masks[f, obj_id] for obj_id in range(3) if masks[f, obj_id].any()}
+               for f in range(4)}
+    by_obj = bboxes_from_outputs(outputs, [0, 1, 2])
+    for f in range(4):
+        per_frame = frame_bboxes({"out_obj_ids": np.arange(3), "out_binary_masks": masks[f]}, [0, 1, 2])
+        for obj_id in range(3):
+            assert by_obj[obj_id][f] == per_frame[obj_id]
+            assert per_frame[obj_id] == reference_bbox(masks[f, obj_id], config.SAFETY_MARGIN)
@@ -0,0 +1,81 @@
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from pipeline import crop_writer
+from pipeline.crop_writer import ENCODER_QUEUE_SIZE, CropStream
+from pipeline.frames import ClipFrames
+
+NUM_FRAMES = 12
+FULL = (0, 0, 63, 47)
+
+
+def clip() -> ClipFrames:
+    # Frame t : gris uniforme de plus en plus clair, pour retrouver l'ordre après encodage
+    frames = np.stack([np.full((48, 64, 3), 20 * (t + 1), dtype=np.uint8) for t in range(NUM_FRAMES)])
+    return ClipFrames("clip_00.mp4", frames, 25.0)
+
+
+def read_means(path: str) -> np.ndarray:
+    cap = cv2.VideoCapture(path)
+    means = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        means.append(frame.mean())
+    cap.release()
+    return np.array(means)
+
+
+def is_increasing(means: np.ndarray) -> bool:
+    # mp4v ne restitue pas les niveaux exacts, mais leur ordre
+    return bool(np.all(means > 5) and np.all(np.diff(means) > 5))
+
+
+def test_frames_written_in_order_despite_out_of_order_pushes(tmp_path):
+    stream = CropStream(clip(), str(tmp_path), [1, 2, 3], size=32, threads=2)
+    order = [1, 0, 3, 2, 2, 5, 4] + list(range(6, NUM_FRAMES - 2))  # doublon : frame 2
+    for idx in order:
+        stream.push(idx, {1: FULL, 2: FULL if idx < 3 else None})
+    paths = stream.close()
+
+    # Objet 3 jamais vu : pas de vidéo
+    assert [p.rsplit("/", 1)[-1] for p in paths] == ["cropped_1_clip_00.mp4", "cropped_2_clip_00.mp4"]
+    # Frames sans boîte (dont les deux dernières, jamais poussées) : crops noirs
+    first, second = read_means(paths[0]), read_means(paths[1])
+    assert len(first) == len(second) == NUM_FRAMES
+    assert is_increasing(first[:NUM_FRAMES - 2]) and np.all(first[NUM_FRAMES - 2:] < 5)
+    assert is_increasing(second[:3]) and np.all(second[3:] < 5)
+
+
+def test_failing_encoder_does_not_hang_close(tmp_path, monkeypatch):
+    def broken(frame, box, size):
+        raise RuntimeError("encoder failure")
+
+    monkeypatch.setattr(crop_writer, "crop_frame", broken)
+    stream = CropStream(clip(), str(tmp_path), [1], size=32, threads=1)
+    errors = []
+
+    def run():
+        try:
+            for idx in range(NUM_FRAMES):
+                stream.push(idx, {1: FULL})
+            stream.close()
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10 + ENCODER_QUEUE_SIZE)
+    assert not thread.is_alive(), "close() blocked on a dead encoder"
+    assert errors
+
+
+def test_abort_removes_partial_videos(tmp_path):
+    stream = CropStream(clip(), str(tmp_path), [1, 2], size=32)
+    stream.push(0, {1: FULL})
+    stream.abort()
+    assert list(tmp_path.iterdir()) == []
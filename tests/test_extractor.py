@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+pytest.importorskip("pycocotools")
+
+from benchmarks.stub_sam import StubSAMSession  # noqa: E402
+from pipeline import extractor  # noqa: E402
+from pipeline.frames import ClipFrames  # noqa: E402
+from pipeline.object_chunks import ObjectChunker  # noqa: E402
+
+
+class ChunkedStub(StubSAMSession):
+    """Stub tracker with 4 objects, a chunker, and an out-of-memory error above oom_above objects."""
+
+    def __init__(self, chunker=None, oom_above=None):
+        super().__init__()
+        self.chunker = chunker
+        self.oom_above = oom_above
+        self.propagated = []
+
+    def start(self, resource):
+        sid = super().start(resource)
+        session = self._sessions[sid]
+        # Mêmes objets, mêmes trajectoires à chaque session
+        session["blobs"] = [{
+            "center": np.array([10.0 + 12 * i, 20.0]),
+            "velocity": np.array([0.5 * (i - 1.5), 0.3]),
+            "axes": np.array([4.0, 6.0]),
+        } for i in range(4)]
+        return sid
+
+    def propagate_stream(self, sid):
+        session = self._sessions[sid]
+        tracked = len(session["blobs"]) - len(session["removed"])
+        self.propagated.append(tracked)
+        for t, output in super().propagate_stream(sid):
+            if self.oom_above is not None and tracked > self.oom_above and t == 2:
+                raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+            yield t, output
+
+
+@pytest.fixture
+def clip():
+    return ClipFrames("A_video_000000.mp4", np.full((6, 40, 64, 3), 128, np.uint8), 5.0)
+
+
+def reference(clip):
+    sam = ChunkedStub()
+    obj_ids, store = extractor._infer(sam, clip, "cow")
+    assert sam.propagated == [4]
+    return obj_ids, store
+
+
+def test_chunks_are_merged_like_a_single_pass(clip):
+    obj_ids, expected = reference(clip)
+    sam = ChunkedStub(ObjectChunker("cpu", budget_mb=200, per_object_mb=100, max_objects=None))
+    chunked_ids, merged = extractor._infer(sam, clip, "cow")
+    assert sam.propagated == [2, 2]
+    assert chunked_ids == obj_ids
+    assert merged.bboxes(obj_ids) == expected.bboxes(obj_ids)
+
+
+def test_out_of_memory_retries_with_smaller_chunks(clip):
+    obj_ids, expected = reference(clip)
+    chunker = ObjectChunker("cpu", budget_mb=400, per_object_mb=100, max_objects=None)
+    sam = ChunkedStub(chunker, oom_above=1)
+    chunked_ids, merged = extractor._infer(sam, clip, "cow")
+    # 4 objets : OOM, puis 2 : OOM, puis un par un
+    assert sam.propagated == [4, 2, 1, 1, 1, 1]
+    assert chunker.per_object_mb == 400
+    assert merged.bboxes(obj_ids) == expected.bboxes(obj_ids)
+
+
+def test_streaming_chunks_write_one_crop_per_object(clip, tmp_path):
+    sam = ChunkedStub(ObjectChunker("cpu", budget_mb=100, per_object_mb=100, max_objects=None), oom_above=2)
+    streams = extractor._infer_streaming(sam, clip, "cow", str(tmp_path))
+    paths = extractor._close_streams(clip, streams)
+    assert sam.propagated == [1, 1, 1, 1]
+    assert len(paths) == 4 and len(set(paths)) == 4
@@ -0,0 +1,55 @@
+import io
+import random
+
+import numpy as np
+import pytest
+
+av = pytest.importorskip("av")
+pytest.importorskip("decord")
+
+from pipeline.frames import sample_clips_seekable  # noqa: E402
+
+NUM_SOURCE_FRAMES = 400
+
+
+def brightness(i):
+    # Nuit sur la première moitié, puis luminosité croissante
+    return 20 if i < 200 else 60 + (i - 200) // 2
+
+
+@pytest.fixture(scope="module")
+def video():
+    # L'indice d'une frame se lit sur sa valeur moyenne
+    buf = io.BytesIO()
+    with av.open(buf, "w", format="mp4") as container:
+        stream = container.add_stream("libx264", rate=25)
+        stream.width, stream.height, stream.pix_fmt = 64, 48, "yuv420p"
+        stream.options = {"g": "25", "crf": "10"}
+        for i in range(NUM_SOURCE_FRAMES):
+            image = np.full((48, 64, 3), brightness(i), np.uint8)
+            for packet in stream.encode(av.VideoFrame.from_ndarray(image, format="rgb24")):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+    return buf.getvalue()
+
+
+def test_prescreened_windows_are_decoded_in_full(video):
+    clips = sample_clips_seekable(io.BytesIO(video), 8, 2, 3, "A",
+                                  rng=random.Random(0), candidates=6)
+    assert len(clips) == 3
+    for clip in clips:
+        start = int(clip.name.rsplit("_", 1)[1][:-4])
+        assert clip.frames.shape == (8, 48, 64, 3)
+        expected = [brightness(start + i * 2) for i in range(8)]
+        assert np.allclose(clip.frames.mean(axis=(1, 2, 3)), expected, atol=3)
+
+
+def test_dark_candidates_are_dropped(video):
+    # Toutes les fenêtres sont candidates : seules celles de jour sont gardées
+    slots = NUM_SOURCE_FRAMES // 15
+    clips = sample_clips_seekable(io.BytesIO(video), 8, 2, slots, "A",
+                                  rng=random.Random(1), candidates=slots + 1)
+    starts = [int(clip.name.rsplit("_", 1)[1][:-4]) for clip in clips]
+    assert 0 < len(starts) < slots
+    assert min(starts) >= 150
@@ -0,0 +1,33 @@
+from pipeline import journal as states
+from pipeline.journal import WorkJournal
+
+
+def test_resume_after_crash(tmp_path):
+    db = str(tmp_path / "journal.sqlite")
+    journal = WorkJournal(db)
+    journal.video("A", "done.mp4", states.VIDEO_STARTED)
+    journal.video("A", "done.mp4", states.VIDEO_DONE)
+    journal.video("A", "cut.mp4", states.VIDEO_STARTED)
+    journal.video("A", "cut.mp4", states.VIDEO_CLIPPED)
+    journal.clip("A", "cut.mp4", "clip_0.mp4", states.CLIP_UPLOADED)
+    journal.clip("A", "cut.mp4", "clip_1.mp4", states.CLIP_SKIPPED)
+    journal.clip("A", "cut.mp4", "clip_2.mp4", states.CLIP_PROCESSED)
+    journal.close()
+
+    # Nouveau processus : même fichier
+    journal = WorkJournal(db)
+    assert journal.finished_videos() == {("A", "done.mp4")}
+    assert journal.interrupted_videos() == {("A", "cut.mp4")}
+    assert journal.done_clips("A", "cut.mp4") == {"clip_0.mp4", "clip_1.mp4"}
+    journal.close()
+
+
+def test_failed_video_is_retried_until_max_attempts(tmp_path):
+    journal = WorkJournal(str(tmp_path / "journal.sqlite"))
+    for attempt in range(1, 3):
+        journal.video("A", "bad.mp4", states.VIDEO_STARTED)
+        journal.video("A", "bad.mp4", states.VIDEO_FAILED, "boom")
+        finished = journal.finished_videos(max_attempts=2)
+        assert (("A", "bad.mp4") in finished) == (attempt == 2)
+    assert journal.summary() == {states.VIDEO_FAILED: 1}
+    journal.close()
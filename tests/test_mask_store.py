@@ -0,0 +1,50 @@
+import numpy as np
+
+from pipeline.bbox import bboxes_from_outputs, masks_to_bboxes
+from pipeline.mask_store import MaskStore
+
+from test_bbox import random_masks
+
+
+def frame_output(masks: np.ndarray, obj_ids):
+    # Sortie SAM3 par frame : masques [N, 1, H, W]
+    return {"out_obj_ids": np.asarray(obj_ids), "out_binary_masks": masks[:, None]}
+
+
+def test_bboxes_match_masks_to_bboxes():
+    masks = random_masks(30, seed=3).reshape(6, 5, 48, 64)
+    store = MaskStore.from_frames((f, frame_output(masks[f], range(5))) for f in range(6))
+    boxes, present = masks_to_bboxes(masks)
+    by_obj = store.bboxes(list(range(5)))
+    for f in range(6):
+        for obj_id in range(5):
+            expected = tuple(boxes[f, obj_id].tolist()) if present[f, obj_id] else None
+            assert by_obj[obj_id][f] == expected
+
+
+def test_same_boxes_as_dense_outputs():
+    masks = random_masks(12, seed=4).reshape(4, 3, 48, 64)
+    dense = {f: {obj_id: masks[f, obj_id] for obj_id in range(3) if masks[f, obj_id].any()} for f in range(4)}
+    store = MaskStore.from_propagate({f: frame_output(masks[f], range(3)) for f in range(4)})
+    assert bboxes_from_outputs(store, [0, 1, 2]) == bboxes_from_outputs(dense, [0, 1, 2])
+
+
+def test_keep_filters_objects_and_masks_decode_back():
+    masks = random_masks(4, seed=5)
+    store = MaskStore()
+    store.add_frame(0, frame_output(masks, [10, 11, 12, 13]), keep=[11, 13])
+    assert set(store.frames[0]) == {11, 13}
+    assert store.shape == (48, 64)
+    np.testing.assert_array_equal(store.mask(0, 11), masks[1])
+    assert store.mask(0, 10) is None
+
+
+def test_empty_masks_are_dropped_and_update_merges_chunks():
+    masks = random_masks(3, seed=6)  # masks[0] vide
+    first, second = MaskStore(), MaskStore()
+    first.add_frame(0, frame_output(masks, [1, 2, 3]), keep=[1, 2])
+    second.add_frame(0, frame_output(masks, [1, 2, 3]), keep=[3])
+    first.update(second)
+    assert set(first.frames[0]) == {2, 3}
+    assert first.bboxes([1])[1] == {0: None}
+    assert first.nbytes() > 0
@@ -0,0 +1,38 @@
+import config
+from pipeline.object_chunks import ObjectChunker
+
+
+def test_budget_alone_sizes_chunks():
+    chunker = ObjectChunker("cpu", budget_mb=20_000, per_object_mb=100, max_objects=None)
+    # Plus de 32 objets dans un paquet si le budget le permet
+    assert chunker.chunk_size(150) == 150
+    assert chunker.chunk_size(500) == 200
+    assert ObjectChunker("cpu", budget_mb=20_000, per_object_mb=100, max_objects=16).chunk_size(150) == 16
+
+
+def test_out_of_memory_halves_the_chunk_and_doubles_the_estimate():
+    chunker = ObjectChunker("cpu", budget_mb=1_000, per_object_mb=100, max_objects=None)
+    assert chunker.chunk_size(40) == 10
+    assert chunker.on_out_of_memory(10) == 5
+    assert chunker.per_object_mb == 200
+    assert chunker.on_out_of_memory(1) == 1
+
+
+class _Module:
+    max_num_objects = 256
+
+
+class _Model:
+    def __init__(self):
+        self.tracker = _Module()
+
+    def modules(self):
+        return [self, self.tracker]
+
+
+def test_limit_lowers_the_detection_cap_during_a_chunk():
+    model = _Model()
+    chunker = ObjectChunker("cpu", budget_mb=1_000, per_object_mb=100, max_objects=None, model=model)
+    with chunker.limit(3):
+        assert model.tracker.max_num_objects == 3
+    assert model.tracker.max_num_objects == config.MAX_NUM_OBJECTS
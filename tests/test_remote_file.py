@@ -0,0 +1,87 @@
+import os
+import threading
+
+import pytest
+
+from benchmarks.sftp_standin import LocalSFTPServer
+from pipeline import transfer
+from pipeline.remote_file import RemoteFile
+from pipeline.transfer import upload_files
+from pipeline.transport import SFTPPool
+
+SIZE = 300 * 1024 + 17
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    with LocalSFTPServer(str(tmp_path_factory.mktemp("remote"))) as server:
+        yield server
+
+
+@pytest.fixture
+def pool(server):
+    # Une seule session : les lecteurs et l'upload se la partagent à tour de rôle
+    pool = SFTPPool(**server.pool_params(), size=1)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture
+def videos(server):
+    data = {}
+    for name in ("a.mp4", "b.mp4"):
+        data[name] = os.urandom(SIZE)
+        with open(os.path.join(server.root, name), "wb") as f:
+            f.write(data[name])
+    return data
+
+
+def test_remote_file_holds_its_session_until_close(pool, videos):
+    remote = RemoteFile("/a.mp4", size=SIZE, block_size=64 * 1024, pool=pool)
+    assert remote.read(10) == videos["a.mp4"][:10]
+    # Session empruntée par le RemoteFile : le pool (taille 1) est épuisé
+    assert not pool._slots.acquire(blocking=False)
+    remote.close()
+    assert pool._slots.acquire(blocking=False)
+    pool._slots.release()
+
+
+def test_concurrent_readers_and_upload_on_one_session(server, pool, videos, tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer.time, "sleep", lambda seconds: None)
+    crop = tmp_path / "cropped_1_clip_00.mp4"
+    crop.write_bytes(os.urandom(5000))
+    results, errors = {}, []
+
+    def read(name):
+        try:
+            remote = RemoteFile(f"/{name}", block_size=16 * 1024, readahead_blocks=2, pool=pool)
+            data = bytearray(SIZE)
+            # Lectures de la fin vers le début : plusieurs readv sur la même poignée
+            for offset in reversed(range(0, SIZE, 40 * 1024)):
+                remote.seek(offset)
+                chunk = remote.read(40 * 1024)
+                data[offset:offset + len(chunk)] = chunk
+            remote.close()
+            results[name] = bytes(data)
+        except Exception as e:
+            errors.append(e)
+
+    def upload():
+        try:
+            results["upload"] = upload_files(pool, [str(crop)], "/up/A", "D01/a.mp4")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read, args=(name,)) for name in videos]
+    threads.append(threading.Thread(target=upload))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert not any(thread.is_alive() for thread in threads)
+    assert errors == []
+    for name, data in videos.items():
+        assert results[name] == data
+    assert results["upload"].ok
+    with open(os.path.join(server.root, "up", "A", "cropped_1_clip_00.mp4"), "rb") as f:
+        assert f.read() == crop.read_bytes()
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from benchmarks.sftp_standin import LocalSFTPServer
+from pipeline import transfer
+from pipeline.transfer import TransferItem, download_file, file_sha256, upload_files
+from pipeline.transport import SFTPPool
+
+SIZE = 3 * transfer.CHUNK_SIZE + 123
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    with LocalSFTPServer(str(tmp_path_factory.mktemp("remote"))) as server:
+        yield server
+
+
+@pytest.fixture
+def pool(server):
+    pool = SFTPPool(**server.pool_params(), size=2)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(transfer.time, "sleep", lambda seconds: None)
+
+
+@pytest.fixture
+def remote_file(server):
+    data = os.urandom(SIZE)
+    with open(os.path.join(server.root, "clip.mp4"), "wb") as f:
+        f.write(data)
+    return data
+
+
+def test_download_resumes_from_part_file(pool, remote_file, tmp_path):
+    local = tmp_path / "clip.mp4"
+    (tmp_path / "clip.mp4.part").write_bytes(remote_file[:transfer.CHUNK_SIZE])
+    result = download_file(pool, TransferItem("/clip.mp4", str(local), size=SIZE))
+    assert result.ok and not result.skipped
+    # Seule la fin manquante est transférée
+    assert result.bytes == SIZE - transfer.CHUNK_SIZE
+    assert local.read_bytes() == remote_file
+    assert not (tmp_path / "clip.mp4.part").exists()
+
+
+def test_complete_file_is_skipped(pool, remote_file, tmp_path):
+    local = tmp_path / "clip.mp4"
+    local.write_bytes(remote_file)
+    result = download_file(pool, TransferItem("/clip.mp4", str(local), size=SIZE))
+    assert result.ok and result.skipped and result.bytes == 0
+
+
+def test_missing_remote_file_fails_after_retries(pool, tmp_path):
+    result = download_file(pool, TransferItem("/missing.mp4", str(tmp_path / "missing.mp4")), retries=2)
+    assert not result.ok and result.error
+    assert not (tmp_path / "missing.mp4").exists()
+
+
+def test_checksum_mismatch_restarts_from_zero(pool, remote_file, tmp_path):
+    local = tmp_path / "clip.mp4"
+    # Début du .part corrompu : la taille est bonne mais pas le contenu
+    (tmp_path / "clip.mp4.part").write_bytes(b"\0" * transfer.CHUNK_SIZE)
+    item = TransferItem("/clip.mp4", str(local), size=SIZE, sha256=hashlib.sha256(remote_file).hexdigest())
+    result = download_file(pool, item, retries=2)
+    assert result.ok
+    assert local.read_bytes() == remote_file
+
+
+def test_upload_files_writes_manifest_and_merges_it(pool, server, tmp_path):
+    crops = []
+    for name in ("cropped_1_clip_00.mp4", "cropped_2_clip_00.mp4"):
+        path = tmp_path / name
+        path.write_bytes(os.urandom(1000))
+        crops.append(str(path))
+    uploaded = []
+    result = upload_files(pool, crops, "/up/A", "D01/video_01.mp4", on_uploaded=uploaded.append)
+    assert result.ok and result.failed == []
+    assert uploaded == ["/up/A/cropped_1_clip_00.mp4", "/up/A/cropped_2_clip_00.mp4"]
+    assert result.manifest == "/up/A/video_01.manifest.json"
+
+    remote = os.path.join(server.root, "up", "A")
+    with open(os.path.join(remote, "video_01.manifest.json")) as f:
+        manifest = json.load(f)
+    assert manifest["source"] == "video_01.mp4"
+    assert [(e["name"], e["size"], e["sha256"]) for e in manifest["files"]] == \
+        [(os.path.basename(p), 1000, file_sha256(p)) for p in crops]
+
+    # Second passage sur la même vidéo : le manifeste est complété, pas remplacé
+    extra = tmp_path / "cropped_3_clip_01.mp4"
+    extra.write_bytes(b"x")
+    assert upload_files(pool, [str(extra)], "/up/A", "D01/video_01.mp4").ok
+    with open(os.path.join(remote, "video_01.manifest.json")) as f:
+        assert len(json.load(f)["files"]) == 3
+
+
+def test_upload_files_reports_unsent_files(pool, tmp_path):
+    crop = tmp_path / "cropped_9_clip_00.mp4"
+    crop.write_bytes(b"abc")
+    # Dossier distant impossible à créer : un fichier porte déjà son nom
+    assert upload_files(pool, [str(crop)], "/up", "blocker.mp4").ok
+    result = upload_files(pool, [str(crop)], "/up/cropped_9_clip_00.mp4/sub", "v.mp4", retries=2)
+    assert not result.ok
+    assert result.failed == [str(crop)] and result.manifest is None
+
+
+def test_upload_files_fails_every_crop_without_manifest(pool, tmp_path, monkeypatch):
+    crops = []
+    for name in ("cropped_1_clip_00.mp4", "cropped_2_clip_00.mp4"):
+        path = tmp_path / name
+        path.write_bytes(b"abc")
+        crops.append(str(path))
+
+    def broken(*args):
+        raise IOError("disk full")
+
+    monkeypatch.setattr(transfer, "_write_manifest", broken)
+    result = upload_files(pool, crops, "/up/B", "D01/video_02.mp4", retries=2)
+    # Fichiers envoyés, mais pas de manifeste : aucun n'est considéré comme livré
+    assert len(result.uploaded) == 2
+    assert not result.ok and result.manifest is None
+    assert result.failed == crops
@@ -0,0 +1,38 @@
+from pipeline.upload_index import UploadIndex
+
+
+def _index(tmp_path, paths=()):
+    index_file = tmp_path / "upload_index.txt"
+    index_file.write_text("".join(p + "\n" for p in paths))
+    return UploadIndex(str(index_file), root="/up").load()
+
+
+def test_contains_matches_runs_of_name_tokens(tmp_path):
+    index = _index(tmp_path, ["/up/CYPRES/cropped_3_clip_07.mp4"])
+    assert index.contains("cropped_3_clip_07.mp4")
+    assert index.contains("clip_07.mp4")
+    assert index.contains("3_clip_07")
+    assert index.contains("clip_07")
+
+
+def test_contains_rejects_partial_tokens_and_wrong_extension(tmp_path):
+    index = _index(tmp_path, ["/up/CYPRES/cropped_3_clip_07.mp4"])
+    assert not index.contains("clip_0")
+    assert not index.contains("clip_7.mp4")
+    assert not index.contains("clip_07.avi")
+    assert not index.contains("cropped_clip_07.mp4")
+
+
+def test_manifest_does_not_match_clip_names(tmp_path):
+    index = _index(tmp_path, ["/up/CYPRES/D01_video_2025.manifest.json"])
+    assert not index.contains("D01_video_2025.mp4")
+
+
+def test_add_is_persisted_and_reloaded(tmp_path):
+    index = _index(tmp_path)
+    index.add("/up/A/cropped_1_clip_02.mp4")
+    index.add("/up/A/cropped_1_clip_02.mp4")
+    assert len(index) == 1 and index.contains("clip_02.mp4")
+
+    reloaded = UploadIndex(index.index_file, root="/up").load()
+    assert len(reloaded) == 1 and reloaded.contains("clip_02.mp4")
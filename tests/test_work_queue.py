@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from pipeline.work_queue import DONE, FAILED, LEASED, PENDING, LeaseQueue
+
+VIDEOS = [{"alias": "A", "filename": f"D01/v{i}.mp4", "size": 10, "mtime": 1} for i in range(3)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = LeaseQueue(str(tmp_path / "queue.sqlite"), lease_seconds=60, max_attempts=2)
+    q.populate(VIDEOS)
+    yield q
+    q.close()
+
+
+def _state(queue, filename):
+    return queue._conn.execute("SELECT state, attempts FROM work WHERE filename = ?", (filename,)).fetchone()
+
+
+def _expire(queue):
+    queue._conn.execute("UPDATE work SET lease_until = ? WHERE state = ?", (time.time() - 1, LEASED))
+
+
+def test_populate_ignores_known_videos(queue):
+    assert queue.populate(VIDEOS) == 0
+    assert queue.stats() == {PENDING: 3}
+
+
+def test_claim_in_rank_order_without_double_lease(queue):
+    first = queue.claim("n1", 2)
+    second = queue.claim("n2", 2)
+    assert [v["filename"] for v in first] == ["D01/v0.mp4", "D01/v1.mp4"]
+    assert [v["filename"] for v in second] == ["D01/v2.mp4"]
+    assert queue.claim("n3") == []
+
+
+def test_expired_lease_is_requeued_then_failed_after_max_attempts(queue):
+    video = queue.claim("n1")[0]["filename"]
+    _expire(queue)
+    # Nœud tombé : la vidéo revient dans la file, pour un autre nœud
+    assert queue.claim("n2")[0]["filename"] == video
+    assert _state(queue, video) == (LEASED, 2)
+
+    _expire(queue)
+    claimed = [v["filename"] for v in queue.claim("n3", 3)]
+    assert video not in claimed
+    assert _state(queue, video) == (FAILED, 2)
+
+
+def test_heartbeat_reports_lost_leases(queue):
+    video = queue.claim("n1")[0]["filename"]
+    key = ("A", video)
+    assert queue.heartbeat("n1", [key]) == []
+    _expire(queue)
+    queue.claim("n2")
+    assert queue.heartbeat("n1", [key]) == [key]
+
+
+def test_complete_and_release(queue):
+    done, failed, held = (v["filename"] for v in queue.claim("n1", 3))
+    queue.complete("n1", "A", done, ok=True)
+    queue.complete("n1", "A", failed, ok=False)
+    assert _state(queue, done)[0] == DONE
+    assert _state(queue, failed) == (PENDING, 1)
+
+    assert queue.release("n1") == 1
+    # Arrêt propre : la tentative n'est pas comptée
+    assert _state(queue, held) == (PENDING, 0)
+    # Seul le propriétaire du bail peut le terminer
+    queue.complete("other", "A", failed, ok=True)
+    assert _state(queue, failed)[0] == PENDING
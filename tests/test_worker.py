@@ -0,0 +1,51 @@
+import queue
+
+import pytest
+
+from pipeline.worker import SAMWorkerPool, WorkerCrashed, _Worker
+
+
+class _Process:
+    exitcode = None
+
+    def is_alive(self):
+        return True
+
+
+class _BrokenConn:
+    def send(self, job):
+        raise BrokenPipeError("pipe closed")
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Pool sans processus : un seul worker dont le pipe est coupé
+    pool = SAMWorkerPool.__new__(SAMWorkerPool)
+    pool._job_timeout = None
+    pool._idle = queue.Queue()
+    pool._workers = [_Worker(0, _Process(), _BrokenConn())]
+    pool._idle.put(pool._workers[0])
+    pool.respawned = 0
+
+    def respawn(worker):
+        pool.respawned += 1
+        pool._workers[worker.slot] = _Worker(worker.slot, _Process(), _BrokenConn())
+        return pool._workers[worker.slot]
+
+    monkeypatch.setattr(pool, "_respawn", respawn)
+    return pool
+
+
+def test_broken_pipe_is_reported_as_worker_crash(pool):
+    with pytest.raises(WorkerCrashed) as info:
+        pool.process("clip_00.mp4")
+    assert isinstance(info.value.__cause__, BrokenPipeError)
+    assert pool.respawned == 1
+    # Le worker remplaçant est rendu au pool
+    assert pool._idle.get_nowait() is pool._workers[0]
+
+
+def test_broken_pipe_in_batch_fails_clips_one_by_one(pool):
+    results = pool.process_batch(["clip_00.mp4", "clip_01.mp4"])
+    assert set(results) == {"clip_00.mp4", "clip_01.mp4"}
+    assert all(r["paths"] == [] and "died" in r["error"] for r in results.values())
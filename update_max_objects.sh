@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# Obsolète : utiliser MAX_NUM_OBJECTS dans config.py (appliqué au chargement du modèle)
+echo "Warning: update_max_objects.sh is deprecated, set MAX_NUM_OBJECTS in config.py instead." >&2
+
 # =========================
 # Usage check
 # =========================
@@ -0,0 +1,180 @@
+"""Index of pending / annotated videos shared by the annotation app's requests.
+
+The state lives in a SQLite file (ANNOTATION_DB) instead of being rebuilt from
+the video folder and annotations.csv on every page load:
+
+- ``videos``: one row per video with its state (pending / annotated) and a
+  short reservation (annotator, expiry), so two annotators working at the same
+  time are not shown the same video;
+- ``annotations``: one row per submitted label.
+
+``annotate`` marks the video and stores the label in one transaction and
+appends the row to annotations.csv before committing, so the CSV and the index
+never disagree. A label for a video that is already annotated (double submit,
+two tabs) is refused. annotations.csv from earlier sessions is imported when
+the index is created.
+"""
+import csv
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+PENDING = "pending"
+ANNOTATED = "annotated"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    name TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    reserved_by TEXT,
+    reserved_until REAL
+);
+CREATE INDEX IF NOT EXISTS idx_videos_state ON videos (state, name);
+CREATE TABLE IF NOT EXISTS annotations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    video TEXT NOT NULL,
+    behavior TEXT NOT NULL,
+    annotator TEXT,
+    ts REAL NOT NULL
+);
+"""
+
+
+class AnnotationIndex:
+    """SQLite index of the videos to annotate.
+
+    Args:
+        db_path (str): SQLite file.
+        video_folder (str): Folder of the videos served to the annotators.
+        csv_file (str): CSV of the labels (video, behavior), appended on every annotation.
+        reservation_seconds (float): How long a video shown to an annotator is kept from the others.
+        rescan_seconds (float): Minimum delay between two listings of video_folder.
+    """
+
+    def __init__(self, db_path: str, video_folder: str, csv_file: str,
+                 reservation_seconds: float = 600, rescan_seconds: float = 60):
+        self.video_folder = video_folder
+        self.csv_file = csv_file
+        self.reservation_seconds = reservation_seconds
+        self.rescan_seconds = rescan_seconds
+        self._scanned = 0.0
+        # isolation_level=None : transactions explicites (BEGIN IMMEDIATE)
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._import_csv()
+        self.sync()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            # Verrou d'écriture pris dès le début : sûr avec plusieurs processus du serveur
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _import_csv(self) -> None:
+        # Première ouverture seulement : reprise des annotations des sessions précédentes
+        with self._transaction() as conn:
+            if conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]:
+                return
+            if not os.path.exists(self.csv_file):
+                return
+            with open(self.csv_file, newline="") as f:
+                rows = [row[:2] for row in csv.reader(f) if len(row) >= 2]
+            now = time.time()
+            conn.executemany("INSERT INTO annotations (video, behavior, ts) VALUES (?, ?, ?)",
+                             [(video, behavior, now) for video, behavior in rows])
+            conn.executemany("INSERT OR REPLACE INTO videos (name, state) VALUES (?, ?)",
+                             [(video, ANNOTATED) for video, _ in rows])
+
+    def sync(self, force: bool = True) -> int:
+        """Adds the videos of video_folder not indexed yet.
+
+        Args:
+            force (bool): List the folder even if it was listed less than rescan_seconds ago.
+
+        Returns:
+            int: Number of new videos.
+        """
+        now = time.monotonic()
+        if not force and now - self._scanned < self.rescan_seconds:
+            return 0
+        self._scanned = now
+        names = sorted(name for name in os.listdir(self.video_folder) if not name.startswith("."))
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO videos (name, state) VALUES (?, ?)",
+                             [(name, PENDING) for name in names])
+            return conn.total_changes - before
+
+    def next_video(self, annotator: str) -> Optional[str]:
+        """Reserves the first pending video for annotator (its own reservation first).
+
+        Returns:
+            str or None: The video name, or None when everything is annotated or reserved.
+        """
+        self.sync(force=False)
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT name FROM videos WHERE state = ? "
+                "AND (reserved_by = ? OR reserved_until IS NULL OR reserved_until < ?) "
+                "ORDER BY reserved_by IS ? DESC, name LIMIT 1",
+                (PENDING, annotator, now, annotator),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE videos SET reserved_by = ?, reserved_until = ? WHERE name = ?",
+                         (annotator, now + self.reservation_seconds, row[0]))
+        return row[0]
+
+    def upcoming(self, annotator: str, current: str, n: int = 1) -> List[str]:
+        """Pending, unreserved videos that next_video is likely to return after current."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT name FROM videos WHERE state = ? AND name > ? "
+                "AND (reserved_by = ? OR reserved_until IS NULL OR reserved_until < ?) "
+                "ORDER BY name LIMIT ?",
+                (PENDING, current, annotator, time.time(), n),
+            ).fetchall()
+        return [name for name, in rows]
+
+    def annotate(self, video: str, behavior: str, annotator: Optional[str] = None) -> bool:
+        """Records a label and marks the video annotated.
+
+        Returns:
+            bool: False if the video is unknown or already annotated (nothing recorded).
+        """
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE videos SET state = ?, reserved_by = NULL, reserved_until = NULL "
+                "WHERE name = ? AND state = ?",
+                (ANNOTATED, video, PENDING),
+            ).rowcount
+            if not updated:
+                return False
+            conn.execute("INSERT INTO annotations (video, behavior, annotator, ts) VALUES (?, ?, ?, ?)",
+                         (video, behavior, annotator, time.time()))
+            # Écrit avant le COMMIT : en cas d'échec, l'index reste inchangé
+            with open(self.csv_file, "a", newline="") as f:
+                csv.writer(f).writerow([video, behavior])
+                f.flush()
+                os.fsync(f.fileno())
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT state, COUNT(*) FROM videos GROUP BY state").fetchall())
@@ -1,32 +1,42 @@
-from flask import Flask, render_template, request, redirect, url_for
-import csv
+from flask import Flask, render_template, request, redirect, url_for, send_from_directory, abort
+import logging
 import os
+import uuid
+
+from annotation_index import AnnotationIndex
+from transcode import ORIGINAL_FOLDER, LazyTranscoder
 
 app = Flask(__name__)
 
 VIDEO_FOLDER = os.path.join("static", "videos/h264")
 CSV_FILE = "annotations.csv"
+ANNOTATION_DB = "annotations.sqlite"
+# Durée pendant laquelle une vidéo affichée n'est pas proposée aux autres annotateurs
+RESERVATION_SECONDS = 600
+# Cache navigateur des vidéos (immuables une fois converties)
+VIDEO_MAX_AGE = 24 * 3600
+# True : vidéos converties à la première demande depuis ORIGINAL_FOLDER (pas besoin de
+# lancer transcode.py avant), VIDEO_FOLDER devient un cache borné à TRANSCODE_CACHE_BYTES
+LAZY_TRANSCODE = False
+TRANSCODE_CACHE_BYTES = 5 * 1024**3
+
+transcoder = LazyTranscoder(ORIGINAL_FOLDER, VIDEO_FOLDER, TRANSCODE_CACHE_BYTES) if LAZY_TRANSCODE else None
+index_db = AnnotationIndex(ANNOTATION_DB, ORIGINAL_FOLDER if LAZY_TRANSCODE else VIDEO_FOLDER, CSV_FILE,
+                           reservation_seconds=RESERVATION_SECONDS)
+
+
+def get_annotator():
+    # Identifiant par navigateur, pour les réservations et le suivi des annotations
+    return request.cookies.get("annotator") or uuid.uuid4().hex
 
-def get_next_video():
-    videos = sorted(os.listdir(VIDEO_FOLDER))
-    
-    # Read annotated videos
-    if os.path.exists(CSV_FILE):
-        with open(CSV_FILE, newline="") as f:
-            annotated = [row[0] for row in csv.reader(f)]
-    else:
-        annotated = []
-
-    # Pick first video that is not annotated yet
-    for v in videos:
-        if v not in annotated:
-            return v
-    return None  # all videos annotated
 
 @app.route("/", methods=["GET"])
 def index():
-    video_name = get_next_video()
+    annotator = get_annotator()
+    video_name = index_db.next_video(annotator)
     if video_name is None:
+        if index_db.stats().get("pending"):
+            return "<h2>The remaining videos are being annotated by someone else, come back later.</h2>"
         return "<h2>All videos have been annotated!</h2>"
 
     # List of behavior names
@@ -41,7 +51,31 @@ def index():
         "Exploring"
     ]
 
-    return render_template("index.html", video_name=video_name, behaviors=behaviors)
+    next_videos = index_db.upcoming(annotator, video_name)
+    response = app.make_response(render_template(
+        "index.html", video_name=video_name, behaviors=behaviors, next_videos=next_videos))
+    # Indication de préchargement de la vidéo suivante (en-tête et <link> dans la page)
+    if transcoder is not None:
+        # Conversion de la vidéo suivante pendant l'annotation de celle-ci
+        for name in next_videos:
+            transcoder.prefetch(name)
+    if next_videos:
+        response.headers["Link"] = ", ".join(
+            f"<{url_for('video', name=name)}>; rel=prefetch; as=video" for name in next_videos)
+    response.set_cookie("annotator", annotator, max_age=365 * 24 * 3600, samesite="Lax")
+    return response
+
+
+@app.route("/videos/<path:name>")
+def video(name):
+    if transcoder is not None:
+        path = transcoder.get(name)
+        if path is None:
+            abort(404)
+        name = os.path.basename(path)
+    # Requêtes Range (lecture / avance rapide sans tout télécharger), ETag et Last-Modified
+    return send_from_directory(VIDEO_FOLDER, name, mimetype="video/mp4",
+                               conditional=True, max_age=VIDEO_MAX_AGE)
 
 
 @app.route("/annotate", methods=["POST"])
@@ -49,12 +83,11 @@ def annotate():
     video_name = request.form["video_name"]
     behavior = request.form["behavior"]
 
-    # Append annotation
-    with open(CSV_FILE, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([video_name, behavior])
+    # Annotation enregistrée une seule fois, même avec plusieurs annotateurs ou onglets
+    if not index_db.annotate(video_name, behavior, request.cookies.get("annotator")):
+        logging.warning("Annotation of %s ignored: unknown or already annotated", video_name)
 
     return redirect(url_for("index"))
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
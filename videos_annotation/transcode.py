@@ -0,0 +1,215 @@
+"""Transcoding of the annotation videos to browser-friendly H.264.
+
+Replaces the serial loop of convert_codec.sh:
+
+- ``transcode_all`` converts static/videos/original on a process pool sized to
+  the machine, each ffmpeg getting its share of the cores. Outputs newer than
+  their source are skipped, so re-running only converts the new videos;
+- every output is written to a temporary file and renamed once ffmpeg
+  succeeded, so an interrupted run never leaves a truncated video behind;
+- ``LazyTranscoder`` converts a video the first time the app serves it, keeps
+  the converted files in a disk cache bounded by ``max_bytes`` (least recently
+  served removed first) and can warm the next video in the background.
+
+Usage:
+    python transcode.py [--workers N] [--src static/videos/original] [--dst static/videos/h264]
+"""
+import argparse
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional, Tuple
+
+ORIGINAL_FOLDER = os.path.join("static", "videos/original")
+OUTPUT_FOLDER = os.path.join("static", "videos/h264")
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+
+def ffmpeg_command(src: str, dst: str, threads: int = 0) -> List[str]:
+    """Same encoding as convert_codec.sh (H.264 yuv420p, faststart, AAC)."""
+    return [
+        "ffmpeg", "-nostdin", "-y", "-loglevel", "error",
+        "-i", src,
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-movflags", "+faststart",
+        "-c:a", "aac",
+        "-threads", str(threads),
+        "-f", "mp4", dst,
+    ]
+
+
+def output_name(src: str) -> str:
+    return os.path.splitext(os.path.basename(src))[0] + ".mp4"
+
+
+def is_up_to_date(src: str, dst: str) -> bool:
+    """True if dst exists, is not empty and is not older than src."""
+    return os.path.exists(dst) and os.path.getsize(dst) > 0 \
+        and os.path.getmtime(dst) >= os.path.getmtime(src)
+
+
+def transcode(src: str, dst: str, threads: int = 0) -> Tuple[str, bool, Optional[str]]:
+    """Transcodes src into dst through a temporary file.
+
+    Returns:
+        Tuple[str, bool, str]: (dst, ok, ffmpeg error output or None).
+    """
+    tmp = f"{dst}.part"
+    result = subprocess.run(ffmpeg_command(src, tmp, threads), capture_output=True, text=True)
+    if result.returncode != 0:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        return dst, False, result.stderr.strip()[-2000:]
+    os.replace(tmp, dst)
+    return dst, True, None
+
+
+def pending_jobs(src_folder: str, dst_folder: str) -> List[Tuple[str, str]]:
+    """(source, output) pairs whose output is missing or older than the source."""
+    jobs = []
+    for name in sorted(os.listdir(src_folder)):
+        if not name.lower().endswith(VIDEO_EXTENSIONS):
+            continue
+        src, dst = os.path.join(src_folder, name), os.path.join(dst_folder, output_name(name))
+        if not is_up_to_date(src, dst):
+            jobs.append((src, dst))
+    return jobs
+
+
+def transcode_all(src_folder: str = ORIGINAL_FOLDER, dst_folder: str = OUTPUT_FOLDER,
+                  workers: Optional[int] = None) -> Dict[str, int]:
+    """Transcodes every source video that has no up-to-date output.
+
+    Args:
+        src_folder (str): Folder of the original videos.
+        dst_folder (str): Folder of the H.264 outputs.
+        workers (int, optional): Concurrent ffmpeg processes (default: cores / 2).
+
+    Returns:
+        Dict[str, int]: Number of videos converted, failed and skipped.
+    """
+    os.makedirs(dst_folder, exist_ok=True)
+    jobs = pending_jobs(src_folder, dst_folder)
+    total = sum(name.lower().endswith(VIDEO_EXTENSIONS) for name in os.listdir(src_folder))
+    cores = os.cpu_count() or 1
+    workers = max(1, min(workers or cores // 2, len(jobs) or 1))
+    # Les cœurs sont répartis entre les ffmpeg qui tournent en même temps
+    threads = max(1, cores // workers)
+
+    counts = {"converted": 0, "failed": 0, "skipped": total - len(jobs)}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(transcode, src, dst, threads) for src, dst in jobs]
+        for i, future in enumerate(as_completed(futures), 1):
+            dst, ok, error = future.result()
+            counts["converted" if ok else "failed"] += 1
+            if ok:
+                logging.info("[%d/%d] %s", i, len(jobs), dst)
+            else:
+                logging.error("[%d/%d] %s failed: %s", i, len(jobs), dst, error)
+    return counts
+
+
+class LazyTranscoder:
+    """Converts videos on first request, in a size-bounded disk cache.
+
+    Args:
+        src_folder (str): Folder of the original videos.
+        cache_folder (str): Folder of the converted videos.
+        max_bytes (int): Cache budget; least recently served videos are removed beyond it.
+        background_workers (int): Concurrent background conversions (prefetch).
+    """
+
+    def __init__(self, src_folder: str = ORIGINAL_FOLDER, cache_folder: str = OUTPUT_FOLDER,
+                 max_bytes: int = 5 * 1024**3, background_workers: int = 2):
+        self.src_folder = src_folder
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        # RLock : add_done_callback appelle _forget tout de suite si la conversion est déjà finie
+        self._lock = threading.RLock()
+        self._jobs: Dict[str, Future] = {}
+        self._background = ThreadPoolExecutor(max_workers=background_workers,
+                                              thread_name_prefix="transcode")
+        os.makedirs(cache_folder, exist_ok=True)
+
+    def _source(self, name: str) -> Optional[str]:
+        stem = os.path.splitext(name)[0]
+        for ext in VIDEO_EXTENSIONS:
+            path = os.path.join(self.src_folder, stem + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _convert(self, name: str, src: str) -> str:
+        dst = os.path.join(self.cache_folder, output_name(name))
+        if not is_up_to_date(src, dst):
+            dst, ok, error = transcode(src, dst)
+            if not ok:
+                raise RuntimeError(f"Transcoding of {src} failed: {error}")
+            self._evict(keep=dst)
+        return dst
+
+    def _submit(self, name: str, src: str) -> Future:
+        with self._lock:
+            # Une seule conversion par vidéo, les requêtes concurrentes attendent la même
+            future = self._jobs.get(name)
+            if future is None or (future.done() and future.exception() is not None):
+                future = self._background.submit(self._convert, name, src)
+                self._jobs[name] = future
+                future.add_done_callback(lambda f, name=name: self._forget(name, f))
+        return future
+
+    def _forget(self, name: str, future: Future) -> None:
+        with self._lock:
+            if self._jobs.get(name) is future:
+                del self._jobs[name]
+
+    def get(self, name: str) -> Optional[str]:
+        """Path of the converted video, converting it first if needed (None if unknown)."""
+        src = self._source(name)
+        if src is None:
+            return None
+        dst = os.path.join(self.cache_folder, output_name(name))
+        if not is_up_to_date(src, dst):
+            dst = self._submit(name, src).result()
+        # Date d'accès mise à jour : ordre d'éviction LRU
+        os.utime(dst)
+        return dst
+
+    def prefetch(self, name: str) -> None:
+        """Starts converting a video in the background (e.g. the next one to annotate)."""
+        src = self._source(name)
+        if src is not None and not is_up_to_date(src, os.path.join(self.cache_folder, output_name(name))):
+            self._submit(name, src)
+
+    def _evict(self, keep: str) -> None:
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.cache_folder):
+                if entry.is_file() and not entry.name.endswith(".part"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                os.remove(path)
+                total -= size
+                logging.info("Evicted %s from the transcoding cache", path)
+
+    def close(self) -> None:
+        self._background.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--src", default=ORIGINAL_FOLDER)
+    parser.add_argument("--dst", default=OUTPUT_FOLDER)
+    parser.add_argument("--workers", type=int, default=None, help="concurrent ffmpeg processes")
+    args = parser.parse_args()
+    counts = transcode_all(args.src, args.dst, args.workers)
+    logging.info("%d converted, %d failed, %d already up to date",
+                 counts["converted"], counts["failed"], counts["skipped"])